@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+Space Mining Empire - Game engine micro-benchmarks
+
+Times the engine's hot paths at increasing scale and compares the results
+against a stored baseline, flagging anything that got slower than the
+threshold allows.
+
+    python3 benchmark_engine.py                            # run and compare
+    python3 benchmark_engine.py --save-baseline --runs 3   # record a new baseline
+    python3 benchmark_engine.py --filter cargo --quick
+"""
+
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+
+from game.columnar import HAVE_NUMPY, WorldStore
+from game.galaxy import Galaxy
+from game.models import CelestialBody, Outpost, Player, ResourceType, Ship
+from game.orderbook import Exchange
+from game.rng import GameRandom
+from game.sessions import SessionManager
+from game.web_engine import GameWebEngine
+from game.world_generator import WorldGenerator
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+DEFAULT_THRESHOLD = 0.25
+
+RESOURCES = list(ResourceType)
+BENCHMARKS = []
+
+
+def benchmark(name, scales=(1,), unit=''):
+    """Register ``setup(scale) -> operation`` as a benchmark run at each scale"""
+    def decorator(setup):
+        BENCHMARKS.append({'name': name, 'scales': scales, 'unit': unit, 'setup': setup})
+        return setup
+    return decorator
+
+
+def make_ship(cargo_types=0, amount=10):
+    ship = Ship(name="Bench Hauler", cargo_capacity=10 ** 9, mining_efficiency=1.0,
+                speed=1.0, fuel_capacity=10 ** 9, current_fuel=10 ** 9)
+    for resource_type in RESOURCES[:cargo_types]:
+        ship.cargo[resource_type] = amount
+    return ship
+
+
+def make_engine(bodies=None):
+    engine = GameWebEngine()
+    engine.initialize_game(starting_credits=1000)
+    if bodies:
+        generator = WorldGenerator()
+        while len(engine.celestial_bodies) < bodies:
+            engine.celestial_bodies.extend(generator.generate_starting_system())
+        del engine.celestial_bodies[bodies:]
+    return engine
+
+
+def make_galaxy_engine(bodies):
+    """An engine whose map is a square patch of procedural galaxy, with the player near its middle"""
+    engine = make_engine()
+    side = math.ceil(math.sqrt(bodies / 10)) + 1
+    galaxy = Galaxy(seed=1)
+    patch = [body for x in range(side) for y in range(side) for body in galaxy.sector((x, y, 0))][:bodies]
+    engine.celestial_bodies = patch
+    middle = (side * galaxy.sector_size / 2,) * 2 + (0.0,)
+    engine.player.current_location = min(patch, key=lambda body: math.dist(body.position, middle))
+    return engine
+
+
+@benchmark('CelestialBody.mine_resource')
+def bench_mine_resource(scale):
+    body = CelestialBody(name="Bench Rock", distance_from_start=0.0,
+                         resources={ResourceType.IRON: 10 ** 15}, mining_difficulty=1.2)
+    return lambda: body.mine_resource(ResourceType.IRON, 10.0)
+
+
+@benchmark('Ship.add_cargo+remove_cargo', scales=(1, 3, 6), unit='cargo types')
+def bench_add_remove_cargo(scale):
+    ship = make_ship(scale)
+    resource_type = RESOURCES[scale - 1]
+
+    def operation():
+        ship.add_cargo(resource_type, 5)
+        ship.remove_cargo(resource_type, 5)
+    return operation
+
+
+@benchmark('Ship.cargo_used', scales=(1, 3, 6), unit='cargo types')
+def bench_cargo_used(scale):
+    ship = make_ship(scale)
+    return lambda: ship.cargo_used
+
+
+@benchmark('Outpost.get_sell_price', scales=(1, 6), unit='priced resources')
+def bench_get_sell_price(scale):
+    outpost = Outpost(name="Bench Market", outpost_type="trade_hub",
+                      resource_prices={rt: 10.0 for rt in RESOURCES[:scale]},
+                      demand_multipliers={rt: 1.1 for rt in RESOURCES[:scale]})
+    resource_type = RESOURCES[scale - 1]
+    return lambda: outpost.get_sell_price(resource_type)
+
+
+@benchmark('GameWebEngine.get_destinations', scales=(10, 100, 1000), unit='bodies')
+def bench_get_destinations(scale):
+    engine = make_engine(bodies=scale)
+    return engine.get_destinations
+
+
+@benchmark('GameWebEngine.find_destinations(reachable)', scales=(1000, 10000, 100000), unit='bodies')
+def bench_find_reachable(scale):
+    engine = make_galaxy_engine(scale)
+    engine.spatial_index()
+    return lambda: engine.find_destinations('reachable')
+
+
+@benchmark('GameWebEngine.find_destinations(outposts)', scales=(1000, 10000, 100000), unit='bodies')
+def bench_find_outposts(scale):
+    engine = make_galaxy_engine(scale)
+    engine.spatial_index()
+    return lambda: engine.find_destinations('outposts', limit=5)
+
+
+if HAVE_NUMPY:
+    @benchmark('WorldStore.resource_totals', scales=(1000, 10000), unit='bodies')
+    def bench_resource_totals(scale):
+        store = WorldStore.from_bodies(make_galaxy_engine(scale).celestial_bodies)
+        return store.resource_totals
+
+
+@benchmark('sum(body.resources) over bodies', scales=(1000, 10000), unit='bodies')
+def bench_resource_totals_dicts(scale):
+    # The dict-backed equivalent of WorldStore.resource_totals
+    bodies = make_galaxy_engine(scale).celestial_bodies
+
+    def operation():
+        totals = dict.fromkeys(RESOURCES, 0)
+        for body in bodies:
+            for resource_type, amount in body.resources.items():
+                totals[resource_type] += amount
+        return totals
+    return operation
+
+
+@benchmark('GameWebEngine.trade_at_outpost(sell_all)', scales=(1, 3, 6), unit='cargo types')
+def bench_sell_all(scale):
+    engine = make_engine()
+    engine.player.current_location = next(b for b in engine.celestial_bodies if b.outpost)
+    engine.player.current_ship = ship = make_ship()
+    # Reloading the hold is part of every operation; it is a handful of dict writes
+    cargo = {rt: 10 for rt in RESOURCES[:scale]}
+
+    def operation():
+        ship.cargo.update(cargo)
+        engine.trade_at_outpost(sell_all=True)
+    return operation
+
+
+@benchmark('GameWebEngine.place_orders+cancel_orders', scales=(1, 10, 100), unit='orders')
+def bench_place_cancel_orders(scale):
+    engine = make_engine()
+    engine.exchange, engine.trader = Exchange(), 'bench'
+    engine.player.current_location = next(b for b in engine.celestial_bodies if b.outpost)
+    engine.player.current_ship = make_ship(1, amount=10 ** 6)
+    # Asks with no bids to meet them: every order rests, then the cancel refunds its cargo
+    orders = [{'side': 'sell', 'resource_type': RESOURCES[0].value, 'quantity': 1, 'price': 100.0 + index}
+              for index in range(scale)]
+
+    def operation():
+        engine.place_orders(orders)
+        engine.cancel_orders()
+    return operation
+
+
+@benchmark('GameWebEngine.advance_world', scales=(10, 100, 1000), unit='bodies')
+def bench_advance_world(scale):
+    # One world tick: market drift at every outpost (regrowth is worked out on read, not here)
+    engine = make_engine(bodies=scale)
+    return lambda: engine.advance_world(1)
+
+
+@benchmark('GameWebEngine.advance_world(galaxy)', scales=(1000, 10000), unit='bodies')
+def bench_advance_world_galaxy(scale):
+    engine = make_galaxy_engine(scale)
+    return lambda: engine.advance_world(1)
+
+
+if HAVE_NUMPY:
+    @benchmark('GameWebEngine.advance_world(galaxy, columnar)', scales=(1000, 10000), unit='bodies')
+    def bench_advance_world_columnar(scale):
+        # The same tick as one vectorized update over the store's market matrix
+        engine = make_galaxy_engine(scale)
+        engine.columnar = True
+        engine.world_store()
+        return lambda: engine.advance_world(1)
+
+
+@benchmark('GameWebEngine.get_shop_data', scales=(1, 10, 100), unit='ships')
+def bench_get_shop_data(scale):
+    engine = make_engine()
+    engine.player.ships.extend(make_ship() for _ in range(scale - 1))
+    return engine.get_shop_data
+
+
+@benchmark('Player(ships=N)', scales=(1, 10, 100), unit='ships')
+def bench_player_init(scale):
+    ships = [make_ship() for _ in range(scale)]
+    # __post_init__ checks membership, which compares dataclasses field by field
+    return lambda: Player(name="Bench", credits=0.0, current_ship=make_ship(1), ships=list(ships))
+
+
+@benchmark('SessionManager.get_or_create', scales=(100, 1000, 10000), unit='sessions')
+def bench_session_lookup(scale):
+    manager = SessionManager(capacity=scale)
+    tokens = [manager.create().token for _ in range(scale)]
+    picker = random.Random(1)
+    lookups = [picker.choice(tokens) for _ in range(1024)]
+    state = {'i': 0}
+
+    def operation():
+        state['i'] = (state['i'] + 1) & 1023
+        manager.get_or_create(lookups[state['i']])
+    return operation
+
+
+@benchmark('WorldGenerator.generate_starting_system')
+def bench_generate_world(scale):
+    generator = WorldGenerator()
+    return generator.generate_starting_system
+
+
+@benchmark('WorldGenerator.generate_sector', scales=(10,), unit='bodies')
+def bench_generate_sector(scale):
+    generator = WorldGenerator()
+    state = {'seed': 0}
+
+    def operation():
+        # A fresh stream every call, as when a player reaches a new sector
+        state['seed'] += 1
+        generator.generate_sector(GameRandom(state['seed']), (0.0, 0.0, 0.0), 10.0, scale, flat=True)
+    return operation
+
+
+def time_operation(operation, repeat=25, min_time=0.01):
+    """Best per-call time in seconds, calibrating the loop count to about ``min_time`` per run.
+
+    Noise from other processes only ever adds time, so the minimum of many
+    short runs is far steadier than the average of a few long ones.
+    """
+    # Like timeit: a collection landing in one run would swamp sub-microsecond timings
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _time_operation(operation, repeat, min_time)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def _time_operation(operation, repeat, min_time):
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            operation()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or number >= 10 ** 7:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            operation()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best
+
+
+def run_benchmarks(name_filter=None, repeat=25, min_time=0.01):
+    """Returns {benchmark: best ns per call}"""
+    results = {}
+    for bench in BENCHMARKS:
+        if name_filter and name_filter.lower() not in bench['name'].lower():
+            continue
+        for scale in bench['scales']:
+            key = bench['name'] if len(bench['scales']) == 1 else f"{bench['name']} [{scale} {bench['unit']}]"
+            # Fixed seed so every run does the same work
+            random.seed(12345)
+            operation = bench['setup'](scale)
+            seconds = time_operation(operation, repeat, min_time)
+            results[key] = seconds * 1e9
+            print(f"  {key:<60} {seconds * 1e6:>12.3f} us", file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Returns (regressions, improvements) as lists of (name, baseline_ns, current_ns)"""
+    regressions, improvements = [], []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if current > previous * (1 + threshold):
+            regressions.append((name, previous, current))
+        elif current < previous * (1 - threshold):
+            improvements.append((name, previous, current))
+    return regressions, improvements
+
+
+def describe_change(name, previous, current):
+    return f"{name}: {previous:.0f} -> {current:.0f} ns ({current / previous - 1:+.0%})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the game engine hot paths')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help='baseline file to compare against or save to (default benchmark_baseline.json)')
+    parser.add_argument('--save-baseline', action='store_true', help='write these results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='relative slowdown reported as a regression (default 0.25 = 25%%)')
+    parser.add_argument('--filter', help='only run benchmarks whose name contains this text')
+    parser.add_argument('--quick', action='store_true', help='fewer, shorter runs (noisier)')
+    parser.add_argument('--runs', type=int, default=1,
+                        help='run the whole suite this many times and keep each benchmark\'s best (default 1)')
+    parser.add_argument('--output', help='also write the results as JSON to this file')
+    args = parser.parse_args()
+
+    repeat, min_time = (5, 0.005) if args.quick else (25, 0.01)
+    print("Running engine benchmarks (best per-call time):", file=sys.stderr)
+    results = run_benchmarks(args.filter, repeat, min_time)
+    for _ in range(args.runs - 1):
+        for name, ns in run_benchmarks(args.filter, repeat, min_time).items():
+            results[name] = min(results[name], ns)
+
+    report = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'unit': 'ns per call',
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline) and args.filter:
+            # A filtered run only replaces the entries it measured
+            with open(args.baseline) as f:
+                baseline = json.load(f).get('results', {})
+        report['results'] = {**baseline, **results}
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baseline saved to {args.baseline}", file=sys.stderr)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found; run with --save-baseline to record one", file=sys.stderr)
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions, improvements = compare(results, baseline.get('results', {}), args.threshold)
+    for change in improvements:
+        print(f"  faster: {describe_change(*change)}", file=sys.stderr)
+    for change in regressions:
+        print(f"  REGRESSION: {describe_change(*change)}", file=sys.stderr)
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}", file=sys.stderr)
+        return 1
+    print(f"No regressions beyond {args.threshold:.0%} ({len(results)} benchmarks)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Space Mining Empire - order book throughput benchmark
+
+Drives the outpost exchange with a mixed workload: traders submit batches
+of buy and sell orders scattered around a drifting mid price, and cancel a
+share of their resting orders in bulk. Prints order operations per second,
+trades and batch latency percentiles as JSON.
+
+    python3 benchmark_orderbook.py --operations 200000
+    python3 benchmark_orderbook.py --batch 1 --min-rate 20000
+"""
+
+import argparse
+import json
+import math
+import random
+import sys
+import time
+
+from game.models import ResourceType
+from game.orderbook import BUY, SELL, Exchange, market_id
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(q * len(sorted_values) - 1e-9)
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+def run(operations=100000, batch=50, traders=100, outposts=4, cancel_share=0.3, seed=1):
+    """Run ``operations`` order submissions and cancellations; returns the report"""
+    rng = random.Random(seed)
+    exchange = Exchange()
+    names = [f'trader-{index}' for index in range(traders)]
+    markets = [market_id('bench', index) for index in range(outposts)]
+    resource_types = list(ResourceType)
+    mids = {resource_type: 10.0 + 5.0 * code for code, resource_type in enumerate(resource_types)}
+    submit_times = []
+    cancel_times = []
+    done = 0
+
+    started = time.perf_counter()
+    while done < operations:
+        trader = rng.choice(names)
+        size = min(batch, operations - done)
+        if rng.random() < cancel_share and exchange.owned.get(trader):
+            open_ids = list(exchange.owned[trader])
+            picked = rng.sample(open_ids, min(size, len(open_ids)))
+            tick = time.perf_counter()
+            cancelled = exchange.cancel_many(trader, picked)
+            cancel_times.append(time.perf_counter() - tick)
+            done += len(cancelled)
+            continue
+        requests = []
+        for _ in range(size):
+            resource_type = rng.choice(resource_types)
+            mids[resource_type] *= 1.0 + rng.uniform(-0.001, 0.001)
+            side = BUY if rng.random() < 0.5 else SELL
+            # Most orders rest a little way off the mid, some cross it and trade
+            offset = rng.uniform(-0.02, 0.05) * mids[resource_type]
+            price = round(mids[resource_type] - offset if side == BUY else mids[resource_type] + offset, 2)
+            requests.append((side, resource_type, max(price, 0.01), rng.randint(1, 50)))
+        tick = time.perf_counter()
+        exchange.submit_many(trader, rng.choice(markets), requests)
+        submit_times.append(time.perf_counter() - tick)
+        done += size
+    elapsed = time.perf_counter() - started
+
+    submit_times.sort()
+    cancel_times.sort()
+    stats = exchange.stats()
+    return {
+        'operations': stats['operations'],
+        'seconds': round(elapsed, 3),
+        'operations_per_second': round(stats['operations'] / elapsed, 1) if elapsed else 0.0,
+        'trades': stats['trades'],
+        'open_orders': stats['open_orders'],
+        'books': stats['books'],
+        'batch': batch,
+        'submit_batch_ms': {'p50': round(percentile(submit_times, 0.5) * 1000, 3),
+                            'p99': round(percentile(submit_times, 0.99) * 1000, 3)},
+        'cancel_batch_ms': {'p50': round(percentile(cancel_times, 0.5) * 1000, 3),
+                            'p99': round(percentile(cancel_times, 0.99) * 1000, 3)}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the outpost order book matching engine')
+    parser.add_argument('--operations', type=int, default=100000, help='order submissions and cancellations to run (default 100000)')
+    parser.add_argument('--batch', type=int, default=50, help='orders per bulk submit or cancel (default 50)')
+    parser.add_argument('--traders', type=int, default=100, help='simulated players (default 100)')
+    parser.add_argument('--outposts', type=int, default=4, help='outposts trading (default 4)')
+    parser.add_argument('--seed', type=int, default=1, help='seed the workload for repeatable runs')
+    parser.add_argument('--min-rate', type=float,
+                        help='exit with status 1 if fewer operations per second than this were sustained')
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    report = run(args.operations, args.batch, args.traders, args.outposts, seed=args.seed)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+
+    if args.min_rate is not None and report['operations_per_second'] < args.min_rate:
+        print(f"Too slow: {report['operations_per_second']:.0f} operations/s, wanted {args.min_rate:.0f}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
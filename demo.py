@@ -3,7 +3,7 @@
 Space Mining Empire Demo - Automated gameplay demonstration
 """
 
-from game.models import Player, Ship, ResourceType
+from game.models import Player, Ship, ResourceType, travel_fuel_cost
 from game.world_generator import WorldGenerator
 from game.shop import ShipShop
 
@@ -96,7 +96,7 @@ def main():
     if len(celestial_bodies) > 1:
         current_location = player.current_location
         destination = celestial_bodies[1]
-        fuel_cost = int(abs(destination.distance_from_start - current_location.distance_from_start) * 10)
+        fuel_cost = travel_fuel_cost(current_location, destination)
         
         print(f"Traveling from {current_location.name} to {destination.name}")
         print(f"Fuel cost: {fuel_cost}")
@@ -0,0 +1,216 @@
+"""
+Optional NumPy-backed columnar store for body resources and outpost prices
+"""
+
+from collections.abc import MutableMapping
+from typing import Dict, Iterable, List, Tuple
+
+from .models import CelestialBody, Outpost, ResourceType
+from .persistence import RESOURCE_CODES, RESOURCE_ORDER, RESOURCE_SLOTS
+from .rng import GAMMA, GameRandom
+
+try:
+    import numpy as np
+except ImportError:  # optional: pip install numpy
+    np = None
+
+HAVE_NUMPY = np is not None
+
+
+def uniforms(rng: GameRandom, count: int, low: float, high: float):
+    """The next ``count`` draws of ``rng.uniform(low, high)``, as one array.
+
+    GameRandom's n-th draw depends only on its seed and n, so the whole
+    batch is SplitMix64 over a range of counters, bit for bit what drawing
+    them one at a time would give.
+    """
+    z = np.uint64(rng.seed) + np.arange(rng.counter + 1, rng.counter + count + 1, dtype=np.uint64) * np.uint64(GAMMA)
+    rng.counter += count
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    z = z ^ (z >> np.uint64(31))
+    return low + (high - low) * ((z >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53)))
+
+
+class ColumnView(MutableMapping):
+    """One row of a store matrix, behaving like the ResourceType-keyed dict it replaced.
+
+    A presence mask keeps "absent" and "holds 0" apart, just like a missing
+    key and a key mapped to 0 in the original dict. Iteration follows the
+    fixed resource order rather than insertion order.
+    """
+
+    __slots__ = ('store', 'values', 'mask', 'row', 'kind')
+
+    def __init__(self, store: 'WorldStore', values: str, mask: str, row: int, kind):
+        self.store = store
+        self.values = values
+        self.mask = mask
+        self.row = row
+        self.kind = kind
+
+    def __getitem__(self, resource_type: ResourceType):
+        code = RESOURCE_CODES[resource_type]
+        if not getattr(self.store, self.mask)[self.row, code]:
+            raise KeyError(resource_type)
+        return self.kind(getattr(self.store, self.values)[self.row, code])
+
+    def __setitem__(self, resource_type: ResourceType, value):
+        code = RESOURCE_CODES[resource_type]
+        getattr(self.store, self.values)[self.row, code] = value
+        getattr(self.store, self.mask)[self.row, code] = True
+
+    def __delitem__(self, resource_type: ResourceType):
+        code = RESOURCE_CODES[resource_type]
+        mask = getattr(self.store, self.mask)
+        if not mask[self.row, code]:
+            raise KeyError(resource_type)
+        mask[self.row, code] = False
+
+    def __iter__(self):
+        present = getattr(self.store, self.mask)[self.row]
+        return (RESOURCE_ORDER[code] for code in range(RESOURCE_SLOTS) if present[code])
+
+    def __len__(self):
+        return int(getattr(self.store, self.mask)[self.row].sum())
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class WorldStore:
+    """Body x resource quantities and outpost x resource prices as NumPy matrices.
+
+    ``add_bodies`` moves each body's resources (and its outpost's price,
+    demand and market tables) into the matrices and swaps in ``ColumnView``s, so the bodies
+    and outposts keep working everywhere unchanged, while galaxy-wide
+    questions become single vectorized expressions over the columns.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        if np is None:
+            raise RuntimeError('The columnar world store needs NumPy (pip install numpy)')
+        self.bodies: List[CelestialBody] = []
+        self.outposts: List[Outpost] = []
+        self._outpost_rows: Dict[int, int] = {}
+        self.quantities = np.zeros((capacity, RESOURCE_SLOTS), dtype=np.int64)
+        self.present = np.zeros((capacity, RESOURCE_SLOTS), dtype=bool)
+        self.prices = np.zeros((capacity, RESOURCE_SLOTS), dtype=np.float64)
+        self.price_present = np.zeros((capacity, RESOURCE_SLOTS), dtype=bool)
+        self.multipliers = np.ones((capacity, RESOURCE_SLOTS), dtype=np.float64)
+        self.multiplier_present = np.zeros((capacity, RESOURCE_SLOTS), dtype=bool)
+        self.markets = np.ones((capacity, RESOURCE_SLOTS), dtype=np.float64)
+        self.market_present = np.zeros((capacity, RESOURCE_SLOTS), dtype=bool)
+
+    @classmethod
+    def from_bodies(cls, bodies: Iterable[CelestialBody]) -> 'WorldStore':
+        bodies = list(bodies)
+        store = cls(capacity=max(16, len(bodies)))
+        store.add_bodies(bodies)
+        return store
+
+    def add_bodies(self, bodies: Iterable[CelestialBody]):
+        for body in bodies:
+            if isinstance(body.resources, ColumnView) and body.resources.store is self:
+                continue
+            row = len(self.bodies)
+            self._reserve('quantities', 'present', row)
+            values = dict(body.resources)
+            self.bodies.append(body)
+            body.resources = ColumnView(self, 'quantities', 'present', row, int)
+            body.resources.update(values)
+            if body.outpost is not None:
+                self.add_outpost(body.outpost)
+
+    def add_outpost(self, outpost: Outpost) -> int:
+        row = self._outpost_rows.get(id(outpost))
+        if row is not None:
+            return row
+        row = len(self.outposts)
+        self._reserve('prices', 'price_present', row)
+        self._reserve('multipliers', 'multiplier_present', row, fill=1.0)
+        self._reserve('markets', 'market_present', row, fill=1.0)
+        prices, multipliers = dict(outpost.resource_prices), dict(outpost.demand_multipliers)
+        markets = dict(outpost.market_factors)
+        self.outposts.append(outpost)
+        self._outpost_rows[id(outpost)] = row
+        outpost.resource_prices = ColumnView(self, 'prices', 'price_present', row, float)
+        outpost.demand_multipliers = ColumnView(self, 'multipliers', 'multiplier_present', row, float)
+        outpost.market_factors = ColumnView(self, 'markets', 'market_present', row, float)
+        outpost.resource_prices.update(prices)
+        outpost.demand_multipliers.update(multipliers)
+        outpost.market_factors.update(markets)
+        return row
+
+    def outpost_row(self, outpost: Outpost) -> int:
+        return self._outpost_rows[id(outpost)]
+
+    def _reserve(self, values: str, mask: str, row: int, fill=0):
+        """Grow a matrix pair (doubling) so that ``row`` exists"""
+        matrix = getattr(self, values)
+        if row < len(matrix):
+            return
+        extra = len(matrix)
+        grown = np.full((extra, RESOURCE_SLOTS), fill, dtype=matrix.dtype)
+        setattr(self, values, np.concatenate([matrix, grown]))
+        setattr(self, mask, np.concatenate([getattr(self, mask), np.zeros((extra, RESOURCE_SLOTS), dtype=bool)]))
+
+    # Vectorized queries over the whole world
+
+    def sell_prices(self):
+        """Outpost x resource matrix of Outpost.get_sell_price"""
+        count = len(self.outposts)
+        base = np.where(self.price_present[:count], self.prices[:count], 0.0)
+        base = base * np.where(self.multiplier_present[:count], self.multipliers[:count], 1.0)
+        return base * np.where(self.market_present[:count], self.markets[:count], 1.0)
+
+    def best_sell_prices(self) -> Dict[ResourceType, Tuple[float, Outpost]]:
+        """Best price for each resource and the outpost paying it"""
+        if not self.outposts:
+            return {}
+        prices = self.sell_prices()
+        rows = prices.argmax(axis=0)
+        return {resource_type: (float(prices[rows[code], code]), self.outposts[rows[code]])
+                for code, resource_type in enumerate(RESOURCE_ORDER)}
+
+    def resource_totals(self) -> Dict[ResourceType, int]:
+        """Units of each resource left across every body"""
+        count = len(self.bodies)
+        totals = np.where(self.present[:count], self.quantities[:count], 0).sum(axis=0)
+        return {resource_type: int(totals[code]) for code, resource_type in enumerate(RESOURCE_ORDER)}
+
+    def depleted_bodies(self) -> List[CelestialBody]:
+        """Bodies whose every deposit is mined out"""
+        count = len(self.bodies)
+        present = self.present[:count]
+        holding = (present & (self.quantities[:count] > 0)).any(axis=1)
+        rows = np.flatnonzero(present.any(axis=1) & ~holding)
+        return [self.bodies[row] for row in rows]
+
+    def cargo_values(self, cargo: Dict[ResourceType, int]):
+        """``cargo`` valued at each outpost's current prices, as one array in outpost order.
+
+        Linear in the amounts: an upper bound on what selling pays, since a
+        sale pushes the market down as it goes (see simulation.quote).
+        """
+        amounts = np.zeros(RESOURCE_SLOTS)
+        for resource_type, amount in cargo.items():
+            amounts[RESOURCE_CODES[resource_type]] = amount
+        return self.sell_prices() @ amounts
+
+    # Vectorized world ticks
+
+    def drift_markets(self, rng: GameRandom, pull: float, drift: float, bounds: Tuple[float, float]) -> bool:
+        """One tick of simulation.drift_markets over every priced market at once; returns whether any moved"""
+        count = len(self.outposts)
+        rows, codes = np.nonzero(self.price_present[:count])
+        before = np.where(self.market_present[rows, codes], self.markets[rows, codes], 1.0)
+        factors = np.clip(before + (pull * (1.0 - before) + uniforms(rng, len(rows), -drift, drift)), *bounds)
+        self.markets[rows, codes] = factors
+        self.market_present[rows, codes] = True
+        return bool(np.any(factors != before))
+
+    def memory_bytes(self) -> int:
+        return sum(matrix.nbytes for matrix in (self.quantities, self.present, self.prices, self.price_present,
+                                                self.multipliers, self.multiplier_present,
+                                                self.markets, self.market_present))
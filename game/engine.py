@@ -8,12 +8,18 @@ from rich.table import Table
 from rich.panel import Panel
 from rich.prompt import Prompt, IntPrompt
 
-from .models import Player, Ship, CelestialBody, Outpost, ResourceType
+from .models import Player, Ship, CelestialBody, Outpost, ResourceType, travel_fuel_cost
+from .rng import GameRandom
 from .world_generator import WorldGenerator
 from .shop import ShipShop
+from .simulation import World, sell
+from .spatial import BodyIndex
 
 
 class GameEngine:
+    # Destinations offered in the travel menu
+    MAX_LISTED_DESTINATIONS = 20
+    
     def __init__(self):
         self.console = Console()
         self.world_gen = WorldGenerator()
@@ -22,6 +28,9 @@ class GameEngine:
         self.celestial_bodies = []
         self.outposts = []
         self.current_turn = 1
+        self.rng = GameRandom()
+        self.world = World()
+        self._spatial = None
         
     def initialize_game(self):
         self.console.print("[bold blue]Welcome to Space Mining Empire![/bold blue]")
@@ -45,7 +54,9 @@ class GameEngine:
             current_ship=starter_ship
         )
         
-        self.celestial_bodies = self.world_gen.generate_starting_system()
+        self.rng = GameRandom()
+        self.world = World()
+        self.celestial_bodies = self.world_gen.generate_starting_system(self.rng)
         self.player.current_location = self.celestial_bodies[0]
         
         self.console.print(f"\n[green]Welcome aboard, Commander {player_name}![/green]")
@@ -76,6 +87,7 @@ class GameEngine:
     
     def display_location_info(self):
         location = self.player.current_location
+        self.world.settle(location)
         
         panel_content = f"[bold]{location.name}[/bold]\n"
         panel_content += f"Distance from start: {location.distance_from_start:.1f} AU\n"
@@ -91,6 +103,7 @@ class GameEngine:
     def mine_resources(self):
         location = self.player.current_location
         ship = self.player.current_ship
+        self.world.settle(location)
         
         available_resources = [rt for rt, amount in location.resources.items() if amount > 0]
         
@@ -112,7 +125,7 @@ class GameEngine:
             return
         
         resource_type = available_resources[choice - 1]
-        mined_amount = location.mine_resource(resource_type, ship.mining_efficiency)
+        mined_amount = self.world.mine(location, resource_type, ship.mining_efficiency, self.rng)
         
         if mined_amount > 0:
             added_amount = ship.add_cargo(resource_type, mined_amount)
@@ -179,7 +192,7 @@ class GameEngine:
             for resource_type in list(cargo_resources):
                 amount = self.player.current_ship.remove_cargo(resource_type, 
                                                              self.player.current_ship.cargo[resource_type])
-                earnings = amount * outpost.get_sell_price(resource_type)
+                earnings = sell(outpost, resource_type, amount)
                 total_earnings += earnings
             
             self.player.credits += total_earnings
@@ -205,7 +218,7 @@ class GameEngine:
             )
             
             removed_amount = self.player.current_ship.remove_cargo(selected_resource, amount_to_sell)
-            earnings = removed_amount * outpost.get_sell_price(selected_resource)
+            earnings = sell(outpost, selected_resource, removed_amount)
             self.player.credits += earnings
             
             self.console.print(f"[green]Sold {removed_amount} {selected_resource.value} for {earnings:.0f} credits![/green]")
@@ -214,7 +227,10 @@ class GameEngine:
         current_location = self.player.current_location
         ship = self.player.current_ship
         
-        available_locations = [body for body in self.celestial_bodies if body != current_location]
+        # Nearest first, through the spatial index, so a big map doesn't flood the menu
+        nearest = self.spatial_index().all.nearest(current_location.position, self.MAX_LISTED_DESTINATIONS + 1)
+        available_locations = [self.celestial_bodies[i] for _, i in nearest
+                               if self.celestial_bodies[i] is not current_location][:self.MAX_LISTED_DESTINATIONS]
         
         if not available_locations:
             self.console.print("[red]No other locations available![/red]")
@@ -222,7 +238,7 @@ class GameEngine:
         
         self.console.print("Available destinations:")
         for i, body in enumerate(available_locations, 1):
-            fuel_cost = int(abs(body.distance_from_start - current_location.distance_from_start) * 10)
+            fuel_cost = travel_fuel_cost(current_location, body)
             fuel_status = "[green]✓[/green]" if ship.current_fuel >= fuel_cost else "[red]✗[/red]"
             self.console.print(f"{i}. {body.name} (Distance: {body.distance_from_start:.1f} AU, Fuel cost: {fuel_cost}) {fuel_status}")
         
@@ -235,7 +251,7 @@ class GameEngine:
             return
         
         destination = available_locations[choice - 1]
-        fuel_cost = int(abs(destination.distance_from_start - current_location.distance_from_start) * 10)
+        fuel_cost = travel_fuel_cost(current_location, destination)
         
         if ship.current_fuel < fuel_cost:
             self.console.print(f"[red]Not enough fuel! Need {fuel_cost}, have {ship.current_fuel}[/red]")
@@ -247,6 +263,12 @@ class GameEngine:
         self.console.print(f"[green]Traveled to {destination.name}! Used {fuel_cost} fuel.[/green]")
         self.console.print(f"Remaining fuel: {ship.current_fuel}/{ship.fuel_capacity}")
     
+    def spatial_index(self):
+        """Spatial index over celestial_bodies; bodies appended are added to it, anything else rebuilds it"""
+        if self._spatial is None or not self._spatial.update(self.celestial_bodies):
+            self._spatial = BodyIndex(self.celestial_bodies)
+        return self._spatial
+    
     def visit_ship_shop(self):
         self.console.print("\n[bold]Welcome to the Ship Shop![/bold]")
         self.console.print("1. View ship upgrades")
@@ -371,6 +393,16 @@ class GameEngine:
         self.player.current_ship = self.player.ships[choice - 1]
         self.console.print(f"[green]Switched to {self.player.current_ship.name}![/green]")
     
+    def end_turn(self):
+        self.current_turn += 1
+        summary = self.world.advance(self.celestial_bodies, self.rng)
+        self.console.print(f"[blue]Turn {self.current_turn} begins![/blue]")
+        if summary['regrowing']:
+            self.console.print(f"{summary['regrowing']} mined deposits are growing back.")
+        for event in self.world.upcoming():
+            self.console.print(f"[yellow]Demand surge for {event['resource']} expected at {event['outpost']} "
+                               f"on tick {event['tick']}[/yellow]")
+    
     def show_main_menu(self):
         self.console.print("\n[bold]What would you like to do?[/bold]")
         self.console.print("1. Mine resources")
@@ -409,8 +441,7 @@ class GameEngine:
             elif choice == 6:
                 self.display_status()
             elif choice == 7:
-                self.current_turn += 1
-                self.console.print(f"[blue]Turn {self.current_turn} begins![/blue]")
+                self.end_turn()
             
             if choice != 0:
                 Prompt.ask("\nPress Enter to continue")
\ No newline at end of file
@@ -0,0 +1,101 @@
+"""
+Server-sent event streams of game state deltas
+"""
+
+import json
+import threading
+from typing import Dict, List, Optional
+
+
+HEARTBEAT_INTERVAL = 15.0
+HEARTBEAT = b': heartbeat\n\n'
+
+
+def format_event(event: str, data) -> bytes:
+    """Encode one message in the text/event-stream wire format"""
+    payload = json.dumps(data, separators=(',', ':'))
+    return f'event: {event}\ndata: {payload}\n\n'.encode('utf-8')
+
+
+class Subscription:
+    """One listener's pending changes.
+
+    Updates are coalesced per field rather than queued, so a consumer that
+    falls behind only ever holds the latest value of each field: the buffer
+    is bounded by the number of tracked fields no matter how fast the game
+    changes.
+    """
+
+    def __init__(self, initial_state: Dict):
+        self.pending = dict(initial_state)
+        self.closed = False
+        self._cond = threading.Condition()
+
+    def push(self, delta: Dict):
+        with self._cond:
+            self.pending.update(delta)
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+
+    def wait(self, timeout: float = HEARTBEAT_INTERVAL) -> Optional[Dict]:
+        """Block until there are changes to send; None means the timeout passed (or closed)"""
+        with self._cond:
+            if not self.pending and not self.closed:
+                self._cond.wait(timeout)
+            if self.closed or not self.pending:
+                return None
+            delta, self.pending = self.pending, {}
+            return delta
+
+
+class EventStream:
+    """Fans engine state changes out to the subscriptions of one game.
+
+    The publisher keeps the last state it saw and hands each subscriber
+    only the fields that differ from it.
+    """
+
+    def __init__(self, max_subscribers: int = 4):
+        self.max_subscribers = max_subscribers
+        self.subscribers: List[Subscription] = []
+        self._last_state: Dict = {}
+        self._lock = threading.Lock()
+
+    @property
+    def has_subscribers(self) -> bool:
+        return bool(self.subscribers)
+
+    def subscribe(self, current_state: Dict) -> Subscription:
+        subscription = Subscription(current_state)
+        with self._lock:
+            self._last_state = dict(current_state)
+            self.subscribers.append(subscription)
+            # A player opening tab after tab should not pin a worker per tab forever
+            while len(self.subscribers) > self.max_subscribers:
+                self.subscribers.pop(0).close()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self.subscribers:
+                self.subscribers.remove(subscription)
+        subscription.close()
+
+    def publish(self, state: Dict):
+        with self._lock:
+            delta = {key: value for key, value in state.items() if self._last_state.get(key) != value}
+            self._last_state = state
+            if not delta:
+                return
+            for subscription in self.subscribers:
+                subscription.push(delta)
+
+    def close_all(self):
+        with self._lock:
+            subscribers, self.subscribers = self.subscribers, []
+        for subscription in subscribers:
+            subscription.close()
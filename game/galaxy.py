@@ -0,0 +1,116 @@
+"""
+Procedural galaxy, generated sector by sector on demand
+"""
+
+import math
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .models import CelestialBody
+from .rng import GameRandom
+from .world_generator import WorldGenerator
+
+
+SectorKey = Tuple[int, int, int]
+
+# About a million bodies with the default sector density
+DEFAULT_SECTORS = (320, 320, 1)
+DEFAULT_SECTOR_SIZE = 10.0
+DEFAULT_BODIES_PER_SECTOR = (6, 14)
+
+
+class Galaxy:
+    """A seeded galaxy of ``sectors`` cubes, each ``sector_size`` across.
+
+    A sector's bodies are generated the first time something asks for them,
+    from a random stream derived from the galaxy seed and the sector's
+    coordinates, so the same seed always yields the same galaxy no matter
+    which sectors are visited or in what order. Only generated sectors take
+    memory; a galaxy with one layer of sectors (the default) is flat.
+    """
+
+    def __init__(self, seed: int, sectors: SectorKey = DEFAULT_SECTORS,
+                 sector_size: float = DEFAULT_SECTOR_SIZE,
+                 bodies_per_sector: Tuple[int, int] = DEFAULT_BODIES_PER_SECTOR,
+                 generator: Optional[WorldGenerator] = None):
+        self.seed = seed
+        self.shape = tuple(sectors)
+        self.sector_size = sector_size
+        self.bodies_per_sector = bodies_per_sector
+        self.generator = generator or WorldGenerator()
+        self.flat = self.shape[2] == 1
+        self._root = GameRandom(seed)
+        self._sectors: Dict[SectorKey, List[CelestialBody]] = {}
+
+    @property
+    def sector_count(self) -> int:
+        return self.shape[0] * self.shape[1] * self.shape[2]
+
+    @property
+    def expected_body_count(self) -> int:
+        low, high = self.bodies_per_sector
+        return self.sector_count * (low + high) // 2
+
+    @property
+    def loaded_sector_count(self) -> int:
+        return len(self._sectors)
+
+    def contains(self, key: SectorKey) -> bool:
+        return all(0 <= key[axis] < self.shape[axis] for axis in range(3))
+
+    def sector_key(self, position: Tuple[float, float, float]) -> SectorKey:
+        return tuple(int(math.floor(position[axis] / self.sector_size)) for axis in range(3))
+
+    def sector_origin(self, key: SectorKey) -> Tuple[float, float, float]:
+        return tuple(key[axis] * self.sector_size for axis in range(3))
+
+    def _sector_rng(self, key: SectorKey) -> GameRandom:
+        x, y, z = key
+        return self._root.spawn((z * self.shape[1] + y) * self.shape[0] + x)
+
+    def is_loaded(self, key: SectorKey) -> bool:
+        return key in self._sectors
+
+    def sector(self, key: SectorKey) -> List[CelestialBody]:
+        """Bodies of one sector, generating it on first use"""
+        bodies = self._sectors.get(key)
+        if bodies is None:
+            if not self.contains(key):
+                raise KeyError(f'Sector {key} is outside the galaxy')
+            rng = self._sector_rng(key)
+            count = rng.randint(*self.bodies_per_sector)
+            bodies = self.generator.generate_sector(rng, self.sector_origin(key), self.sector_size, count,
+                                                    flat=self.flat)
+            self._sectors[key] = bodies
+        return bodies
+
+    def sectors_within(self, position: Tuple[float, float, float], radius: float) -> Iterator[SectorKey]:
+        """Keys of every sector that overlaps the box around a sphere, clipped to the galaxy"""
+        low = self.sector_key(tuple(position[axis] - radius for axis in range(3)))
+        high = self.sector_key(tuple(position[axis] + radius for axis in range(3)))
+        low = [max(0, low[axis]) for axis in range(3)]
+        high = [min(self.shape[axis] - 1, high[axis]) for axis in range(3)]
+        for z in range(low[2], high[2] + 1):
+            for y in range(low[1], high[1] + 1):
+                for x in range(low[0], high[0] + 1):
+                    yield (x, y, z)
+
+    def bodies_within(self, position: Tuple[float, float, float], radius: float) -> List[CelestialBody]:
+        """Every body within ``radius`` of ``position``, generating only the sectors that can hold one"""
+        found = []
+        for key in self.sectors_within(position, radius):
+            for body in self.sector(key):
+                if math.dist(position, body.position) <= radius:
+                    found.append(body)
+        return found
+
+    def loaded_bodies(self) -> Iterator[CelestialBody]:
+        for bodies in self._sectors.values():
+            yield from bodies
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'sectors': self.sector_count,
+            'loaded_sectors': len(self._sectors),
+            'expected_bodies': self.expected_body_count,
+            'loaded_bodies': sum(len(bodies) for bodies in self._sectors.values())
+        }
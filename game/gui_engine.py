@@ -7,9 +7,11 @@ from tkinter import ttk, messagebox, simpledialog, font
 from typing import Dict, List, Optional
 import random
 
-from .models import Player, Ship, CelestialBody, Outpost, ResourceType
+from .models import Player, Ship, CelestialBody, Outpost, ResourceType, travel_fuel_cost
+from .rng import GameRandom
 from .world_generator import WorldGenerator
 from .shop import ShipShop
+from .simulation import World, sell
 
 
 class GameGUI:
@@ -26,6 +28,8 @@ class GameGUI:
         self.celestial_bodies = []
         self.outposts = []
         self.current_turn = 1
+        self.rng = GameRandom()
+        self.world = World()
         
         # UI variables
         self.status_frame = None
@@ -85,7 +89,9 @@ class GameGUI:
         )
         
         # Generate world
-        self.celestial_bodies = self.world_gen.generate_starting_system()
+        self.rng = GameRandom()
+        self.world = World()
+        self.celestial_bodies = self.world_gen.generate_starting_system(self.rng)
         self.outposts = self.world_gen.generate_outposts()
         self.player.current_location = self.celestial_bodies[0]
         
@@ -209,6 +215,7 @@ class GameGUI:
         
         ttk.Label(resources_frame, text="Available Resources:", style='Header.TLabel').pack(pady=10)
         
+        self.world.settle(location)
         available_resources = [(rt, amount) for rt, amount in location.resources.items() if amount > 0]
         
         if not available_resources:
@@ -235,7 +242,7 @@ class GameGUI:
         location = self.player.current_location
         ship = self.player.current_ship
         
-        mined_amount = location.mine_resource(resource_type, ship.mining_efficiency)
+        mined_amount = self.world.mine(location, resource_type, ship.mining_efficiency, self.rng)
         
         if mined_amount > 0:
             added_amount = ship.add_cargo(resource_type, mined_amount)
@@ -255,6 +262,7 @@ class GameGUI:
         
     def show_location_info(self):
         location = self.player.current_location
+        self.world.settle(location)
         
         info_text = f"Location: {location.name}\n"
         info_text += f"Distance from start: {location.distance_from_start:.1f} AU\n"
@@ -292,7 +300,7 @@ class GameGUI:
             destinations_frame.pack(fill=tk.BOTH, expand=True, padx=20)
             
             for body in available_locations:
-                fuel_cost = int(abs(body.distance_from_start - current_location.distance_from_start) * 10)
+                fuel_cost = travel_fuel_cost(current_location, body)
                 can_travel = ship.current_fuel >= fuel_cost
                 
                 frame = tk.Frame(destinations_frame, bg='#1a1a2e', relief=tk.RAISED, bd=1)
@@ -319,7 +327,7 @@ class GameGUI:
         current_location = self.player.current_location
         ship = self.player.current_ship
         
-        fuel_cost = int(abs(destination.distance_from_start - current_location.distance_from_start) * 10)
+        fuel_cost = travel_fuel_cost(current_location, destination)
         
         if ship.current_fuel < fuel_cost:
             messagebox.showerror("Insufficient Fuel", 
@@ -421,10 +429,8 @@ class GameGUI:
         if amount == 0:
             return
             
-        price = outpost.get_sell_price(resource_type)
-        earnings = amount * price
-        
         self.player.current_ship.remove_cargo(resource_type, amount)
+        earnings = sell(outpost, resource_type, amount)
         self.player.credits += earnings
         
         messagebox.showinfo("Sale Complete", 
@@ -444,7 +450,7 @@ class GameGUI:
         for resource_type in list(self.player.current_ship.cargo.keys()):
             amount = self.player.current_ship.remove_cargo(resource_type, 
                                                          self.player.current_ship.cargo[resource_type])
-            earnings = amount * outpost.get_sell_price(resource_type)
+            earnings = sell(outpost, resource_type, amount)
             total_earnings += earnings
             sold_items.append(f"{amount} {resource_type.value}")
         
@@ -575,5 +581,11 @@ class GameGUI:
         
     def end_turn(self):
         self.current_turn += 1
-        messagebox.showinfo("Turn Complete", f"Turn {self.current_turn} begins!")
-        self.update_status_panel()
\ No newline at end of file
+        summary = self.world.advance(self.celestial_bodies, self.rng)
+        lines = [f"Turn {self.current_turn} begins!"]
+        if summary['regrowing']:
+            lines.append(f"{summary['regrowing']} mined deposits are growing back.")
+        for event in self.world.upcoming():
+            lines.append(f"Demand surge for {event['resource']} expected at {event['outpost']} on tick {event['tick']}")
+        messagebox.showinfo("Turn Complete", "\n".join(lines))
+        self.update_status_panel()
@@ -0,0 +1,414 @@
+"""
+Append-only journal of game actions, with snapshot compaction for crash recovery
+"""
+
+import glob
+import os
+import struct
+import threading
+import zlib
+from typing import Iterator, List, Optional, Tuple
+
+from .models import ResourceType
+from .orderbook import SIDES
+from .persistence import (RESOURCE_CODES, RESOURCE_ORDER, SaveFormatError, dump_exchange, dump_sessions,
+                          load_exchange, load_sessions, write_file_atomic)
+
+
+# Every record is framed as length + CRC32 + payload, so a write torn by a
+# crash is detected and the journal is replayed up to the last whole record.
+FRAME = struct.Struct('<II')
+RECORD_HEAD = struct.Struct('<QBH')         # session sequence number, action, token length
+MINE_ARGS = struct.Struct('<BI')            # resource code, amount mined
+TRAVEL_ARGS = struct.Struct('<I')           # destination index
+TRADE_ARGS = struct.Struct('<BB')           # resource code (NO_RESOURCE = sell all), sell_all
+BUY_ARGS = struct.Struct('<BH')             # item type, item index
+REFUEL_ARGS = struct.Struct('<I')           # fuel bought
+TICK_ARGS = struct.Struct('<I')             # world ticks run
+LEDGER_ARGS = struct.Struct('<dB')          # credits delta, cargo entries that follow
+LEDGER_ITEM = struct.Struct('<Bi')          # resource code, units delta
+NAME_LEN = struct.Struct('<H')              # length of an owner or market name that follows
+ORDER_COUNT = struct.Struct('<I')           # orders that follow
+ORDER_ITEM = struct.Struct('<BBdI')         # side, resource code, limit price, quantity
+CANCEL_ARGS = struct.Struct('<BI')          # all open orders, order ids that follow
+ORDER_ID = struct.Struct('<Q')
+COLLECT_ARGS = struct.Struct('<q')          # cargo room
+WITHDRAW_ARGS = struct.Struct('<qB')        # cargo room, leaving
+SEQ = struct.Struct('<Q')
+
+# Codes are written to disk: never renumber, only append
+(ACTION_INIT, ACTION_MINE, ACTION_TRAVEL, ACTION_TRADE, ACTION_BUY, ACTION_DROP, ACTION_REFUEL,
+ ACTION_TICK, ACTION_END_TURN, ACTION_LEDGER, ACTION_ORDER, ACTION_CANCEL, ACTION_COLLECT,
+ ACTION_WITHDRAW) = range(14)
+ACTION_CODES = {'init': ACTION_INIT, 'mine': ACTION_MINE, 'travel': ACTION_TRAVEL,
+                'trade': ACTION_TRADE, 'buy': ACTION_BUY, 'drop': ACTION_DROP, 'refuel': ACTION_REFUEL,
+                'tick': ACTION_TICK, 'end_turn': ACTION_END_TURN, 'ledger': ACTION_LEDGER,
+                'order': ACTION_ORDER, 'cancel': ACTION_CANCEL, 'collect': ACTION_COLLECT,
+                'withdraw': ACTION_WITHDRAW}
+ACTION_NAMES = {code: name for name, code in ACTION_CODES.items()}
+ITEM_TYPES = ('upgrade', 'ship')
+NO_RESOURCE = 0xFF
+# Records of the shared order books (see orderbook.py) are journaled under this token, with
+# the exchange's own sequence numbers; session tokens never contain '#'
+EXCHANGE_TOKEN = '#exchange'
+
+DEFAULT_SYNC_INTERVAL = 0.05
+DEFAULT_COMPACT_BYTES = 8 * 1024 * 1024
+
+
+def encode_record(token: str, seq: int, action: str, args: tuple) -> bytes:
+    token_bytes = token.encode('utf-8')
+    code = ACTION_CODES[action]
+    if code == ACTION_INIT:
+        body = args[0]
+    elif code == ACTION_MINE:
+        body = MINE_ARGS.pack(RESOURCE_CODES[ResourceType(args[0])], args[1])
+    elif code == ACTION_TRAVEL:
+        body = TRAVEL_ARGS.pack(args[0])
+    elif code == ACTION_TRADE:
+        resource_code = NO_RESOURCE if args[0] is None else RESOURCE_CODES[ResourceType(args[0])]
+        body = TRADE_ARGS.pack(resource_code, bool(args[1]))
+    elif code == ACTION_BUY:
+        body = BUY_ARGS.pack(ITEM_TYPES.index(args[0]), args[1])
+    elif code == ACTION_REFUEL:
+        body = REFUEL_ARGS.pack(args[0])
+    elif code == ACTION_TICK:
+        body = TICK_ARGS.pack(args[0])
+    elif code == ACTION_LEDGER:
+        credits, cargo = args
+        body = LEDGER_ARGS.pack(credits, len(cargo)) + b''.join(
+            LEDGER_ITEM.pack(RESOURCE_CODES[ResourceType(name)], delta) for name, delta in cargo)
+    elif code == ACTION_ORDER:
+        owner, market, requests = args
+        body = _pack_name(owner) + _pack_name(market) + ORDER_COUNT.pack(len(requests)) + b''.join(
+            ORDER_ITEM.pack(SIDES.index(side), RESOURCE_CODES[resource_type], price, quantity)
+            for side, resource_type, price, quantity in requests)
+    elif code == ACTION_CANCEL:
+        owner, order_ids = args
+        body = _pack_name(owner) + CANCEL_ARGS.pack(order_ids is None, len(order_ids or ())) + b''.join(
+            ORDER_ID.pack(order_id) for order_id in order_ids or ())
+    elif code == ACTION_COLLECT:
+        body = _pack_name(args[0]) + COLLECT_ARGS.pack(args[1])
+    elif code == ACTION_WITHDRAW:
+        body = _pack_name(args[0]) + WITHDRAW_ARGS.pack(args[1], args[2])
+    else:
+        body = b''
+    payload = RECORD_HEAD.pack(seq, code, len(token_bytes)) + token_bytes + body
+    return FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def decode_record(payload: bytes) -> Tuple[str, int, str, tuple]:
+    seq, code, token_length = RECORD_HEAD.unpack_from(payload)
+    offset = RECORD_HEAD.size
+    token = payload[offset:offset + token_length].decode('utf-8')
+    body = payload[offset + token_length:]
+    if code == ACTION_INIT:
+        args = (bytes(body),)
+    elif code == ACTION_MINE:
+        resource_code, amount = MINE_ARGS.unpack(body)
+        args = (RESOURCE_ORDER[resource_code].value, amount)
+    elif code == ACTION_TRAVEL:
+        args = TRAVEL_ARGS.unpack(body)
+    elif code == ACTION_TRADE:
+        resource_code, sell_all = TRADE_ARGS.unpack(body)
+        args = (None if resource_code == NO_RESOURCE else RESOURCE_ORDER[resource_code].value, bool(sell_all))
+    elif code == ACTION_BUY:
+        item_type, index = BUY_ARGS.unpack(body)
+        args = (ITEM_TYPES[item_type], index)
+    elif code == ACTION_REFUEL:
+        args = REFUEL_ARGS.unpack(body)
+    elif code == ACTION_TICK:
+        args = TICK_ARGS.unpack(body)
+    elif code == ACTION_LEDGER:
+        credits, count = LEDGER_ARGS.unpack_from(body)
+        cargo = []
+        for index in range(count):
+            resource_code, delta = LEDGER_ITEM.unpack_from(body, LEDGER_ARGS.size + index * LEDGER_ITEM.size)
+            cargo.append((RESOURCE_ORDER[resource_code].value, delta))
+        args = (credits, tuple(cargo))
+    elif code == ACTION_ORDER:
+        owner, offset = _unpack_name(body, 0)
+        market, offset = _unpack_name(body, offset)
+        (count,) = ORDER_COUNT.unpack_from(body, offset)
+        offset += ORDER_COUNT.size
+        requests = []
+        for index in range(count):
+            side, resource_code, price, quantity = ORDER_ITEM.unpack_from(body, offset + index * ORDER_ITEM.size)
+            requests.append((SIDES[side], RESOURCE_ORDER[resource_code], price, quantity))
+        args = (owner, market, tuple(requests))
+    elif code == ACTION_CANCEL:
+        owner, offset = _unpack_name(body, 0)
+        every, count = CANCEL_ARGS.unpack_from(body, offset)
+        offset += CANCEL_ARGS.size
+        order_ids = tuple(ORDER_ID.unpack_from(body, offset + index * ORDER_ID.size)[0] for index in range(count))
+        args = (owner, None if every else order_ids)
+    elif code == ACTION_COLLECT:
+        owner, offset = _unpack_name(body, 0)
+        args = (owner,) + COLLECT_ARGS.unpack_from(body, offset)
+    elif code == ACTION_WITHDRAW:
+        owner, offset = _unpack_name(body, 0)
+        room, leaving = WITHDRAW_ARGS.unpack_from(body, offset)
+        args = (owner, room, bool(leaving))
+    elif code in (ACTION_DROP, ACTION_END_TURN):
+        args = ()
+    else:
+        raise SaveFormatError(f'Unknown journal action code {code}')
+    return token, seq, ACTION_NAMES[code], args
+
+
+def _pack_name(name: str) -> bytes:
+    data = name.encode('utf-8')
+    return NAME_LEN.pack(len(data)) + data
+
+
+def _unpack_name(body, offset: int) -> Tuple[str, int]:
+    (length,) = NAME_LEN.unpack_from(body, offset)
+    start = offset + NAME_LEN.size
+    return bytes(body[start:start + length]).decode('utf-8'), start + length
+
+
+def read_records(path: str) -> Iterator[Tuple[str, int, str, tuple]]:
+    """Yield the whole records of one journal file, stopping at a torn or corrupt tail"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    offset = 0
+    while offset + FRAME.size <= len(data):
+        length, crc = FRAME.unpack_from(data, offset)
+        start = offset + FRAME.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        yield decode_record(payload)
+        offset = start + length
+
+
+class Journal:
+    """Durable log of every session's actions.
+
+    Actions are appended to an in-memory buffer (cheap, under one short lock)
+    and a background thread writes and fsyncs the buffer every
+    ``sync_interval`` seconds, so one fsync covers every action in that
+    window. A crash can lose at most that window. The buffer is swapped out
+    under the short lock and written under a separate file lock, so play
+    never waits on the disk.
+
+    Files live in ``directory`` as numbered generations: ``snapshot-N.bin``
+    holds every game as of some moment during generation N, and
+    ``journal-N.log`` (plus any later logs) the actions since. Once the
+    current log passes ``compact_bytes``, compaction starts a new generation
+    and writes its snapshot in the background, then deletes the older files,
+    so recovery never replays more than about one log's worth of actions.
+    Snapshots are taken session by session while play continues; each
+    session's snapshot records the sequence number of its last applied
+    action, and replay skips anything the snapshot already contains. The
+    shared order books are journaled and snapshotted the same way, as one
+    more stream under ``EXCHANGE_TOKEN``.
+    """
+
+    def __init__(self, directory: str, sync_interval: float = DEFAULT_SYNC_INTERVAL,
+                 compact_bytes: int = DEFAULT_COMPACT_BYTES):
+        self.directory = directory
+        self.sync_interval = sync_interval
+        self.compact_bytes = compact_bytes
+        self.sessions = None
+        self.generation = 0
+        self.log_bytes = 0
+        self.compactions = 0
+        self._file = None
+        self._buffer: List[bytes] = []
+        # Guards the buffer only; never held across file I/O
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        # Serializes writes to the log file and switching it to a new generation
+        self._file_lock = threading.Lock()
+        # Held for a whole compaction; also guards _compacting
+        self._compact_lock = threading.Lock()
+        self._compacting = False
+        self._closed = False
+        self._flusher: Optional[threading.Thread] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, kind: str, generation: int) -> str:
+        extension = 'bin' if kind == 'snapshot' else 'log'
+        return os.path.join(self.directory, f'{kind}-{generation:08d}.{extension}')
+
+    def _generations(self, kind: str) -> List[int]:
+        pattern = os.path.join(self.directory, f'{kind}-*.{"bin" if kind == "snapshot" else "log"}')
+        return sorted(int(os.path.basename(path).split('-')[1].split('.')[0]) for path in glob.glob(pattern))
+
+    def recover(self, sessions) -> int:
+        """Rebuild ``sessions`` from the newest snapshot plus the journal; returns actions replayed"""
+        snapshots = self._generations('snapshot')
+        base = snapshots[-1] if snapshots else 0
+        if snapshots:
+            with open(self._path('snapshot', base), 'rb') as f:
+                for token, data in load_sessions(f.read()):
+                    if token == EXCHANGE_TOKEN:
+                        load_exchange(sessions.exchange, data)
+                        continue
+                    engine = sessions.engine_factory()
+                    engine.load_state(data[SEQ.size:])
+                    (engine.journal_seq,) = SEQ.unpack_from(data)
+                    sessions.create(token, engine)
+
+        replayed = 0
+        logs = [generation for generation in self._generations('journal') if generation >= base]
+        for generation in logs:
+            for token, seq, action, args in read_records(self._path('journal', generation)):
+                if token == EXCHANGE_TOKEN:
+                    # The books replay in the order their changes were made, independently of the games
+                    exchange = sessions.exchange
+                    if seq > exchange.journal_seq:
+                        exchange.replay_action(action, args)
+                        exchange.journal_seq = seq
+                        replayed += 1
+                    continue
+                if action == 'drop':
+                    sessions.remove(token)
+                    continue
+                session = sessions.get(token)
+                if session is None:
+                    if action != 'init':
+                        # Dropped, or evicted and dropped before the crash
+                        continue
+                    session = sessions.create(token)
+                engine = session.engine
+                if seq <= engine.journal_seq:
+                    continue
+                engine.replay_action(action, args)
+                engine.journal_seq = seq
+                replayed += 1
+
+        self.generation = max([base] + logs)
+        return replayed
+
+    def attach(self, sessions):
+        """Start journaling every session's actions and open a fresh generation"""
+        self.sessions = sessions
+        sessions.journal = self
+        for session in list(sessions.sessions.values()):
+            self.track(session)
+        exchange = sessions.exchange
+
+        def record_exchange(action, args):
+            # Called under the exchange lock, so sequence numbers follow the order changes were applied in
+            exchange.journal_seq += 1
+            self.append(encode_record(EXCHANGE_TOKEN, exchange.journal_seq, action, args))
+
+        exchange.recorder = record_exchange
+        # Fold whatever was recovered into a new snapshot, so the next recovery starts from here
+        self.compact()
+        self._flusher = threading.Thread(target=self._flush_loop, name='journal-flusher', daemon=True)
+        self._flusher.start()
+
+    def track(self, session):
+        token = session.token
+
+        def recorder(engine, action, args):
+            engine.journal_seq += 1
+            self.append(encode_record(token, engine.journal_seq, action, args))
+
+        session.engine.recorder = recorder
+
+    def record_drop(self, session):
+        self.append(encode_record(session.token, session.engine.journal_seq + 1, 'drop', ()))
+
+    def append(self, record: bytes):
+        with self._lock:
+            self._buffer.append(record)
+
+    def _flush_loop(self):
+        while True:
+            with self._wakeup:
+                if not self._closed:
+                    self._wakeup.wait(self.sync_interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+            if self.log_bytes >= self.compact_bytes:
+                self._start_compaction()
+
+    def _start_compaction(self):
+        # A compaction in progress holds the lock; there is nothing to start then
+        if not self._compact_lock.acquire(blocking=False):
+            return
+        try:
+            if self._compacting:
+                return
+            self._compacting = True
+        finally:
+            self._compact_lock.release()
+        threading.Thread(target=self._background_compact, name='journal-compactor', daemon=True).start()
+
+    def _background_compact(self):
+        try:
+            self.compact()
+        finally:
+            with self._compact_lock:
+                self._compacting = False
+
+    def flush(self):
+        """Write and fsync everything appended so far (one fsync for the whole batch)"""
+        with self._file_lock:
+            if self._file is None:
+                return
+            with self._lock:
+                data = b''.join(self._buffer)
+                self._buffer = []
+            if not data:
+                return
+            self._file.write(data)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.log_bytes += len(data)
+
+    def compact(self):
+        """Start a new generation, snapshot every session into it, then drop older files"""
+        if self.sessions is None:
+            return
+        with self._compact_lock:
+            with self._file_lock:
+                if self._file is not None:
+                    # Whatever is appended after the swap goes to the new generation's log
+                    with self._lock:
+                        data = b''.join(self._buffer)
+                        self._buffer = []
+                    self._file.write(data)
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                    self._file.close()
+                self.generation += 1
+                generation = self.generation
+                self._file = open(self._path('journal', generation), 'ab')
+                self.log_bytes = 0
+
+            saves = []
+            for session in list(self.sessions.sessions.values()):
+                with session.lock:
+                    saves.append((session.token, SEQ.pack(session.engine.journal_seq) +
+                                  session.engine.save_state()))
+            saves.append((EXCHANGE_TOKEN, dump_exchange(self.sessions.exchange)))
+            write_file_atomic(self._path('snapshot', generation), dump_sessions(saves))
+
+            # The new snapshot covers everything in older generations
+            for kind in ('snapshot', 'journal'):
+                for old in self._generations(kind):
+                    if old < generation:
+                        os.remove(self._path(kind, old))
+            self.compactions += 1
+
+    def close(self):
+        with self._wakeup:
+            self._closed = True
+            self._wakeup.notify()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+        with self._file_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def stats(self):
+        return {'generation': self.generation, 'log_bytes': self.log_bytes, 'compactions': self.compactions}
@@ -0,0 +1,219 @@
+"""
+Request and engine metrics, exported in the Prometheus text format
+"""
+
+import bisect
+import functools
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# Upper bounds in seconds; engine calls take microseconds, slow requests seconds
+DEFAULT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.9, 0.99)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; observing is a bisect and an increment"""
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # The last slot counts observations above the largest bound (+Inf)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by interpolating inside the bucket that holds it"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+
+class Series:
+    """Counters and a latency histogram for one route or engine method"""
+
+    def __init__(self, labels: Dict[str, str]):
+        self.labels = labels
+        self.requests = 0
+        self.errors = 0
+        self.bytes_out = 0
+        self.latency = Histogram()
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, error: bool = False, bytes_out: int = 0):
+        with self._lock:
+            self.requests += 1
+            if error:
+                self.errors += 1
+            self.bytes_out += bytes_out
+            self.latency.observe(seconds)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.routes: Dict[Tuple[str, str], Series] = {}
+        self.engine_methods: Dict[str, Series] = {}
+        # World ticks run by the scheduler (see simulation.py); an overrun is counted as an error
+        self.ticks = Series({'scheduler': 'world'})
+        self._lock = threading.Lock()
+
+    def route(self, method: str, name: str) -> Series:
+        series = self.routes.get((method, name))
+        if series is None:
+            with self._lock:
+                series = self.routes.setdefault((method, name), Series({'method': method, 'route': name}))
+        return series
+
+    def engine_method(self, name: str) -> Series:
+        series = self.engine_methods.get(name)
+        if series is None:
+            with self._lock:
+                series = self.engine_methods.setdefault(name, Series({'method': name}))
+        return series
+
+    def render(self, gauges: Optional[Dict[str, float]] = None) -> str:
+        """All metrics in the Prometheus text exposition format, plus point-in-time ``gauges``"""
+        lines: List[str] = []
+        routes = sorted(self.routes.values(), key=lambda s: (s.labels['route'], s.labels['method']))
+        methods = sorted(self.engine_methods.values(), key=lambda s: s.labels['method'])
+
+        _counter(lines, 'sme_http_requests_total', 'API requests handled', routes, lambda s: s.requests)
+        _counter(lines, 'sme_http_errors_total', 'API requests answered with a 4xx/5xx or an exception',
+                 routes, lambda s: s.errors)
+        _counter(lines, 'sme_http_response_bytes_total', 'API response body bytes sent',
+                 routes, lambda s: s.bytes_out)
+        _histogram(lines, 'sme_http_request_duration_seconds', 'API request handling time', routes)
+
+        _counter(lines, 'sme_engine_calls_total', 'Game engine method calls', methods, lambda s: s.requests)
+        _counter(lines, 'sme_engine_errors_total', 'Game engine method calls that raised', methods,
+                 lambda s: s.errors)
+        _histogram(lines, 'sme_engine_call_duration_seconds', 'Game engine method time', methods)
+
+        _counter(lines, 'sme_ticks_total', 'World ticks run', [self.ticks], lambda s: s.requests)
+        _counter(lines, 'sme_tick_overruns_total', 'World ticks that ran out of budget with sessions left over',
+                 [self.ticks], lambda s: s.errors)
+        _histogram(lines, 'sme_tick_duration_seconds', 'World tick time', [self.ticks])
+
+        for name, value in sorted((gauges or {}).items()):
+            if value is None:
+                continue
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> Dict:
+        """Counts and p50/p90/p99 per route and engine method, for tests and tooling"""
+        def describe(series):
+            with series._lock:
+                return {'requests': series.requests, 'errors': series.errors, 'bytes_out': series.bytes_out,
+                        **{f'p{int(q * 100)}': series.latency.quantile(q) for q in QUANTILES}}
+        return {
+            'routes': {f'{m} {n}': describe(s) for (m, n), s in list(self.routes.items())},
+            'engine': {n: describe(s) for n, s in list(self.engine_methods.items())},
+        }
+
+
+def _labels(labels: Dict[str, str], **extra) -> str:
+    merged = {**labels, **extra}
+    return '{' + ','.join(f'{k}="{v}"' for k, v in merged.items()) + '}'
+
+
+def _number(value) -> str:
+    if isinstance(value, float) and value == float('inf'):
+        return '+Inf'
+    return f'{value:.6g}' if isinstance(value, float) else str(value)
+
+
+def _counter(lines, name, help_text, series_list, value_of):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} counter')
+    for series in series_list:
+        lines.append(f'{name}{_labels(series.labels)} {value_of(series)}')
+
+
+def _histogram(lines, name, help_text, series_list):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    quantile_lines = []
+    for series in series_list:
+        with series._lock:
+            histogram = series.latency
+            counts = list(histogram.counts)
+            total, count = histogram.sum, histogram.count
+            estimates = [(q, histogram.quantile(q)) for q in QUANTILES]
+        cumulative = 0
+        for bound, bucket_count in zip(histogram.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{_labels(series.labels, le=_number(float(bound)))} {cumulative}')
+        lines.append(f'{name}_sum{_labels(series.labels)} {_number(total)}')
+        lines.append(f'{name}_count{_labels(series.labels)} {count}')
+        for q, estimate in estimates:
+            quantile_lines.append(f'{name}_quantile{_labels(series.labels, quantile=str(q))} {_number(estimate)}')
+    # Precomputed p50/p90/p99 for dashboards that don't run histogram_quantile()
+    lines.append(f'# HELP {name}_quantile {help_text}, estimated from the histogram buckets')
+    lines.append(f'# TYPE {name}_quantile gauge')
+    lines.extend(quantile_lines)
+
+
+registry = MetricsRegistry()
+
+
+def instrument(method):
+    """Decorator recording an engine method's calls, exceptions and duration"""
+    series = registry.engine_method(method.__name__)
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = method(*args, **kwargs)
+        except Exception:
+            series.record(time.perf_counter() - started, error=True)
+            raise
+        series.record(time.perf_counter() - started)
+        return result
+
+    return wrapper
+
+
+def metrics_middleware(metrics: Optional[MetricsRegistry] = None):
+    """Route middleware recording count, errors, bytes out and latency per route"""
+    metrics = metrics or registry
+
+    def middleware(request, call_next):
+        series = metrics.route(request.method, request.route.path)
+        started = time.perf_counter()
+        try:
+            response = call_next(request)
+        except Exception:
+            series.record(time.perf_counter() - started, error=True)
+            raise
+        if response is None:
+            # Streams write their own bytes (on their own thread once handed off); count the request
+            series.record(time.perf_counter() - started)
+        else:
+            series.record(time.perf_counter() - started, error=response.status >= 400,
+                          bytes_out=len(response.body))
+        return response
+
+    return middleware
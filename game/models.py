@@ -2,12 +2,18 @@
 Core game models for Space Mining Empire
 """
 
-from dataclasses import dataclass, field
-from typing import Dict, List, Optional
+from collections.abc import MutableMapping
+from dataclasses import dataclass, field, fields
+from typing import Dict, Iterable, List, Optional, Tuple
 from enum import Enum
+import math
 import random
 
 
+# Fuel burned per unit of distance travelled
+FUEL_PER_DISTANCE = 10
+
+
 class ResourceType(Enum):
     IRON = "Iron"
     COPPER = "Copper"
@@ -16,6 +22,109 @@ class ResourceType(Enum):
     RARE_EARTH = "Rare Earth"
     QUANTUM_CRYSTALS = "Quantum Crystals"
 
+    # Members are singletons compared by identity; Enum's own __hash__ runs in Python
+    # and hashes the name, which made every resource-keyed dict lookup a function call
+    __hash__ = object.__hash__
+
+
+# Each type's slot in a ResourceCounts array, kept on the member itself
+RESOURCE_TYPES = tuple(ResourceType)
+for _ordinal, _resource_type in enumerate(RESOURCE_TYPES):
+    _resource_type.ordinal = _ordinal
+del _ordinal, _resource_type
+
+
+def slotted(cls):
+    """Rebuild a dataclass with ``__slots__`` for its fields, like ``@dataclass(slots=True)`` on Python 3.10+.
+
+    Slots can't be declared in the class body itself, where the field
+    defaults are class attributes that would shadow them. Apply above
+    ``@dataclass``.
+    """
+    namespace = dict(cls.__dict__)
+    names = tuple(f.name for f in fields(cls))
+    for name in names + ('__dict__', '__weakref__'):
+        namespace.pop(name, None)
+    namespace['__slots__'] = names
+    return type(cls)(cls.__name__, cls.__bases__, namespace)
+
+
+class ResourceCounts(MutableMapping):
+    """Unit counts per resource type in one fixed-length slot array, with a running total.
+
+    Behaves like the ``Dict[ResourceType, int]`` it replaces (an empty slot,
+    None, and a slot holding 0 stay distinct, just like a missing key and a
+    key mapped to 0), but takes less memory and keeps ``total`` current on
+    every write, so asking how much is held never sums anything. Iteration
+    follows the ResourceType order.
+    """
+
+    __slots__ = ('_counts', 'total')
+
+    def __init__(self, counts: Iterable = ()):
+        self._counts: List[Optional[int]] = [None] * len(RESOURCE_TYPES)
+        self.total = 0
+        if counts:
+            self.update(counts)
+
+    def __getitem__(self, resource_type: ResourceType) -> int:
+        count = self._counts[resource_type.ordinal]
+        if count is None:
+            raise KeyError(resource_type)
+        return count
+
+    def __setitem__(self, resource_type: ResourceType, count: int):
+        counts = self._counts
+        ordinal = resource_type.ordinal
+        previous = counts[ordinal]
+        counts[ordinal] = count
+        self.total += count if previous is None else count - previous
+
+    def __delitem__(self, resource_type: ResourceType):
+        ordinal = resource_type.ordinal
+        previous = self._counts[ordinal]
+        if previous is None:
+            raise KeyError(resource_type)
+        self._counts[ordinal] = None
+        self.total -= previous
+
+    def __contains__(self, resource_type) -> bool:
+        return isinstance(resource_type, ResourceType) and self._counts[resource_type.ordinal] is not None
+
+    def get(self, resource_type, default=None):
+        if not isinstance(resource_type, ResourceType):
+            return default
+        count = self._counts[resource_type.ordinal]
+        return default if count is None else count
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    # Snapshots rather than live views: building the list in one pass beats a lookup per key
+    def keys(self) -> List[ResourceType]:
+        return [RESOURCE_TYPES[ordinal] for ordinal, count in enumerate(self._counts) if count is not None]
+
+    def values(self) -> List[int]:
+        return [count for count in self._counts if count is not None]
+
+    def items(self) -> List[Tuple[ResourceType, int]]:
+        return [(RESOURCE_TYPES[ordinal], count) for ordinal, count in enumerate(self._counts) if count is not None]
+
+    def update(self, counts=()):
+        for resource_type, count in (counts.items() if hasattr(counts, 'items') else counts):
+            self[resource_type] = count
+
+    def __len__(self) -> int:
+        return len(self._counts) - self._counts.count(None)
+
+    def __eq__(self, other):
+        if isinstance(other, ResourceCounts):
+            return self._counts == other._counts
+        return MutableMapping.__eq__(self, other)
+
+    def __repr__(self):
+        return f'ResourceCounts({dict(self)!r})'
+
 
 @dataclass
 class Resource:
@@ -28,6 +137,7 @@ class Resource:
         return self.amount * self.base_value
 
 
+@slotted
 @dataclass
 class Ship:
     name: str
@@ -36,11 +146,17 @@ class Ship:
     speed: float
     fuel_capacity: int
     current_fuel: int
-    cargo: Dict[ResourceType, int] = field(default_factory=dict)
+    cargo: Dict[ResourceType, int] = field(default_factory=ResourceCounts)
+    
+    def __post_init__(self):
+        if not isinstance(self.cargo, ResourceCounts):
+            self.cargo = ResourceCounts(self.cargo)
     
     @property
     def cargo_used(self) -> int:
-        return sum(self.cargo.values())
+        cargo = self.cargo
+        # A plain dict assigned after construction still works, it just has no running total
+        return cargo.total if isinstance(cargo, ResourceCounts) else sum(cargo.values())
     
     @property
     def cargo_free(self) -> int:
@@ -55,13 +171,14 @@ class Ship:
     def remove_cargo(self, resource_type: ResourceType, amount: int) -> int:
         current_amount = self.cargo.get(resource_type, 0)
         removed = min(amount, current_amount)
-        if removed > 0:
+        if removed == current_amount and removed > 0:
+            del self.cargo[resource_type]
+        elif removed > 0:
             self.cargo[resource_type] = current_amount - removed
-            if self.cargo[resource_type] == 0:
-                del self.cargo[resource_type]
         return removed
 
 
+@slotted
 @dataclass
 class CelestialBody:
     name: str
@@ -72,30 +189,56 @@ class CelestialBody:
     has_outpost: bool = False
     outpost: Optional['Outpost'] = None
     has_ship_shop: bool = False  # Ship shops available at major stations
+    # Galactic (x, y, z) coordinates; without one, a body sits on the line its distance_from_start describes
+    position: Optional[Tuple[float, float, float]] = None
+    # Deposit sizes before mining began, which regrowth refills toward; None while the body is untouched
+    capacity: Optional[Dict[ResourceType, int]] = None
+    # World tick that regrowth was last applied up to (see World.settle)
+    regrown_at: int = 0
+    
+    def __post_init__(self):
+        # Plain dicts become compact counts; other mappings (a columnar store's views) are kept as given
+        if type(self.resources) is dict:
+            self.resources = ResourceCounts(self.resources)
+        if self.position is None:
+            self.position = (self.distance_from_start, 0.0, 0.0)
+    
+    def distance_to(self, other: 'CelestialBody') -> float:
+        return math.dist(self.position, other.position)
     
-    def mine_resource(self, resource_type: ResourceType, mining_power: float) -> int:
-        if resource_type not in self.resources or self.resources[resource_type] <= 0:
+    def mine_resource(self, resource_type: ResourceType, mining_power: float, rng=random) -> int:
+        available = self.resources.get(resource_type, 0)
+        if available <= 0:
             return 0
+        if self.capacity is None:
+            self.capacity = ResourceCounts(self.resources)
         
         base_yield = mining_power / self.mining_difficulty
-        actual_yield = int(random.uniform(base_yield * 0.5, base_yield * 1.5))
-        actual_yield = min(actual_yield, self.resources[resource_type])
+        actual_yield = int(rng.uniform(base_yield * 0.5, base_yield * 1.5))
+        actual_yield = min(actual_yield, available)
         
-        self.resources[resource_type] -= actual_yield
+        self.resources[resource_type] = available - actual_yield
         return actual_yield
 
 
+def travel_fuel_cost(origin: CelestialBody, destination: CelestialBody) -> int:
+    return int(origin.distance_to(destination) * FUEL_PER_DISTANCE)
+
+
+@slotted
 @dataclass
 class Outpost:
     name: str
     outpost_type: str  # mining_station, research_facility, trade_hub, etc.
     resource_prices: Dict[ResourceType, float]
     demand_multipliers: Dict[ResourceType, float] = field(default_factory=dict)
+    # Where the market stands today relative to normal (1.0 when absent); moved by world ticks
+    market_factors: Dict[ResourceType, float] = field(default_factory=dict)
     
     def get_sell_price(self, resource_type: ResourceType) -> float:
         base_price = self.resource_prices.get(resource_type, 0)
         multiplier = self.demand_multipliers.get(resource_type, 1.0)
-        return base_price * multiplier
+        return base_price * multiplier * self.market_factors.get(resource_type, 1.0)
 
 
 @dataclass
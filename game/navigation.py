@@ -0,0 +1,126 @@
+"""
+Multi-hop route planning over the body graph
+"""
+
+import heapq
+import math
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from .models import FUEL_PER_DISTANCE, travel_fuel_cost
+from .spatial import BodyIndex
+
+
+class RoutePlanner:
+    """Cheapest routes between bodies, refuelling at outposts along the way.
+
+    A ship can only jump as far as its fuel allows, and can only take on
+    fuel at bodies with an outpost, so a route is a chain of direct jumps
+    between refuel points, ending at the destination. Routes are found with
+    A* over that graph, weighing fuel burned plus ``time_weight`` times the
+    travel time (distance / speed). Jumps are priced by unrounded fuel while
+    searching, so the straight-line heuristic never overestimates.
+
+    Computed routes are kept in an LRU cache. A planner belongs to one
+    ``BodyIndex`` at one size; when the map changes or grows the engine
+    makes a new planner, which drops every cached route with it.
+    """
+
+    def __init__(self, index: BodyIndex, cache_size: int = 256):
+        self.index = index
+        self.bodies = index.bodies
+        # Bodies on the map when the cached routes were planned
+        self.size = index.size
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[tuple, Optional[List[int]]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def plan(self, start: int, goal: int, fuel: int, fuel_capacity: int, speed: float,
+             time_weight: float = 1.0) -> Optional[List[int]]:
+        """Body indexes from ``start`` to ``goal`` inclusive, or None when no route exists"""
+        # Fuel left only matters for the first jump, and not at all when it can be topped up first
+        first_range = fuel_capacity if self._is_refuel_point(start) else min(fuel, fuel_capacity)
+        key = (start, goal, first_range, fuel_capacity, speed, time_weight)
+        if key in self._cache:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        self.misses += 1
+        path = self._search(start, goal, first_range, fuel_capacity, speed, time_weight)
+        self._cache[key] = path
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return path
+
+    def _is_refuel_point(self, index: int) -> bool:
+        return index in self.index.outposts.positions
+
+    def _search(self, start, goal, first_range, fuel_capacity, speed, time_weight):
+        bodies = self.bodies
+        goal_position = bodies[goal].position
+        # Cost of one unit of distance: the fuel it burns plus its weighted travel time
+        unit_cost = FUEL_PER_DISTANCE + time_weight / speed
+
+        def heuristic(index):
+            return math.dist(bodies[index].position, goal_position) * unit_cost
+
+        best = {start: 0.0}
+        previous = {start: None}
+        frontier = [(heuristic(start), 0.0, start)]
+        while frontier:
+            _, cost, node = heapq.heappop(frontier)
+            if node == goal:
+                return self._unwind(previous, goal)
+            if cost > best[node]:
+                continue
+            jump_range = first_range if node == start else fuel_capacity
+            origin = bodies[node]
+            # Every refuel point in range, plus the goal itself
+            reachable = self.index.outposts.within(origin.position, (jump_range + 1) / FUEL_PER_DISTANCE)
+            if origin.distance_to(bodies[goal]) <= (jump_range + 1) / FUEL_PER_DISTANCE:
+                reachable.append((origin.distance_to(bodies[goal]), goal))
+            for distance, neighbor in reachable:
+                if neighbor == node or travel_fuel_cost(origin, bodies[neighbor]) > jump_range:
+                    continue
+                new_cost = cost + distance * unit_cost
+                if new_cost < best.get(neighbor, math.inf):
+                    best[neighbor] = new_cost
+                    previous[neighbor] = node
+                    heapq.heappush(frontier, (new_cost + heuristic(neighbor), new_cost, neighbor))
+        return None
+
+    @staticmethod
+    def _unwind(previous, goal) -> List[int]:
+        path = [goal]
+        while previous[path[-1]] is not None:
+            path.append(previous[path[-1]])
+        path.reverse()
+        return path
+
+    def stats(self) -> dict:
+        return {'cached_routes': len(self._cache), 'hits': self.hits, 'misses': self.misses}
+
+
+def itinerary(bodies, path: List[int], fuel: int, fuel_price: float) -> Tuple[List[dict], int, float]:
+    """Turn a path into batch actions, refuelling just enough before each jump.
+
+    Returns (steps, total fuel burned, total spent on fuel).
+    """
+    steps = []
+    total_fuel = 0
+    total_price = 0.0
+    for here, there in zip(path, path[1:]):
+        cost = travel_fuel_cost(bodies[here], bodies[there])
+        if cost > fuel:
+            amount = cost - fuel
+            steps.append({'action': 'refuel', 'amount': amount, 'at': bodies[here].name,
+                          'cost': amount * fuel_price})
+            total_price += amount * fuel_price
+            fuel = cost
+        steps.append({'action': 'travel', 'destination_index': there, 'name': bodies[there].name,
+                      'fuel_cost': cost})
+        fuel -= cost
+        total_fuel += cost
+    return steps, total_fuel, total_price
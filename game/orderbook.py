@@ -0,0 +1,377 @@
+"""
+Limit order books at outposts, for trading between players
+"""
+
+import heapq
+import threading
+from dataclasses import dataclass, replace
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .models import ResourceCounts, ResourceType, slotted
+
+
+BUY = 'buy'
+SELL = 'sell'
+SIDES = (BUY, SELL)
+
+
+@slotted
+@dataclass(eq=False)
+class Order:
+    id: int
+    owner: str
+    market: str         # the outpost it trades at, see Exchange
+    resource_type: ResourceType
+    side: str
+    price: float
+    quantity: int       # units still open; 0 once filled or cancelled
+    filled: int = 0
+
+
+class Fill(NamedTuple):
+    buy_id: int
+    sell_id: int
+    buyer: str
+    seller: str
+    resource_type: ResourceType
+    price: float
+    quantity: int
+
+
+class Proceeds:
+    """What the exchange owes one player: credits, and goods waiting for room in the hold"""
+
+    __slots__ = ('credits', 'goods')
+
+    def __init__(self):
+        self.credits = 0.0
+        self.goods = ResourceCounts()
+
+
+class OrderBook:
+    """Bids and asks for one resource at one outpost, matched by price, then time.
+
+    Each side is a heap of (price key, order id, order): bids are keyed on
+    the negated price so the best bid is on top, and ids rise with arrival,
+    so equal prices go to the older order. An incoming order trades against
+    the top of the other side, at the resting order's price, for as long as
+    the prices cross; whatever is left rests on its own side. Cancelling
+    only zeroes the order, which is skipped once it reaches the top, so it
+    costs O(1); the heaps are compacted once dead entries outnumber live ones.
+    """
+
+    __slots__ = ('bids', 'asks', 'live')
+
+    def __init__(self):
+        self.bids: List[Tuple[float, int, Order]] = []
+        self.asks: List[Tuple[float, int, Order]] = []
+        self.live = 0   # resting orders with units still open
+
+    def submit(self, order: Order, fills: List[Fill]):
+        """Match ``order`` against the book, appending its trades to ``fills``; the rest is left resting"""
+        if order.side == BUY:
+            asks = self.asks
+            while order.quantity and asks:
+                price, _, resting = asks[0]
+                if not resting.quantity:
+                    heapq.heappop(asks)
+                    continue
+                if price > order.price:
+                    break
+                fills.append(self._trade(order, resting, order, resting, asks))
+            if order.quantity:
+                heapq.heappush(self.bids, (-order.price, order.id, order))
+                self.live += 1
+        else:
+            bids = self.bids
+            while order.quantity and bids:
+                key, _, resting = bids[0]
+                if not resting.quantity:
+                    heapq.heappop(bids)
+                    continue
+                if -key < order.price:
+                    break
+                fills.append(self._trade(order, resting, resting, order, bids))
+            if order.quantity:
+                heapq.heappush(self.asks, (order.price, order.id, order))
+                self.live += 1
+
+    def _trade(self, incoming: Order, resting: Order, buy: Order, sell: Order, heap) -> Fill:
+        quantity = min(incoming.quantity, resting.quantity)
+        incoming.quantity -= quantity
+        incoming.filled += quantity
+        resting.quantity -= quantity
+        resting.filled += quantity
+        if not resting.quantity:
+            heapq.heappop(heap)
+            self.live -= 1
+        return Fill(buy.id, sell.id, buy.owner, sell.owner, resting.resource_type, resting.price, quantity)
+
+    def cancel(self, order: Order) -> int:
+        """Take a resting order off the book; returns the units it still had open"""
+        remaining = order.quantity
+        if remaining:
+            order.quantity = 0
+            self.live -= 1
+            if len(self.bids) + len(self.asks) > 2 * self.live + 64:
+                self._compact()
+        return remaining
+
+    def _compact(self):
+        for name in ('bids', 'asks'):
+            heap = [entry for entry in getattr(self, name) if entry[2].quantity]
+            heapq.heapify(heap)
+            setattr(self, name, heap)
+
+    def best(self, side: str) -> Optional[float]:
+        """Best open price on one side: the highest bid or the lowest ask"""
+        heap = self.bids if side == BUY else self.asks
+        while heap and not heap[0][2].quantity:
+            heapq.heappop(heap)
+        if not heap:
+            return None
+        return -heap[0][0] if side == BUY else heap[0][0]
+
+    def depth(self, side: str, levels: int = 5) -> List[Tuple[float, int]]:
+        """The best ``levels`` prices on one side, with the units open at each"""
+        heap = self.bids if side == BUY else self.asks
+        totals: Dict[float, int] = {}
+        for key, _, order in heap:
+            if order.quantity:
+                totals[order.price] = totals.get(order.price, 0) + order.quantity
+        prices = sorted(totals, reverse=side == BUY)[:levels]
+        return [(price, totals[price]) for price in prices]
+
+
+def market_id(map_id: str, body_index: int) -> str:
+    """Name of the market at one body of one map: games on the same map trade on the same books"""
+    return f'{map_id}/{body_index}'
+
+
+class Exchange:
+    """Every outpost's order books, shared by all the games in the process.
+
+    Books are keyed on a market id (see ``market_id``): the map a game is
+    played on plus the outpost's body index in it, so an outpost only
+    shares its books with the same outpost in other games on the same map.
+    Orders arrive already paid for: the goods of a sell order, and the
+    credits of a buy order (price times quantity), are set aside by the
+    player's game before it submits them. Trades and cancellations pay out
+    into each player's ``Proceeds``, which the player's own game collects
+    under its own lock, so matching never has to touch another player's game.
+
+    Every change is passed to ``recorder`` under the exchange lock, in the
+    order it was applied, so the journal can replay the books exactly.
+    """
+
+    def __init__(self):
+        self.books: Dict[str, Dict[ResourceType, OrderBook]] = {}     # by market, then resource
+        self.orders: Dict[int, Order] = {}              # open orders by id
+        self.owned: Dict[str, Dict[int, Order]] = {}    # open orders by owner, then id
+        self.proceeds: Dict[str, Proceeds] = {}
+        self.operations = 0
+        self.trades = 0
+        # Called as recorder(action, args) for every change (see journal.py)
+        self.recorder = None
+        # Sequence number of the last journaled change applied to the books
+        self.journal_seq = 0
+        # Id of the newest order; ids only ever rise, which is what breaks price ties
+        self.last_id = 0
+        self._lock = threading.Lock()
+
+    def _record(self, action: str, *args):
+        if self.recorder is not None:
+            self.recorder(action, args)
+
+    def replay_action(self, action: str, args: tuple):
+        """Re-apply a journaled change, without journaling it again"""
+        recorder, self.recorder = self.recorder, None
+        try:
+            if action == 'order':
+                self.submit_many(*args)
+            elif action == 'cancel':
+                self.cancel_many(*args)
+            elif action == 'collect':
+                self.collect(*args)
+            elif action == 'withdraw':
+                self.withdraw(*args)
+            else:
+                raise ValueError(f'Unknown exchange journal action: {action}')
+        finally:
+            self.recorder = recorder
+
+    def submit_many(self, owner: str, market: str,
+                    requests: Iterable[Tuple[str, ResourceType, float, int]]) -> Tuple[List[Order], List[Fill]]:
+        """Place (side, resource type, price, quantity) orders in one go; returns the orders and their trades"""
+        requests = tuple(requests)
+        placed: List[Order] = []
+        fills: List[Fill] = []
+        with self._lock:
+            books = self.books.get(market)
+            if books is None:
+                books = self.books[market] = {}
+            owned = self.owned.setdefault(owner, {})
+            for side, resource_type, price, quantity in requests:
+                self.last_id += 1
+                order = Order(self.last_id, owner, market, resource_type, side, price, quantity)
+                book = books.get(resource_type)
+                if book is None:
+                    book = books[resource_type] = OrderBook()
+                start = len(fills)
+                book.submit(order, fills)
+                for index in range(start, len(fills)):
+                    self._settle(fills[index], order)
+                if order.quantity:
+                    self.orders[order.id] = order
+                    owned[order.id] = order
+                placed.append(order)
+            self.operations += len(placed)
+            self.trades += len(fills)
+            self._record('order', owner, market, requests)
+        return placed, fills
+
+    def _settle(self, fill: Fill, incoming: Order):
+        buyer = self._proceeds(fill.buyer)
+        seller = self._proceeds(fill.seller)
+        buyer.goods[fill.resource_type] = buyer.goods.get(fill.resource_type, 0) + fill.quantity
+        seller.credits += fill.price * fill.quantity
+        if incoming.side == BUY:
+            # The buyer set aside its own limit price; it trades at the (lower) resting price
+            buyer.credits += (incoming.price - fill.price) * fill.quantity
+        resting = self.orders.get(fill.sell_id if incoming.side == BUY else fill.buy_id)
+        if resting is not None and not resting.quantity:
+            del self.orders[resting.id]
+            del self.owned[resting.owner][resting.id]
+
+    def cancel_many(self, owner: str, order_ids: Optional[Iterable[int]] = None) -> List[Tuple[Order, int]]:
+        """Cancel the owner's open orders among ``order_ids`` (all of them when None), refunding what was set aside.
+
+        Returns each cancelled order with the units it still had open.
+        """
+        with self._lock:
+            if order_ids is not None:
+                order_ids = tuple(order_ids)
+            cancelled = self._cancel(owner, order_ids)
+            if cancelled:
+                self._record('cancel', owner, order_ids)
+        return cancelled
+
+    def _cancel(self, owner: str, order_ids: Optional[Iterable[int]]) -> List[Tuple[Order, int]]:
+        cancelled = []
+        owned = self.owned.get(owner, {})
+        for order_id in (list(owned) if order_ids is None else order_ids):
+            order = owned.pop(order_id, None)
+            if order is None:
+                continue
+            del self.orders[order_id]
+            remaining = self.books[order.market][order.resource_type].cancel(order)
+            proceeds = self._proceeds(owner)
+            if order.side == BUY:
+                proceeds.credits += order.price * remaining
+            else:
+                proceeds.goods[order.resource_type] = proceeds.goods.get(order.resource_type, 0) + remaining
+            cancelled.append((order, remaining))
+        self.operations += len(cancelled)
+        return cancelled
+
+    def collect(self, owner: str, room: int) -> Tuple[float, Dict[ResourceType, int]]:
+        """Pay out the owner's credits, and goods up to ``room`` units; goods that don't fit keep waiting"""
+        with self._lock:
+            credits, goods = self._collect(owner, room)
+            if credits or goods:
+                self._record('collect', owner, room)
+            return credits, goods
+
+    def _collect(self, owner: str, room: int) -> Tuple[float, Dict[ResourceType, int]]:
+        proceeds = self.proceeds.get(owner)
+        if proceeds is None:
+            return 0.0, {}
+        credits, proceeds.credits = proceeds.credits, 0.0
+        goods = {}
+        for resource_type, amount in list(proceeds.goods.items()):
+            taken = min(amount, room)
+            if taken:
+                goods[resource_type] = taken
+                room -= taken
+            if taken == amount:
+                del proceeds.goods[resource_type]
+            else:
+                proceeds.goods[resource_type] = amount - taken
+        if not proceeds.goods:
+            del self.proceeds[owner]
+        return credits, goods
+
+    def withdraw(self, owner: str, room: int, leaving: bool = False) -> Tuple[List[Tuple[Order, int]], float,
+                                                                              Dict[ResourceType, int]]:
+        """Cancel all the owner's orders and pay out everything owed, as one change.
+
+        Returns the cancelled orders, the credits and the goods (up to ``room``)
+        paid out. Goods that don't fit keep waiting, unless the owner is
+        ``leaving`` the exchange for good: then nothing of theirs is kept.
+        """
+        with self._lock:
+            cancelled = self._cancel(owner, None)
+            credits, goods = self._collect(owner, room)
+            if leaving:
+                self.owned.pop(owner, None)
+                self.proceeds.pop(owner, None)
+            if cancelled or credits or goods or leaving:
+                self._record('withdraw', owner, room, leaving)
+            return cancelled, credits, goods
+
+    def snapshot(self) -> Tuple[int, int, int, int, List[Order], List[Tuple[str, float, Dict[ResourceType, int]]]]:
+        """A consistent copy of the exchange: journal sequence, last order id, operations, trades,
+        open orders (oldest first) and what each player is owed"""
+        with self._lock:
+            orders = [replace(order) for _, order in sorted(self.orders.items())]
+            owed = [(owner, proceeds.credits, dict(proceeds.goods)) for owner, proceeds in self.proceeds.items()]
+            return self.journal_seq, self.last_id, self.operations, self.trades, orders, owed
+
+    def rest(self, order: Order):
+        """Put a restored open order back on its book without matching it (see persistence.load_exchange)"""
+        with self._lock:
+            books = self.books.setdefault(order.market, {})
+            book = books.get(order.resource_type)
+            if book is None:
+                book = books[order.resource_type] = OrderBook()
+            heap = book.bids if order.side == BUY else book.asks
+            heapq.heappush(heap, (-order.price if order.side == BUY else order.price, order.id, order))
+            book.live += 1
+            self.orders[order.id] = order
+            self.owned.setdefault(order.owner, {})[order.id] = order
+            self.last_id = max(self.last_id, order.id)
+
+    def owe(self, owner: str, credits: float, goods: Dict[ResourceType, int]):
+        """Restore what the exchange owed a player (see persistence.load_exchange)"""
+        with self._lock:
+            proceeds = self._proceeds(owner)
+            proceeds.credits += credits
+            for resource_type, amount in goods.items():
+                proceeds.goods[resource_type] = proceeds.goods.get(resource_type, 0) + amount
+
+    def open_orders(self, owner: str) -> List[Order]:
+        with self._lock:
+            return list(self.owned.get(owner, {}).values())
+
+    def waiting(self, owner: str) -> Tuple[float, Dict[ResourceType, int]]:
+        """What the owner would collect, without collecting it"""
+        with self._lock:
+            proceeds = self.proceeds.get(owner)
+            return (proceeds.credits, dict(proceeds.goods)) if proceeds is not None else (0.0, {})
+
+    def quotes(self, market: str, levels: int = 5) -> Dict[ResourceType, Dict[str, List[Tuple[float, int]]]]:
+        """Book depth for every resource traded at a market"""
+        with self._lock:
+            return {resource_type: {'bids': book.depth(BUY, levels), 'asks': book.depth(SELL, levels)}
+                    for resource_type, book in self.books.get(market, {}).items() if book.live}
+
+    def _proceeds(self, owner: str) -> Proceeds:
+        proceeds = self.proceeds.get(owner)
+        if proceeds is None:
+            proceeds = self.proceeds[owner] = Proceeds()
+        return proceeds
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'books': sum(len(books) for books in self.books.values()), 'open_orders': len(self.orders),
+                    'operations': self.operations, 'trades': self.trades}
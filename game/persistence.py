@@ -0,0 +1,426 @@
+"""
+Compact binary save format for the full game state
+"""
+
+import os
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .models import CelestialBody, Outpost, Player, ResourceCounts, ResourceType, Ship
+from .orderbook import SIDES, Exchange, Order
+from .rng import GameRandom
+from .simulation import ScheduledEvent, World
+
+
+MAGIC = b'SMEG'
+FORMAT_VERSION = 1
+# File of many sessions' saves, written by SessionManager.save_all
+SESSIONS_MAGIC = b'SMES'
+SESSIONS_VERSION = 1
+# The shared order books (see orderbook.py), written by dump_exchange
+EXCHANGE_MAGIC = b'SMEX'
+EXCHANGE_VERSION = 1
+
+# Wire order of resource types. Never reorder: saved arrays are indexed by
+# position. New types are appended (and need a format version bump, since
+# the arrays are fixed-width).
+RESOURCE_ORDER = (
+    ResourceType.IRON,
+    ResourceType.COPPER,
+    ResourceType.TITANIUM,
+    ResourceType.GOLD,
+    ResourceType.RARE_EARTH,
+    ResourceType.QUANTUM_CRYSTALS,
+)
+RESOURCE_CODES = {resource_type: code for code, resource_type in enumerate(RESOURCE_ORDER)}
+RESOURCE_SLOTS = len(RESOURCE_ORDER)
+
+NO_INDEX = 0xFFFFFFFF
+# engine.outposts entries that are bodies (rather than Outposts) are stored with this bit set
+BODY_REF = 0x80000000
+
+FLAG_INITIALIZED = 0x01
+FLAG_HAS_RNG = 0x02
+BODY_HAS_OUTPOST = 0x01
+BODY_HAS_SHIP_SHOP = 0x02
+BODY_HAS_CAPACITY = 0x04
+
+# Fixed-width records. A presence mask comes before each resource array so
+# that an absent key and a key holding 0 (a mined-out resource) stay distinct.
+HEADER = struct.Struct('<4sHBIdQ')           # magic, version, flags, turn, starting credits, state version
+RNG = struct.Struct('<QQ')                   # random stream seed, draws taken
+COUNTS = struct.Struct('<III')               # bodies, outposts, engine.outposts entries
+STRING_LEN = struct.Struct('<H')
+AMOUNTS = struct.Struct(f'<B{RESOURCE_SLOTS}I')
+PRICES = struct.Struct(f'<B{RESOURCE_SLOTS}d')
+SHIP = struct.Struct('<IddII')               # cargo capacity, mining efficiency, speed, fuel capacity, fuel
+BODY = struct.Struct('<ddBI')                # distance, mining difficulty, flags, outpost index
+POSITION = struct.Struct('<3d')              # x, y, z
+PLAYER = struct.Struct('<dIII')              # credits, ship count, current ship, current location
+INDEX = struct.Struct('<I')
+WORLD = struct.Struct('<QI')                 # world tick, scheduled event count
+EVENT = struct.Struct('<QBIBd')              # due tick, kind, outpost index, resource code, factor
+SESSIONS_HEADER = struct.Struct('<4sHI')     # magic, version, session count
+EXCHANGE_HEADER = struct.Struct('<4sHQQQQII')  # magic, version, journal seq, last order id, operations, trades,
+                                               # open orders, players owed
+ORDER = struct.Struct('<QBBdII')             # id, side, resource code, price, open quantity, filled quantity
+CREDITS = struct.Struct('<d')
+BLOB_LEN = struct.Struct('<I')
+
+
+class SaveFormatError(ValueError):
+    pass
+
+
+class _Writer:
+    def __init__(self):
+        self.parts: List[bytes] = []
+
+    def pack(self, record: struct.Struct, *values):
+        self.parts.append(record.pack(*values))
+
+    def string(self, value: str):
+        data = value.encode('utf-8')
+        self.parts.append(STRING_LEN.pack(len(data)))
+        self.parts.append(data)
+
+    def amounts(self, values: Dict[ResourceType, int]):
+        self._array(AMOUNTS, values, 0)
+
+    def prices(self, values: Dict[ResourceType, float]):
+        self._array(PRICES, values, 0.0)
+
+    def _array(self, record: struct.Struct, values: Dict, empty):
+        mask = 0
+        slots = [empty] * RESOURCE_SLOTS
+        for resource_type, value in values.items():
+            code = RESOURCE_CODES[resource_type]
+            mask |= 1 << code
+            slots[code] = value
+        self.parts.append(record.pack(mask, *slots))
+
+    def getvalue(self) -> bytes:
+        return b''.join(self.parts)
+
+
+class _Reader:
+    def __init__(self, data: bytes):
+        self.data = memoryview(data)
+        self.offset = 0
+
+    def unpack(self, record: struct.Struct):
+        try:
+            values = record.unpack_from(self.data, self.offset)
+        except struct.error:
+            raise SaveFormatError('Save data is truncated')
+        self.offset += record.size
+        return values
+
+    def string(self) -> str:
+        (length,) = self.unpack(STRING_LEN)
+        end = self.offset + length
+        if end > len(self.data):
+            raise SaveFormatError('Save data is truncated')
+        value = str(self.data[self.offset:end], 'utf-8')
+        self.offset = end
+        return value
+
+    def amounts(self) -> Dict[ResourceType, int]:
+        return self._array(AMOUNTS)
+
+    def prices(self) -> Dict[ResourceType, float]:
+        return self._array(PRICES)
+
+    def _array(self, record: struct.Struct) -> Dict:
+        mask, *slots = self.unpack(record)
+        return {RESOURCE_ORDER[code]: slots[code] for code in range(RESOURCE_SLOTS) if mask >> code & 1}
+
+
+def _indices(items) -> Dict[int, int]:
+    """Position of every item keyed by identity (dataclass == would match look-alikes)"""
+    return {id(item): index for index, item in enumerate(items)}
+
+
+def _index_of(indices: Dict[int, int], target) -> int:
+    if target is None:
+        return NO_INDEX
+    index = indices.get(id(target))
+    if index is None:
+        raise SaveFormatError(f'{target!r} is not part of the saved world')
+    return index
+
+
+def dump_game(engine) -> bytes:
+    """Encode an engine's player, ships, bodies and outposts.
+
+    Works with any engine exposing ``player``, ``celestial_bodies`` and
+    ``outposts`` (the terminal, GUI and web engines all do).
+    """
+    writer = _Writer()
+    player: Optional[Player] = engine.player
+    settings = getattr(engine, 'settings', {})
+    rng = getattr(engine, 'rng', None)
+    flags = (FLAG_INITIALIZED if player else 0) | (FLAG_HAS_RNG if rng is not None else 0)
+    writer.pack(HEADER, MAGIC, FORMAT_VERSION, flags,
+                getattr(engine, 'current_turn', 0), float(settings.get('starting_credits', 0.0)),
+                getattr(engine, 'state_version', 0))
+    writer.pack(RNG, *((rng.seed, rng.counter) if rng is not None else (0, 0)))
+    if player is None:
+        return writer.getvalue()
+
+    bodies: List[CelestialBody] = engine.celestial_bodies
+    world = getattr(engine, 'world', None) or World()
+    # Deposits are saved as they stand on the world's tick, so regrowth restarts from there on load
+    world.settle_all()
+    # Outposts are written once and referenced by index, which keeps shared references shared
+    outposts: List[Outpost] = []
+    outpost_indices: Dict[int, int] = {}
+    for outpost in [body.outpost for body in bodies] + engine.outposts:
+        if isinstance(outpost, Outpost) and id(outpost) not in outpost_indices:
+            outpost_indices[id(outpost)] = len(outposts)
+            outposts.append(outpost)
+    body_indices = _indices(bodies)
+    events = sorted(world.events)
+    # Anything larger could not be referenced; NO_INDEX and BODY_REF are never valid indices
+    if (len(bodies) >= BODY_REF or len(outposts) >= NO_INDEX or len(engine.outposts) >= NO_INDEX or
+            len(events) >= NO_INDEX or len(player.ships) >= NO_INDEX):
+        raise SaveFormatError('The world is too large to save')
+
+    writer.pack(COUNTS, len(bodies), len(outposts), len(engine.outposts))
+    for outpost in outposts:
+        writer.string(outpost.name)
+        writer.string(outpost.outpost_type)
+        writer.prices(outpost.resource_prices)
+        writer.prices(outpost.demand_multipliers)
+        writer.prices(outpost.market_factors)
+
+    for body in bodies:
+        flags = ((BODY_HAS_OUTPOST if body.has_outpost else 0) | (BODY_HAS_SHIP_SHOP if body.has_ship_shop else 0) |
+                 (BODY_HAS_CAPACITY if body.capacity is not None else 0))
+        writer.string(body.name)
+        writer.string(body.body_type)
+        writer.pack(BODY, body.distance_from_start, body.mining_difficulty, flags,
+                    _index_of(outpost_indices, body.outpost))
+        writer.pack(POSITION, *body.position)
+        writer.amounts(body.resources)
+        if body.capacity is not None:
+            writer.amounts(body.capacity)
+
+    for item in engine.outposts:
+        if isinstance(item, Outpost):
+            writer.pack(INDEX, _index_of(outpost_indices, item))
+        else:
+            writer.pack(INDEX, BODY_REF | _index_of(body_indices, item))
+
+    writer.pack(WORLD, world.tick, len(events))
+    for event in events:
+        writer.pack(EVENT, event.due, event.kind, _index_of(outpost_indices, event.outpost),
+                    RESOURCE_CODES[event.resource_type], event.factor)
+
+    writer.string(player.name)
+    writer.pack(PLAYER, player.credits, len(player.ships), _index_of(_indices(player.ships), player.current_ship),
+                _index_of(body_indices, player.current_location))
+    for ship in player.ships:
+        writer.string(ship.name)
+        writer.pack(SHIP, ship.cargo_capacity, ship.mining_efficiency, ship.speed,
+                    ship.fuel_capacity, ship.current_fuel)
+        writer.amounts(ship.cargo)
+
+    return writer.getvalue()
+
+
+def load_game(engine, data: bytes):
+    """Restore state written by ``dump_game`` into ``engine``, replacing its current game"""
+    reader = _Reader(data)
+    magic, version, flags, turn, starting_credits, state_version = reader.unpack(HEADER)
+    if magic != MAGIC:
+        raise SaveFormatError('Not a Space Mining Empire save')
+    if version != FORMAT_VERSION:
+        raise SaveFormatError(f'Unsupported save format version {version}')
+    seed, counter = reader.unpack(RNG)
+    if flags & FLAG_HAS_RNG and hasattr(engine, 'rng'):
+        # Restored mid-stream, so the game continues with the draws it would have had
+        engine.rng = GameRandom(seed, counter)
+
+    if hasattr(engine, 'current_turn'):
+        engine.current_turn = turn
+    if hasattr(engine, 'settings'):
+        engine.settings['starting_credits'] = starting_credits
+    if hasattr(engine, 'state_version'):
+        engine.state_version = max(engine.state_version, state_version)
+
+    if not flags & FLAG_INITIALIZED:
+        if hasattr(engine, 'world'):
+            engine.world = World()
+        engine.player = None
+        engine.celestial_bodies = []
+        engine.outposts = []
+        return engine
+
+    body_count, outpost_count, engine_outpost_count = reader.unpack(COUNTS)
+    outposts = []
+    for _ in range(outpost_count):
+        name = reader.string()
+        outpost_type = reader.string()
+        outposts.append(Outpost(name=name, outpost_type=outpost_type,
+                                resource_prices=reader.prices(), demand_multipliers=reader.prices(),
+                                market_factors=reader.prices()))
+
+    bodies = []
+    for _ in range(body_count):
+        name = reader.string()
+        body_type = reader.string()
+        distance, difficulty, body_flags, outpost_index = reader.unpack(BODY)
+        position = reader.unpack(POSITION)
+        resources = reader.amounts()
+        bodies.append(CelestialBody(
+            name=name,
+            distance_from_start=distance,
+            resources=resources,
+            mining_difficulty=difficulty,
+            body_type=body_type,
+            has_outpost=bool(body_flags & BODY_HAS_OUTPOST),
+            outpost=_lookup(outposts, outpost_index),
+            has_ship_shop=bool(body_flags & BODY_HAS_SHIP_SHOP),
+            position=position,
+            capacity=ResourceCounts(reader.amounts()) if body_flags & BODY_HAS_CAPACITY else None
+        ))
+
+    engine_outposts = []
+    for _ in range(engine_outpost_count):
+        (ref,) = reader.unpack(INDEX)
+        engine_outposts.append(_lookup(bodies, ref & ~BODY_REF) if ref & BODY_REF else _lookup(outposts, ref))
+
+    tick, event_count = reader.unpack(WORLD)
+    events = []
+    for seq in range(event_count):
+        due, kind, outpost_index, resource_code, factor = reader.unpack(EVENT)
+        if resource_code >= RESOURCE_SLOTS:
+            raise SaveFormatError('Save data refers to a missing object')
+        events.append(ScheduledEvent(due, seq, kind, _lookup(outposts, outpost_index),
+                                     RESOURCE_ORDER[resource_code], factor))
+    world = World(tick, events, regrowing=[body for body in bodies if body.capacity is not None])
+
+    player_name = reader.string()
+    credits, ship_count, current_ship, location = reader.unpack(PLAYER)
+    ships = []
+    for _ in range(ship_count):
+        name = reader.string()
+        cargo_capacity, efficiency, speed, fuel_capacity, fuel = reader.unpack(SHIP)
+        ships.append(Ship(name=name, cargo_capacity=cargo_capacity, mining_efficiency=efficiency,
+                          speed=speed, fuel_capacity=fuel_capacity, current_fuel=fuel,
+                          cargo=reader.amounts()))
+
+    if reader.offset != len(reader.data):
+        raise SaveFormatError('Unexpected data after the end of the save')
+
+    engine.player = Player(name=player_name, credits=credits, current_ship=_lookup(ships, current_ship),
+                           ships=ships, current_location=_lookup(bodies, location))
+    engine.celestial_bodies = bodies
+    engine.outposts = engine_outposts
+    if hasattr(engine, 'world'):
+        engine.world = world
+    return engine
+
+
+def _lookup(items, index):
+    if index == NO_INDEX:
+        return None
+    if index >= len(items):
+        raise SaveFormatError('Save data refers to a missing object')
+    return items[index]
+
+
+def dump_sessions(saves: Iterable[Tuple[str, bytes]]) -> bytes:
+    """Bundle (token, save) pairs into one sessions file"""
+    saves = list(saves)
+    writer = _Writer()
+    writer.pack(SESSIONS_HEADER, SESSIONS_MAGIC, SESSIONS_VERSION, len(saves))
+    for token, data in saves:
+        writer.string(token)
+        writer.pack(BLOB_LEN, len(data))
+        writer.parts.append(data)
+    return writer.getvalue()
+
+
+def load_sessions(data: bytes) -> List[Tuple[str, bytes]]:
+    reader = _Reader(data)
+    magic, version, count = reader.unpack(SESSIONS_HEADER)
+    if magic != SESSIONS_MAGIC:
+        raise SaveFormatError('Not a Space Mining Empire sessions file')
+    if version != SESSIONS_VERSION:
+        raise SaveFormatError(f'Unsupported sessions file version {version}')
+    saves = []
+    for _ in range(count):
+        token = reader.string()
+        (length,) = reader.unpack(BLOB_LEN)
+        end = reader.offset + length
+        if end > len(reader.data):
+            raise SaveFormatError('Sessions file is truncated')
+        saves.append((token, bytes(reader.data[reader.offset:end])))
+        reader.offset = end
+    return saves
+
+
+def dump_exchange(exchange: Exchange) -> bytes:
+    """Encode the open orders and unpaid proceeds of an exchange, as of one moment"""
+    seq, last_id, operations, trades, orders, owed = exchange.snapshot()
+    writer = _Writer()
+    writer.pack(EXCHANGE_HEADER, EXCHANGE_MAGIC, EXCHANGE_VERSION, seq, last_id, operations, trades,
+                len(orders), len(owed))
+    for order in orders:
+        writer.string(order.owner)
+        writer.string(order.market)
+        writer.pack(ORDER, order.id, SIDES.index(order.side), RESOURCE_CODES[order.resource_type],
+                    order.price, order.quantity, order.filled)
+    for owner, credits, goods in owed:
+        writer.string(owner)
+        writer.pack(CREDITS, credits)
+        writer.amounts(goods)
+    return writer.getvalue()
+
+
+def load_exchange(exchange: Exchange, data: bytes) -> Exchange:
+    """Restore the orders and proceeds written by ``dump_exchange`` into an empty exchange"""
+    reader = _Reader(data)
+    magic, version, seq, last_id, operations, trades, order_count, owed_count = reader.unpack(EXCHANGE_HEADER)
+    if magic != EXCHANGE_MAGIC:
+        raise SaveFormatError('Not a Space Mining Empire exchange')
+    if version != EXCHANGE_VERSION:
+        raise SaveFormatError(f'Unsupported exchange format version {version}')
+    for _ in range(order_count):
+        owner = reader.string()
+        market = reader.string()
+        order_id, side, resource_code, price, quantity, filled = reader.unpack(ORDER)
+        if side >= len(SIDES) or resource_code >= RESOURCE_SLOTS:
+            raise SaveFormatError('Exchange data refers to a missing object')
+        exchange.rest(Order(order_id, owner, market, RESOURCE_ORDER[resource_code], SIDES[side],
+                            price, quantity, filled))
+    for _ in range(owed_count):
+        owner = reader.string()
+        (credits,) = reader.unpack(CREDITS)
+        exchange.owe(owner, credits, reader.amounts())
+    if reader.offset != len(reader.data):
+        raise SaveFormatError('Unexpected data after the end of the exchange')
+    exchange.journal_seq, exchange.last_id = seq, max(exchange.last_id, last_id)
+    exchange.operations, exchange.trades = operations, trades
+    return exchange
+
+
+def save_to_file(engine, path: str):
+    """Write a save atomically: a crash mid-write leaves the previous save intact"""
+    write_file_atomic(path, dump_game(engine))
+
+
+def load_from_file(engine, path: str):
+    with open(path, 'rb') as f:
+        return load_game(engine, f.read())
+
+
+def write_file_atomic(path: str, data: bytes):
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
@@ -0,0 +1,53 @@
+"""
+Seeded, per-game random number streams
+"""
+
+import secrets
+
+
+MASK64 = (1 << 64) - 1
+GAMMA = 0x9E3779B97F4A7C15
+
+
+def mix64(z: int) -> int:
+    """SplitMix64 finalizer: scrambles a 64-bit integer into a well-distributed one"""
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+    return z ^ (z >> 31)
+
+
+class GameRandom:
+    """Counter-based (SplitMix64) random stream owned by one game.
+
+    The n-th draw is a pure function of ``(seed, n)``, so the whole state is
+    two integers: it is saved with the game, restored exactly, and two games
+    never share state. Provides the subset of the ``random`` module API the
+    game uses, so it can be passed wherever the module was used before.
+    """
+
+    def __init__(self, seed=None, counter: int = 0):
+        self.seed = (secrets.randbits(64) if seed is None else seed) & MASK64
+        self.counter = counter
+
+    def next64(self) -> int:
+        self.counter += 1
+        return mix64((self.seed + self.counter * GAMMA) & MASK64)
+
+    def random(self) -> float:
+        """Float in [0.0, 1.0) with 53 random bits"""
+        return (self.next64() >> 11) * (1.0 / (1 << 53))
+
+    def uniform(self, a: float, b: float) -> float:
+        return a + (b - a) * self.random()
+
+    def randint(self, a: int, b: int) -> int:
+        """Integer in [a, b], both ends included"""
+        # Multiply-shift maps 64 random bits onto the range; the bias is below 2**-40 for game-sized ranges
+        return a + ((self.next64() * (b - a + 1)) >> 64)
+
+    def spawn(self, stream: int) -> 'GameRandom':
+        """Independent child stream, e.g. one per simulation worker, reproducible from this seed"""
+        return GameRandom(mix64((self.seed ^ mix64(stream + GAMMA)) & MASK64))
+
+    def __repr__(self):
+        return f'GameRandom(seed={self.seed:#x}, counter={self.counter})'
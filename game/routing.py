@@ -0,0 +1,324 @@
+"""
+Table-driven request routing for the web API
+"""
+
+import gzip
+import hmac
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .static_assets import accepts_gzip
+
+
+class ApiError(Exception):
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class Field:
+    """Declares one parameter of a route's JSON body or query string"""
+
+    def __init__(self, kind, required: bool = True, default=None, nullable: bool = False):
+        self.kind = kind
+        self.required = required
+        self.default = default
+        self.nullable = nullable
+
+    def validate(self, name: str, value, from_query: bool = False):
+        if value is None:
+            if self.nullable:
+                return None
+            raise ApiError(f'{name} must not be null')
+        if from_query:
+            value = self._coerce(name, value)
+        # bool is a subclass of int, but true is never a valid index
+        if isinstance(value, bool) and self.kind is not bool:
+            raise ApiError(f'{name} must be {self._kind_name()}')
+        # JSON has one number type, so whole numbers are fine where a float is expected
+        if self.kind is float and isinstance(value, int):
+            return value
+        if not isinstance(value, self.kind):
+            raise ApiError(f'{name} must be {self._kind_name()}')
+        return value
+
+    def _coerce(self, name: str, value: str):
+        try:
+            if self.kind is bool:
+                return value.lower() in ('1', 'true', 'yes')
+            if self.kind in (int, float):
+                return self.kind(value)
+        except ValueError:
+            raise ApiError(f'{name} must be {self._kind_name()}')
+        return value
+
+    def _kind_name(self) -> str:
+        return {int: 'an integer', float: 'a number', str: 'a string', bool: 'true or false',
+                list: 'a list', dict: 'an object'}.get(self.kind, self.kind.__name__)
+
+
+def validate_params(schema: Optional[Dict[str, Field]], params: Dict[str, Any], from_query: bool = False) -> Dict:
+    """Check params against a schema, filling defaults; unknown keys are ignored"""
+    if not schema:
+        return dict(params)
+    validated = {}
+    for name, field in schema.items():
+        if name in params:
+            validated[name] = field.validate(name, params[name], from_query)
+        elif field.required:
+            raise ApiError(f'Missing field: {name}')
+        else:
+            validated[name] = field.default
+    return validated
+
+
+class Response:
+    def __init__(self, body: bytes = b'', status: int = 200, content_type: str = 'application/json',
+                 headers: Optional[Dict[str, str]] = None):
+        self.body = body
+        self.status = status
+        self.content_type = content_type
+        self.headers = headers or {}
+
+    @classmethod
+    def json(cls, data, status: int = 200, headers: Optional[Dict[str, str]] = None) -> 'Response':
+        return cls(json.dumps(data).encode('utf-8'), status, headers=headers)
+
+
+class Request:
+    """Everything a route handler needs, independent of the HTTP server"""
+
+    def __init__(self, method: str, path: str, query: Dict[str, str], headers, body: bytes = b'',
+                 session=None, handler=None):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+        self.session = session
+        self.engine = session.engine if session else None
+        self.handler = handler
+        self.route = None
+        self.data: Dict[str, Any] = {}
+        self.params: Dict[str, Any] = {}
+
+
+class Route:
+    def __init__(self, method: str, path: str, handler: Callable, schema: Optional[Dict[str, Field]] = None,
+                 query: Optional[Dict[str, Field]] = None, name: Optional[str] = None,
+                 requires_game: bool = False, locked: bool = True, mutates: bool = False,
+                 snapshot: bool = False, uses_session: bool = True):
+        self.method = method
+        self.path = path
+        self.handler = handler
+        self.schema = schema
+        self.query = query
+        self.name = name or handler.__name__
+        # Answer with an error instead of calling the handler before a game exists
+        self.requires_game = requires_game
+        # Run the handler under the session lock
+        self.locked = locked
+        # The handler changes game state
+        self.mutates = mutates
+        # Accepts {"snapshot": true} to return the refreshed snapshot inline
+        self.snapshot = snapshot
+        # Server-level routes (metrics) must not create a session for every caller
+        self.uses_session = uses_session
+
+
+Middleware = Callable[[Request, Callable[[Request], Optional[Response]]], Optional[Response]]
+
+
+class Router:
+    """Maps (method, path) to routes with one dict lookup.
+
+    Route handlers take a Request and return a JSON-serializable value, a
+    Response, or None when they wrote to the connection themselves (event
+    streams). Middleware wraps every dispatch as ``middleware(request,
+    call_next)`` and runs in the order it was added. The caller's session is
+    attached by ``session_resolver`` only once every middleware has let the
+    request through, so a request refused by one never creates a session.
+    """
+
+    def __init__(self):
+        self.routes: Dict[Tuple[str, str], Route] = {}
+        self.paths: Dict[str, List[str]] = {}
+        self.middleware: List[Middleware] = []
+        # Called with a request to a session route that doesn't carry one yet; returns its session
+        self.session_resolver: Optional[Callable[[Request], Any]] = None
+        self._chain = None
+
+    def add(self, method: str, path: str, handler: Callable, **options) -> Route:
+        route = Route(method, path, handler, **options)
+        self.routes[(method, path)] = route
+        self.paths.setdefault(path, []).append(method)
+        return route
+
+    def route(self, method: str, path: str, **options):
+        def decorator(handler):
+            self.add(method, path, handler, **options)
+            return handler
+        return decorator
+
+    def get(self, path: str, **options):
+        return self.route('GET', path, **options)
+
+    def post(self, path: str, **options):
+        return self.route('POST', path, **options)
+
+    def use(self, middleware: Middleware):
+        self.middleware.append(middleware)
+        self._chain = None
+        return middleware
+
+    def with_middleware(self, *middleware: Middleware) -> 'Router':
+        """A router serving the same routes, with extra middleware run after this one's (still before the session)"""
+        router = Router()
+        router.routes = self.routes
+        router.paths = self.paths
+        router.middleware = self.middleware + list(middleware)
+        router.session_resolver = self.session_resolver
+        return router
+
+    def resolve(self, method: str, path: str) -> Optional[Route]:
+        return self.routes.get((method, path))
+
+    def allowed_methods(self, path: str) -> List[str]:
+        return self.paths.get(path, [])
+
+    def dispatch(self, route: Route, request: Request) -> Optional[Response]:
+        request.route = route
+        if self._chain is None:
+            call = self._invoke
+            for middleware in reversed(self.middleware):
+                call = self._wrap(middleware, call)
+            self._chain = call
+        return self._chain(request)
+
+    @staticmethod
+    def _wrap(middleware: Middleware, call_next):
+        return lambda request: middleware(request, call_next)
+
+    def _invoke(self, request: Request) -> Optional[Response]:
+        if request.session is None and request.route.uses_session and self.session_resolver is not None:
+            request.session = self.session_resolver(request)
+            request.engine = request.session.engine
+        # Errors become responses here so that middleware sees them like any other
+        try:
+            return self._handle(request)
+        except ApiError as e:
+            return Response.json({'success': False, 'message': e.message}, status=e.status)
+
+    def _handle(self, request: Request) -> Optional[Response]:
+        route = request.route
+        request.params = validate_params(route.query, request.query, from_query=True)
+        if route.schema is not None or route.snapshot:
+            request.data = self._parse_body(request.body)
+            schema = dict(route.schema or {})
+            if route.snapshot:
+                schema.setdefault('snapshot', Field(bool, required=False, default=False))
+            request.data = validate_params(schema, request.data)
+
+        if route.requires_game and not request.engine.is_initialized():
+            return Response.json({'success': False, 'error': 'Game not initialized',
+                                  'message': 'Game not initialized'})
+
+        if route.locked and request.session is not None:
+            with request.session.lock:
+                result = self._call_handler(request)
+        else:
+            result = self._call_handler(request)
+
+        if result is None or isinstance(result, Response):
+            return result
+        return Response.json(result)
+
+    @staticmethod
+    def _call_handler(request: Request):
+        result = request.route.handler(request)
+        # Taken under the same lock as the action so it reflects exactly this action
+        if request.data.get('snapshot') and isinstance(result, dict):
+            result['snapshot'] = request.engine.get_snapshot()
+        return result
+
+    @staticmethod
+    def _parse_body(body: bytes) -> Dict:
+        if not body:
+            return {}
+        try:
+            data = json.loads(body.decode('utf-8'))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            raise ApiError('Request body must be valid JSON')
+        if not isinstance(data, dict):
+            raise ApiError('Request body must be a JSON object')
+        return data
+
+
+def gzip_etag(etag: str) -> str:
+    return etag[:-1] + '-gz"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak If-None-Match comparison as specified for conditional GETs.
+
+    The gzip variant of a representation counts as a match too: it is the
+    same content, only the transfer bytes differ.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    accepted = (etag, gzip_etag(etag))
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag in accepted:
+            return True
+    return False
+
+
+def timing_middleware(request: Request, call_next) -> Optional[Response]:
+    """Report handler time to the browser's devtools via Server-Timing"""
+    started = time.perf_counter()
+    response = call_next(request)
+    if response is not None:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        response.headers['Server-Timing'] = f'app;dur={elapsed_ms:.2f}'
+    return response
+
+
+def token_auth_middleware(token: str, header: str = 'Authorization') -> Middleware:
+    """Reject requests that don't carry ``Bearer <token>`` in ``header``"""
+    expected = f'Bearer {token}'.encode('utf-8')
+
+    def middleware(request: Request, call_next) -> Optional[Response]:
+        # Constant-time, so response timing doesn't reveal how much of a guessed key was right
+        if not hmac.compare_digest(request.headers.get(header, '').encode('utf-8'), expected):
+            return Response.json({'success': False, 'message': 'Unauthorized'}, status=401,
+                                 headers={'WWW-Authenticate': 'Bearer'})
+        return call_next(request)
+
+    return middleware
+
+
+def gzip_middleware(min_size: int = 1024, level: int = 1) -> Middleware:
+    """Compress large responses for clients that accept gzip"""
+
+    def middleware(request: Request, call_next) -> Optional[Response]:
+        response = call_next(request)
+        if (response is None or len(response.body) < min_size or
+                'Content-Encoding' in response.headers or
+                not accepts_gzip(request.headers.get('Accept-Encoding'))):
+            return response
+        response.body = gzip.compress(response.body, compresslevel=level, mtime=0)
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+        # A strong ETag names exact bytes, so the compressed variant needs its own
+        if 'ETag' in response.headers:
+            response.headers['ETag'] = gzip_etag(response.headers['ETag'])
+        return response
+
+    return middleware
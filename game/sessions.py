@@ -0,0 +1,294 @@
+"""
+Per-player session registry for the web server
+"""
+
+import secrets
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .journal import EXCHANGE_TOKEN
+from .orderbook import Exchange
+from .persistence import dump_exchange, dump_sessions, load_exchange, load_sessions, write_file_atomic
+from .web_engine import GameWebEngine
+
+
+SESSION_COOKIE = 'sme_session'
+SESSION_HEADER = 'X-Session-Token'
+
+
+def estimate_size(obj, seen=None) -> int:
+    """Roughly estimate the memory held by an object graph, in bytes"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += estimate_size(key, seen) + estimate_size(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += estimate_size(item, seen)
+    elif hasattr(obj, '__dict__'):
+        size += estimate_size(vars(obj), seen)
+    else:
+        # Compact models keep their attributes in __slots__ instead of a __dict__
+        for name in _slot_names(type(obj)):
+            if hasattr(obj, name):
+                size += estimate_size(getattr(obj, name), seen)
+    return size
+
+
+def _slot_names(cls):
+    for klass in cls.__mro__:
+        slots = klass.__dict__.get('__slots__', ())
+        yield from ((slots,) if isinstance(slots, str) else slots)
+
+
+class Session:
+    def __init__(self, token: str, engine: GameWebEngine):
+        self.token = token
+        self.engine = engine
+        self.created_at = time.monotonic()
+        self.last_access = self.created_at
+        self.memory_bytes = 0
+        # Mutations since memory_bytes was measured, and the map size it was measured at
+        self.unmeasured = 0
+        self.measured_bodies = 0
+        # Serializes every engine call for this player; held only around engine work
+        self.lock = threading.RLock()
+
+    def touch(self):
+        self.last_access = time.monotonic()
+
+    def measure_memory(self) -> int:
+        with self.lock:
+            # The order books are shared by every session, so they count against none of them
+            self.memory_bytes = estimate_size(self.engine, seen={id(self.engine.exchange)})
+            self.unmeasured = 0
+            self.measured_bodies = len(self.engine.celestial_bodies)
+        return self.memory_bytes
+
+
+class SessionManager:
+    """Hands every client its own GameWebEngine, keyed by a session token.
+
+    Sessions are kept in least-recently-used order. When the registry is over
+    capacity or over its memory budget, the least recently used sessions are
+    evicted; sessions idle for longer than ``idle_timeout`` seconds are
+    dropped on the next sweep.
+
+    Measuring a session walks its whole engine, which costs far more than a
+    game action, so mutations only count towards a re-measure: it happens
+    every ``remeasure_every`` mutations, as soon as the map grows, and for
+    every session with unmeasured changes on the next sweep.
+    """
+
+    def __init__(self, capacity: int = 5000, idle_timeout: float = 3600.0,
+                 memory_budget: Optional[int] = None,
+                 engine_factory: Callable[[], GameWebEngine] = GameWebEngine,
+                 state_file: Optional[str] = None, remeasure_every: int = 64):
+        self.capacity = capacity
+        self.idle_timeout = idle_timeout
+        self.memory_budget = memory_budget
+        self.remeasure_every = remeasure_every
+        self.engine_factory = engine_factory
+        # Where save_all/load_all keep every session's game between restarts
+        self.state_file = state_file
+        # Set by Journal.attach; records every session's actions for crash recovery
+        self.journal = None
+        # Set by TickScheduler.start; advances every live game's world on a clock
+        self.scheduler = None
+        # Order books shared by every session's game, for trading between players (see orderbook.py)
+        self.exchange = Exchange()
+        self.sessions: 'OrderedDict[str, Session]' = OrderedDict()
+        self.total_memory = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def live(self) -> List[Session]:
+        """Every session, least recently used first, without touching any of them"""
+        with self._lock:
+            return list(self.sessions.values())
+
+    def get(self, token: Optional[str]) -> Optional[Session]:
+        if not token:
+            return None
+        with self._lock:
+            session = self.sessions.get(token)
+            if session is None:
+                return None
+            if time.monotonic() - session.last_access > self.idle_timeout:
+                self._remove(token)
+                return None
+            session.touch()
+            self.sessions.move_to_end(token)
+            return session
+
+    def get_or_create(self, token: Optional[str]) -> Tuple[Session, bool]:
+        """Return the session for ``token``, creating a new one if needed.
+
+        The second element is True when a new session (with a fresh token)
+        was created and the client needs to be told about it.
+        """
+        session = self.get(token)
+        if session is not None:
+            return session, False
+        return self.create(), True
+
+    def create(self, token: Optional[str] = None, engine: Optional[GameWebEngine] = None) -> Session:
+        session = Session(token or secrets.token_urlsafe(18), engine or self.engine_factory())
+        session.engine.exchange = self.exchange
+        session.engine.trader = session.token
+        session.measure_memory()
+        if self.journal is not None:
+            self.journal.track(session)
+        with self._lock:
+            self.sessions[session.token] = session
+            self.total_memory += session.memory_bytes
+            self._enforce_limits()
+        return session
+
+    def remove(self, token: str) -> bool:
+        """Drop a player for good, along with their place on the exchange"""
+        with self._lock:
+            return self._remove(token, leaving=True) is not None
+
+    def update_memory(self, session: Session):
+        """Re-measure a session after it changed and rebalance the budget"""
+        before = session.memory_bytes
+        after = session.measure_memory()
+        with self._lock:
+            if session.token in self.sessions:
+                self.total_memory += after - before
+                self._enforce_limits()
+
+    def note_mutation(self, session: Session):
+        """Account for one change to a session's game, re-measuring it only once the estimate is due"""
+        session.unmeasured += 1
+        if (session.unmeasured >= self.remeasure_every or
+                len(session.engine.celestial_bodies) != session.measured_bodies):
+            self.update_memory(session)
+
+    def remeasure_stale(self) -> int:
+        """Re-measure every session changed since it was last measured; returns how many were"""
+        stale = [session for session in self.live() if session.unmeasured]
+        for session in stale:
+            self.update_memory(session)
+        return len(stale)
+
+    def evict_idle(self) -> int:
+        """Drop every session that has been idle longer than idle_timeout"""
+        cutoff = time.monotonic() - self.idle_timeout
+        evicted = 0
+        with self._lock:
+            # Sessions are in LRU order, so the idle ones are all at the front
+            while self.sessions:
+                token, session = next(iter(self.sessions.items()))
+                if session.last_access > cutoff:
+                    break
+                self._remove(token)
+                evicted += 1
+            self.evictions += evicted
+        return evicted
+
+    def start_sweeper(self, interval: float = 60.0) -> threading.Thread:
+        """Run evict_idle and remeasure_stale every ``interval`` seconds on a daemon thread"""
+        def sweep():
+            while True:
+                time.sleep(interval)
+                self.evict_idle()
+                self.remeasure_stale()
+
+        thread = threading.Thread(target=sweep, name='session-sweeper', daemon=True)
+        thread.start()
+        return thread
+
+    def save_all(self, path: Optional[str] = None) -> int:
+        """Write every session's game and the order books to ``path`` (default ``state_file``); returns the count.
+
+        Meant for once play has stopped: the books are saved first, so an order placed
+        meanwhile would lose its escrow rather than be paid for twice.
+        """
+        path = path or self.state_file
+        saves = [(EXCHANGE_TOKEN, dump_exchange(self.exchange))]
+        for session in self.live():
+            # Each engine is encoded under its own lock, so play continues elsewhere meanwhile
+            with session.lock:
+                saves.append((session.token, session.engine.save_state()))
+        write_file_atomic(path, dump_sessions(saves))
+        return len(saves) - 1
+
+    def load_all(self, path: Optional[str] = None) -> int:
+        """Restore sessions saved by save_all, keeping their tokens so clients resume their games"""
+        path = path or self.state_file
+        with open(path, 'rb') as f:
+            saves = load_sessions(f.read())
+        count = 0
+        for token, data in saves:
+            if token == EXCHANGE_TOKEN:
+                load_exchange(self.exchange, data)
+                continue
+            engine = self.engine_factory()
+            engine.load_state(data)
+            self.create(token, engine)
+            count += 1
+        return count
+
+    def close(self):
+        """Shut down: stop ticking, release event streams, flush the journal and save every session if a state file is set"""
+        if self.scheduler is not None:
+            self.scheduler.stop()
+        self.close_streams()
+        if self.journal is not None:
+            self.journal.close()
+        if self.state_file:
+            count = self.save_all()
+            print(f"Saved {count} sessions to {self.state_file}")
+
+    def close_streams(self):
+        """Release every open event stream, e.g. before the server shuts down"""
+        for session in self.live():
+            session.engine.events.close_all()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            count = len(self.sessions)
+            return {
+                'sessions': count,
+                'capacity': self.capacity,
+                'total_memory_bytes': self.total_memory,
+                'average_memory_bytes': self.total_memory / count if count else 0,
+                'memory_budget_bytes': self.memory_budget,
+                'evictions': self.evictions
+            }
+
+    def _remove(self, token: str, leaving: bool = False) -> Optional[Session]:
+        session = self.sessions.pop(token, None)
+        if session is not None:
+            self.total_memory -= session.memory_bytes
+            session.engine.events.close_all()
+            # Whatever the exchange holds for the player is settled into the game before it goes;
+            # only a player leaving for good gives up goods that don't fit the hold
+            with session.lock:
+                session.engine.withdraw_orders(leaving)
+            if self.journal is not None:
+                self.journal.record_drop(session)
+        return session
+
+    def _enforce_limits(self):
+        # Never evict the most recently used session - it is the one being served
+        while len(self.sessions) > 1 and (
+                len(self.sessions) > self.capacity or
+                (self.memory_budget is not None and self.total_memory > self.memory_budget)):
+            token = next(iter(self.sessions))
+            self._remove(token)
+            self.evictions += 1
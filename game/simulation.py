@@ -0,0 +1,320 @@
+"""
+World simulation: the processes that run every tick, and the scheduler that ticks every live game
+"""
+
+import heapq
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .metrics import MetricsRegistry, registry
+from .models import RESOURCE_TYPES, CelestialBody, Outpost, ResourceType
+
+
+# Share of a mined deposit's original size that grows back each tick
+REGROWTH_RATE = 0.01
+# Markets wander by up to this much per tick, and close this share of the gap back to normal
+MARKET_DRIFT = 0.02
+MARKET_PULL = 0.1
+MARKET_RANGE = (0.5, 2.5)
+# Each unit sold leaves the market this much cheaper for the next; the pull above recovers it over time
+SALE_IMPACT = 0.001
+# Chance per tick that a demand surge is announced somewhere, and how it plays out
+SURGE_CHANCE = 0.1
+SURGE_LEAD_TICKS = 5
+SURGE_FACTOR = 1.5
+
+# Event kinds are saved as codes: never renumber, only append
+EVENT_SURGE = 0
+EVENT_NAMES = {EVENT_SURGE: 'surge'}
+
+DEFAULT_TICK_INTERVAL = 5.0
+DEFAULT_BATCH_SIZE = 64
+
+
+class ScheduledEvent(NamedTuple):
+    due: int
+    seq: int          # breaks ties between events due on the same tick, in scheduling order
+    kind: int
+    outpost: Outpost
+    resource_type: ResourceType
+    factor: float
+
+
+class World:
+    """The clock of one game and the world processes that run on it.
+
+    Each tick, in order: every market drifts (randomly, pulled back toward
+    normal), a demand surge may be announced for a few ticks ahead, and
+    scheduled events that have fallen due take effect. Every random choice
+    draws from the game's own stream, so the same ticks from the same state
+    play out identically.
+
+    Mined deposits regrow too, but not on the tick: regrowth is a closed
+    form of the ticks elapsed since a body was last brought up to date, and
+    is only worked out (``settle``) when something reads the body. A tick
+    costs nothing for the bodies nobody is looking at.
+    """
+
+    def __init__(self, tick: int = 0, events: Iterable[ScheduledEvent] = (),
+                 regrowing: Iterable[CelestialBody] = ()):
+        self.tick = tick
+        self.events: List[ScheduledEvent] = []
+        self._seq = 0
+        for event in sorted(events):
+            self.schedule(event.due, event.kind, event.outpost, event.resource_type, event.factor)
+        # Mined bodies not yet grown back, by id (bodies compare by value, so can't be set members)
+        self.regrowing: Dict[int, CelestialBody] = {}
+        for body in regrowing:
+            self.track(body)
+
+    def schedule(self, due: int, kind: int, outpost: Outpost, resource_type: ResourceType, factor: float):
+        self._seq += 1
+        heapq.heappush(self.events, ScheduledEvent(due, self._seq, kind, outpost, resource_type, factor))
+
+    def advance(self, bodies: List[CelestialBody], rng, ticks: int = 1, store=None) -> Dict[str, int]:
+        """Run ``ticks`` ticks over ``bodies`` and their outposts; returns what happened.
+
+        The summary says whether any market price moved (``markets_changed``)
+        and whether any deposit grew back (``deposits_changed``), so callers
+        only throw away what the ticks actually changed.
+
+        With a columnar ``store`` holding those outposts, each tick's market
+        drift is one vectorized update over its market matrix.
+        """
+        outposts = list({id(body.outpost): body.outpost for body in bodies if body.outpost is not None}.values())
+        events = 0
+        markets_changed = False
+        # A regrowing body gains at least a unit on every tick, even though it is only worked out when read
+        deposits_changed = bool(self.regrowing)
+        for _ in range(ticks):
+            self.tick += 1
+            if store is not None:
+                moved = store.drift_markets(rng, MARKET_PULL, MARKET_DRIFT, MARKET_RANGE)
+            else:
+                moved = drift_markets(outposts, rng)
+            markets_changed = moved or markets_changed
+            if outposts and rng.random() < SURGE_CHANCE:
+                outpost = outposts[rng.randint(0, len(outposts) - 1)]
+                priced = [rt for rt in RESOURCE_TYPES if rt in outpost.resource_prices]
+                if priced:
+                    self.schedule(self.tick + SURGE_LEAD_TICKS, EVENT_SURGE, outpost,
+                                  priced[rng.randint(0, len(priced) - 1)], SURGE_FACTOR)
+            while self.events and self.events[0].due <= self.tick:
+                markets_changed = self._apply(heapq.heappop(self.events)) or markets_changed
+                events += 1
+        return {'ticks': ticks, 'world_tick': self.tick, 'regrowing': len(self.regrowing), 'events': events,
+                'markets_changed': markets_changed, 'deposits_changed': deposits_changed}
+
+    def _apply(self, event: ScheduledEvent) -> bool:
+        """Put a due event into effect; returns whether it moved a market"""
+        if event.kind == EVENT_SURGE:
+            factors = event.outpost.market_factors
+            low, high = MARKET_RANGE
+            before = factors.get(event.resource_type, 1.0)
+            factors[event.resource_type] = min(high, max(low, before * event.factor))
+            return factors[event.resource_type] != before
+        return False
+
+    def settle(self, body: CelestialBody):
+        """Bring ``body``'s deposits up to the current tick.
+
+        Each tick a deposit below its original size grows back by a fixed
+        step (a share of that size, at least one unit) until full, so after
+        ``n`` ticks it holds ``min(size, amount + n * step)``: the same as
+        growing it tick by tick, worked out in one go.
+        """
+        elapsed = self.tick - body.regrown_at
+        body.regrown_at = self.tick
+        capacity = body.capacity
+        if capacity is None or elapsed <= 0:
+            return
+        resources = body.resources
+        full = True
+        for resource_type, size in capacity.items():
+            amount = resources.get(resource_type, 0)
+            if amount < size:
+                amount = min(size, amount + elapsed * max(1, int(size * REGROWTH_RATE)))
+                resources[resource_type] = amount
+                full = full and amount >= size
+        if full:
+            # Back to untouched: nothing left to work out until it is mined again
+            body.capacity = None
+            self.regrowing.pop(id(body), None)
+
+    def settle_all(self):
+        """Bring every regrowing body up to date, for queries and saves that read them all"""
+        for body in list(self.regrowing.values()):
+            self.settle(body)
+
+    def track(self, body: CelestialBody):
+        """Start regrowing ``body`` from the current tick, if it has been mined"""
+        body.regrown_at = self.tick
+        if body.capacity is not None:
+            self.regrowing[id(body)] = body
+
+    def mine(self, body: CelestialBody, resource_type: ResourceType, mining_power: float, rng) -> int:
+        """``body.mine_resource``, with regrowth settled before and tracked after"""
+        self.settle(body)
+        mined = body.mine_resource(resource_type, mining_power, rng)
+        self.track(body)
+        return mined
+
+    def upcoming(self) -> List[dict]:
+        return [{'tick': event.due, 'event': EVENT_NAMES[event.kind], 'outpost': event.outpost.name,
+                 'resource': event.resource_type.value} for event in sorted(self.events)]
+
+
+def drift_markets(outposts: Iterable[Outpost], rng) -> bool:
+    """One tick of random, mean-reverting drift in every outpost's market factors; returns whether any moved.
+
+    Draws come in outpost order, then resource order, the same order
+    ``WorldStore.drift_markets`` draws them in, so both play out identically.
+    """
+    low, high = MARKET_RANGE
+    changed = False
+    for outpost in outposts:
+        factors = outpost.market_factors
+        prices = outpost.resource_prices
+        for resource_type in RESOURCE_TYPES:
+            if resource_type not in prices:
+                continue
+            before = factors.get(resource_type, 1.0)
+            factor = before + (MARKET_PULL * (1.0 - before) + rng.uniform(-MARKET_DRIFT, MARKET_DRIFT))
+            factors[resource_type] = min(high, max(low, factor))
+            changed = changed or factors[resource_type] != before
+    return changed
+
+
+def sell(outpost: Outpost, resource_type: ResourceType, amount: int) -> float:
+    """Credits for selling ``amount`` units in one go, which pushes the market down as it goes.
+
+    Unit ``i`` fetches the current price times ``(1 - SALE_IMPACT) ** i``,
+    but never less than the market's floor. That is a geometric series, so
+    a sale of ten thousand units costs no more to price than a sale of one.
+    Only the traded market's factor changes.
+    """
+    credits, after = _sale(outpost, resource_type, amount)
+    if after is not None:
+        outpost.market_factors[resource_type] = after
+    return credits
+
+
+def quote(outpost: Outpost, resource_type: ResourceType, amount: int) -> float:
+    """What ``sell`` would pay for ``amount`` units right now, leaving the market as it is"""
+    return _sale(outpost, resource_type, amount)[0]
+
+
+def _sale(outpost: Outpost, resource_type: ResourceType, amount: int) -> Tuple[float, Optional[float]]:
+    # (credits, market factor after the sale), or no factor when nothing would sell
+    base = outpost.resource_prices.get(resource_type, 0)
+    if amount <= 0 or not base:
+        return 0.0, None
+    base *= outpost.demand_multipliers.get(resource_type, 1.0)
+    factor = outpost.market_factors.get(resource_type, 1.0)
+    low = MARKET_RANGE[0]
+    keep = 1.0 - SALE_IMPACT
+    after = factor * keep ** amount
+    if after > low:
+        return base * (factor - after) / SALE_IMPACT, after
+    # The floor is reached part way: the units sold before it, then the rest at the floor
+    above = 0 if factor <= low else min(amount, math.ceil(math.log(low / factor) / math.log(keep)))
+    return base * factor * (1.0 - keep ** above) / SALE_IMPACT + base * low * (amount - above), low
+
+
+class TickScheduler:
+    """Advances the world of every live game on a fixed clock.
+
+    Every ``interval`` seconds each initialized session is owed one more
+    tick. Sessions are then served in batches of ``batch_size``, each under
+    its own session lock, and a new batch only starts while the tick's
+    ``budget`` lasts, so a slow tick never runs into the next one. Sessions
+    left over stay in the backlog, first in line next time, and catch up on
+    every tick they are owed in a single call.
+    """
+
+    def __init__(self, sessions, interval: float = DEFAULT_TICK_INTERVAL, budget: Optional[float] = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE, metrics: Optional[MetricsRegistry] = None):
+        self.sessions = sessions
+        self.interval = interval
+        self.budget = interval / 2 if budget is None else budget
+        self.batch_size = batch_size
+        self.series = (metrics or registry).ticks
+        # token -> [session, ticks owed], oldest debt first
+        self.backlog: 'OrderedDict[str, list]' = OrderedDict()
+        self.ticks = 0
+        self.overruns = 0
+        self.sessions_advanced = 0
+        self.last_tick_seconds = 0.0
+        # Guards the backlog against stats() readers; never held while a session is advanced
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def tick(self) -> int:
+        """Run one tick now; returns how many sessions were advanced"""
+        started = time.perf_counter()
+        with self._lock:
+            for session in self.sessions.live():
+                if not session.engine.is_initialized():
+                    continue
+                entry = self.backlog.get(session.token)
+                if entry is None:
+                    self.backlog[session.token] = [session, 1]
+                else:
+                    entry[1] += 1
+
+        advanced = 0
+        overran = False
+        while self.backlog:
+            # The first batch always runs, so the backlog drains however tight the budget
+            if advanced and time.perf_counter() - started >= self.budget:
+                overran = True
+                break
+            with self._lock:
+                batch = [self.backlog.popitem(last=False)[1] for _ in range(min(self.batch_size, len(self.backlog)))]
+            for session, owed in batch:
+                with session.lock:
+                    session.engine.advance_world(owed)
+            advanced += len(batch)
+
+        self.ticks += 1
+        self.sessions_advanced += advanced
+        self.overruns += overran
+        self.last_tick_seconds = time.perf_counter() - started
+        self.series.record(self.last_tick_seconds, error=overran)
+        return advanced
+
+    def start(self) -> threading.Thread:
+        """Tick every ``interval`` seconds on a daemon thread until ``stop``"""
+        def run():
+            deadline = time.monotonic() + self.interval
+            while not self._stop.wait(max(0.0, deadline - time.monotonic())):
+                self.tick()
+                # After a late tick, wait a full interval rather than firing a burst of catch-up ticks
+                deadline = max(deadline + self.interval, time.monotonic())
+
+        self.sessions.scheduler = self
+        self._thread = threading.Thread(target=run, name='tick-scheduler', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            backlog = len(self.backlog)
+            owed_ticks = sum(owed for _, owed in self.backlog.values())
+        return {
+            'ticks': self.ticks,
+            'backlog_sessions': backlog,
+            'owed_ticks': owed_ticks,
+            'last_tick_seconds': self.last_tick_seconds,
+            'overruns': self.overruns,
+            'sessions_advanced': self.sessions_advanced
+        }
@@ -0,0 +1,173 @@
+"""
+Uniform-grid spatial index over body positions
+"""
+
+import heapq
+import math
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .models import CelestialBody
+
+
+Cell = Tuple[int, int, int]
+
+
+class SpatialGrid:
+    """Buckets items (by index) into cubic cells ``cell_size`` across.
+
+    A radius query only visits the cells the sphere overlaps, and a nearest
+    query searches outward ring by ring, stopping once no unvisited cell can
+    hold anything closer. With bodies spread roughly evenly both cost about
+    the same whatever the total number of bodies.
+    """
+
+    def __init__(self, cell_size: float = 10.0):
+        self.cell_size = cell_size
+        self.cells: Dict[Cell, List[int]] = {}
+        self.positions: Dict[int, Tuple[float, float, float]] = {}
+        self._low: Optional[List[int]] = None
+        self._high: Optional[List[int]] = None
+
+    def __len__(self):
+        return len(self.positions)
+
+    def cell_of(self, position: Tuple[float, float, float]) -> Cell:
+        size = self.cell_size
+        return (math.floor(position[0] / size), math.floor(position[1] / size), math.floor(position[2] / size))
+
+    def add(self, index: int, position: Tuple[float, float, float]):
+        cell = self.cell_of(position)
+        self.cells.setdefault(cell, []).append(index)
+        self.positions[index] = position
+        if self._low is None:
+            self._low, self._high = list(cell), list(cell)
+        else:
+            for axis in range(3):
+                self._low[axis] = min(self._low[axis], cell[axis])
+                self._high[axis] = max(self._high[axis], cell[axis])
+
+    def within(self, position: Tuple[float, float, float], radius: float) -> List[Tuple[float, int]]:
+        """(distance, index) of every item within ``radius``, nearest first"""
+        if self._low is None:
+            return []
+        low = self.cell_of((position[0] - radius, position[1] - radius, position[2] - radius))
+        high = self.cell_of((position[0] + radius, position[1] + radius, position[2] + radius))
+        # Never walk cells beyond the occupied extent, however large the radius
+        low = [max(low[axis], self._low[axis]) for axis in range(3)]
+        high = [min(high[axis], self._high[axis]) for axis in range(3)]
+        found = []
+        cells, positions = self.cells, self.positions
+        for x in range(low[0], high[0] + 1):
+            for y in range(low[1], high[1] + 1):
+                for z in range(low[2], high[2] + 1):
+                    for index in cells.get((x, y, z), ()):
+                        distance = math.dist(position, positions[index])
+                        if distance <= radius:
+                            found.append((distance, index))
+        found.sort()
+        return found
+
+    def nearest(self, position: Tuple[float, float, float], k: int = 1,
+                predicate: Optional[Callable[[int], bool]] = None) -> List[Tuple[float, int]]:
+        """(distance, index) of the ``k`` nearest items accepted by ``predicate``, nearest first"""
+        if self._low is None or k <= 0:
+            return []
+        center = self.cell_of(position)
+        # Beyond this ring every cell lies outside the occupied extent
+        last_ring = max(max(abs(center[axis] - self._low[axis]), abs(center[axis] - self._high[axis]))
+                        for axis in range(3))
+        best: List[Tuple[float, int]] = []   # max-heap of the k closest so far, as (-distance, -index)
+        cells, positions = self.cells, self.positions
+        for ring in range(last_ring + 1):
+            # Anything in this ring or beyond is at least (ring - 1) cells away
+            if len(best) == k and -best[0][0] <= (ring - 1) * self.cell_size:
+                break
+            for cell in self._ring(center, ring):
+                for index in cells.get(cell, ()):
+                    if predicate is not None and not predicate(index):
+                        continue
+                    entry = (-math.dist(position, positions[index]), -index)
+                    if len(best) < k:
+                        heapq.heappush(best, entry)
+                    elif entry > best[0]:
+                        heapq.heapreplace(best, entry)
+        return sorted((-distance, -index) for distance, index in best)
+
+    def _ring(self, center: Cell, ring: int):
+        """Cells at Chebyshev distance exactly ``ring`` from ``center``, clipped to the occupied extent"""
+        cx, cy, cz = center
+        low, high = self._low, self._high
+        for x in range(max(cx - ring, low[0]), min(cx + ring, high[0]) + 1):
+            for y in range(max(cy - ring, low[1]), min(cy + ring, high[1]) + 1):
+                edge = abs(x - cx) == ring or abs(y - cy) == ring
+                if edge:
+                    zs = range(max(cz - ring, low[2]), min(cz + ring, high[2]) + 1)
+                else:
+                    # Interior column: only the two z faces belong to this ring
+                    zs = [z for z in (cz - ring, cz + ring) if low[2] <= z <= high[2]]
+                for z in zs:
+                    yield (x, y, z)
+
+
+class BodyIndex:
+    """Spatial grids over an engine's bodies: every body, outposts, and bodies holding each resource.
+
+    Items are positions in ``bodies``. Whether a deposit is mined out is
+    checked at query time, so mining never has to touch the index. Bodies
+    appended to the list later are added to the grids as they stand
+    (``update``); ``size`` counts the bodies indexed so far.
+    """
+
+    def __init__(self, bodies: Sequence[CelestialBody], cell_size: float = 10.0):
+        self.bodies = bodies
+        self.size = 0
+        self.cell_size = cell_size
+        self.all = SpatialGrid(cell_size)
+        self.outposts = SpatialGrid(cell_size)
+        self.by_resource: Dict = {}
+        self._last = None
+        self._add_tail()
+
+    def update(self, bodies: Sequence[CelestialBody]) -> bool:
+        """Index the bodies appended to ``bodies`` since the last call.
+
+        Returns False, leaving the index as it was, when ``bodies`` is not
+        the list this index was built on or bodies were dropped or moved in
+        it (the last indexed body is no longer in its place); the caller
+        then builds a new index.
+        """
+        if bodies is not self.bodies or len(bodies) < self.size:
+            return False
+        if self.size and bodies[self.size - 1] is not self._last:
+            return False
+        if len(bodies) > self.size:
+            self._add_tail()
+        return True
+
+    def _add_tail(self):
+        bodies = self.bodies
+        for index in range(self.size, len(bodies)):
+            body = bodies[index]
+            self.all.add(index, body.position)
+            if body.has_outpost and body.outpost is not None:
+                self.outposts.add(index, body.position)
+            for resource_type in body.resources:
+                grid = self.by_resource.get(resource_type)
+                if grid is None:
+                    grid = self.by_resource[resource_type] = SpatialGrid(self.cell_size)
+                grid.add(index, body.position)
+        self.size = len(bodies)
+        self._last = bodies[-1] if bodies else None
+
+    def within(self, position, radius: float) -> List[Tuple[float, int]]:
+        return self.all.within(position, radius)
+
+    def nearest_outposts(self, position, k: int = 1) -> List[Tuple[float, int]]:
+        return self.outposts.nearest(position, k)
+
+    def nearest_with_resource(self, position, resource_type, k: int = 1) -> List[Tuple[float, int]]:
+        grid = self.by_resource.get(resource_type)
+        if grid is None:
+            return []
+        bodies = self.bodies
+        return grid.nearest(position, k, lambda index: bodies[index].resources.get(resource_type, 0) > 0)
@@ -0,0 +1,107 @@
+"""
+In-memory cache of the web UI's static files
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+
+DEFAULT_ASSETS = ('game.html',)
+
+
+class StaticAsset:
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.content_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/'):
+            self.content_type += '; charset=utf-8'
+
+        with open(self.file_path, 'rb') as f:
+            self.raw = f.read()
+        self.mtime = os.stat(self.file_path).st_mtime
+        self.etag = f'"{hashlib.sha256(self.raw).hexdigest()[:20]}"'
+
+        # mtime=0 keeps the compressed bytes identical across restarts
+        compressed = gzip.compress(self.raw, compresslevel=9, mtime=0)
+        self.gzipped = compressed if len(compressed) < len(self.raw) else None
+        self.gzip_etag = self.etag[:-1] + '-gz"'
+
+    def is_stale(self) -> bool:
+        try:
+            return os.stat(self.file_path).st_mtime != self.mtime
+        except OSError:
+            return False
+
+
+class StaticAssetCache:
+    """Loads static files once, keeping raw and gzip-compressed copies in memory.
+
+    With ``watch=True`` the files' modification times are checked (at most
+    once per ``check_interval`` seconds, on access) and changed files are
+    reloaded, which is handy while editing game.html.
+    """
+
+    def __init__(self, root: str, files: Iterable[str] = DEFAULT_ASSETS,
+                 watch: bool = False, check_interval: float = 1.0):
+        self.root = root
+        self.watch = watch
+        self.check_interval = check_interval
+        self.assets: Dict[str, StaticAsset] = {}
+        self._last_check = time.monotonic()
+        self._lock = threading.Lock()
+
+        for name in files:
+            path = os.path.join(root, name)
+            if os.path.isfile(path):
+                self.assets['/' + name.replace(os.sep, '/')] = StaticAsset(path)
+
+    def get(self, url_path: str) -> Optional[StaticAsset]:
+        if self.watch:
+            self.reload_changed()
+        return self.assets.get(url_path)
+
+    def reload_changed(self) -> int:
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return 0
+
+        reloaded = 0
+        with self._lock:
+            self._last_check = now
+            for url_path, asset in list(self.assets.items()):
+                if asset.is_stale():
+                    # Swap in a new object so readers never see half-updated bytes
+                    self.assets[url_path] = StaticAsset(asset.file_path)
+                    reloaded += 1
+        return reloaded
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """True if an Accept-Encoding header gives gzip a quality above 0.
+
+    An explicit ``gzip`` entry wins over ``*``, so ``gzip;q=0`` and
+    ``identity, *;q=0`` both refuse it while ``*;q=0, gzip`` allows it.
+    """
+    if not accept_encoding:
+        return False
+    qualities = {}
+    for part in accept_encoding.split(','):
+        coding, *params = part.split(';')
+        coding = coding.strip().lower()
+        if coding not in ('gzip', 'x-gzip', '*'):
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities['gzip' if coding == 'x-gzip' else coding] = quality
+    return qualities.get('gzip', qualities.get('*', 0.0)) > 0
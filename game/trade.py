@@ -0,0 +1,97 @@
+"""
+Best-price index and trade route ranking
+"""
+
+import heapq
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+from .models import Outpost, ResourceType
+from .simulation import quote
+
+
+class PriceIndex:
+    """Sell prices of every resource at every outpost, with the best price per resource on hand.
+
+    Each resource keeps a max-heap of (price, outpost key). A price change
+    (``update``) pushes the new entry and leaves the old one to be skipped
+    lazily, so an update costs O(log n) and only touches the prices that
+    changed; the heap is rebuilt once stale entries outnumber live ones.
+    """
+
+    def __init__(self, outposts: Iterable[Tuple[Hashable, Outpost]] = ()):
+        self.outposts: Dict[Hashable, Outpost] = {}
+        self.prices: Dict[Hashable, Dict[ResourceType, float]] = {}
+        # Keys of each outpost, by id: bodies may share one outpost
+        self._keys: Dict[int, List[Hashable]] = {}
+        self._heaps: Dict[ResourceType, List[Tuple[float, int, Hashable]]] = {rt: [] for rt in ResourceType}
+        self._order = 0
+        self.updates = 0
+        for key, outpost in outposts:
+            self.add(key, outpost)
+
+    def add(self, key: Hashable, outpost: Outpost):
+        self.outposts[key] = outpost
+        self.prices[key] = {}
+        self._keys.setdefault(id(outpost), []).append(key)
+        self.update(key)
+
+    def update_outpost(self, outpost: Outpost, resource_types: Optional[Iterable[ResourceType]] = None):
+        """``update`` every key the outpost is listed under, e.g. after a sale moved its market"""
+        for key in self._keys.get(id(outpost), ()):
+            self.update(key, resource_types)
+
+    def update_all(self):
+        """``update`` every outpost, e.g. after world ticks moved markets; only changed prices are pushed"""
+        for key in self.outposts:
+            self.update(key)
+
+    def update(self, key: Hashable, resource_types: Optional[Iterable[ResourceType]] = None):
+        """Re-read an outpost's sell prices, for ``resource_types`` or all of them"""
+        outpost = self.outposts[key]
+        prices = self.prices[key]
+        for resource_type in (ResourceType if resource_types is None else resource_types):
+            price = outpost.get_sell_price(resource_type)
+            if prices.get(resource_type) == price:
+                continue
+            prices[resource_type] = price
+            self.updates += 1
+            self._order += 1
+            heap = self._heaps[resource_type]
+            # Negated for a max-heap; the insertion order breaks ties deterministically
+            heapq.heappush(heap, (-price, self._order, key))
+            if len(heap) > 2 * len(self.prices) + 16:
+                self._rebuild(resource_type)
+
+    def price(self, key: Hashable, resource_type: ResourceType) -> float:
+        return self.prices[key].get(resource_type, 0.0)
+
+    def best(self, resource_type: ResourceType) -> Optional[Tuple[float, Hashable]]:
+        """(price, outpost key) of the best market for a resource anywhere"""
+        heap = self._heaps[resource_type]
+        while heap:
+            price, _, key = heap[0]
+            if self.prices.get(key, {}).get(resource_type) == -price:
+                return -price, key
+            heapq.heappop(heap)
+        return None
+
+    def best_price(self, resource_type: ResourceType) -> float:
+        best = self.best(resource_type)
+        return best[0] if best else 0.0
+
+    def _rebuild(self, resource_type: ResourceType):
+        heap = [entry for entry in self._heaps[resource_type]
+                if self.prices[entry[2]].get(resource_type) == -entry[0]]
+        # Stale duplicates of a live price may remain; keep only the newest per outpost
+        newest = {}
+        for entry in heap:
+            if entry[2] not in newest or entry[1] > newest[entry[2]][1]:
+                newest[entry[2]] = entry
+        heap = list(newest.values())
+        heapq.heapify(heap)
+        self._heaps[resource_type] = heap
+
+
+def cargo_value(outpost: Outpost, cargo: Dict[ResourceType, int]) -> float:
+    """What selling all of ``cargo`` at ``outpost`` pays, each resource as one sale with its market impact"""
+    return sum(quote(outpost, resource_type, amount) for resource_type, amount in cargo.items())
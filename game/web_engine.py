@@ -3,29 +3,93 @@ Web Engine for Space Mining Empire
 """
 
 from typing import Dict, List, Optional
-import random
+import heapq
+import json
+import secrets
 
-from .models import Player, Ship, CelestialBody, Outpost, ResourceType
-from .world_generator import WorldGenerator
+from .models import FUEL_PER_DISTANCE, Player, Ship, CelestialBody, Outpost, ResourceType, travel_fuel_cost
+from .rng import GameRandom
+from .world_generator import STARTING_MAP, WorldGenerator
 from .shop import ShipShop
+from .navigation import RoutePlanner, itinerary
+from .spatial import BodyIndex
+from .trade import PriceIndex, cargo_value
+from .columnar import WorldStore
+from .simulation import World, quote, sell
+from .orderbook import SELL, SIDES, market_id
+from .events import EventStream
+from .metrics import instrument
+from .persistence import dump_game, load_game
 
 
 class GameWebEngine:
-    def __init__(self):
+    # Read-only views that can be served from the per-version cache
+    CACHED_VIEWS = {
+        'status': 'get_status',
+        'location': 'get_location_info',
+        'outposts': 'get_outposts',
+        'shop': 'get_shop_data',
+        'destinations': 'get_destinations',
+        'snapshot': 'get_snapshot'
+    }
+    
+    # Upper bound on steps in one batch (repeats included) so one request can't hog a session
+    MAX_BATCH_STEPS = 1000
+    
+    # Credits per unit of fuel bought at an outpost
+    FUEL_PRICE = 2.0
+    
+    def __init__(self, columnar=False):
         self.world_gen = WorldGenerator()
         self.shop = ShipShop()
         self.player = None
         self.celestial_bodies = []
         self.outposts = []
+        # This game's own random stream; replaced by every new game (see rng.py)
+        self.rng = GameRandom()
+        # The world's clock and the processes that run on it (see simulation.py)
+        self.world = World()
+        self.current_turn = 1
         self.settings = {
             'starting_credits': 1000.0
         }
+        # Bumped by every mutation; views and ETags are keyed on it. The epoch
+        # keeps versions from different engines (or server restarts) apart.
+        self.state_version = 0
+        self.state_epoch = secrets.token_hex(4)
+        self._view_cache = {}
+        self._spatial = None
+        self._planner = None
+        self._prices = None
+        self._prices_for = None
+        self._prices_size = 0
+        # World ticks moved markets since the price index was last brought up to date
+        self._prices_moved = False
+        # Keep resources and prices in NumPy columns (see columnar.py) instead of per-body dicts
+        self.columnar = columnar
+        self._store = None
+        self._store_for = None
+        self.events = EventStream()
+        # Called as recorder(engine, action, args) after every successful mutation (see journal.py)
+        self.recorder = None
+        # Sequence number of the last journaled action applied to this game
+        self.journal_seq = 0
+        # The shared order books and this player's name on them; set by SessionManager.create (see orderbook.py)
+        self.exchange = None
+        self.trader = None
+        # The map this game is played on; games on the same map share its outposts' order books
+        self.map_id = None
         # Don't auto-initialize - wait for user to start new game
         # self.initialize_game()
         
-    def initialize_game(self, starting_credits=None):
+    @instrument
+    def initialize_game(self, starting_credits=None, seed=None):
         if starting_credits is not None:
             self.settings['starting_credits'] = starting_credits
+        # The same seed and the same actions always play out identically
+        self.rng = GameRandom(seed)
+        self.world = World()
+        self.current_turn = 1
         
         # Create starting ship
         starter_ship = Ship(
@@ -45,12 +109,112 @@ class GameWebEngine:
         )
         
         # Generate world
-        self.celestial_bodies = self.world_gen.generate_starting_system()
+        self.celestial_bodies = self.world_gen.generate_starting_system(self.rng)
+        self.map_id = STARTING_MAP
         self.player.current_location = self.celestial_bodies[0]
+        if self.columnar:
+            self.world_store()
+        self.mark_changed()
+        # The journal keeps the whole new game, so replay doesn't depend on how the world was generated
+        if self.recorder is not None:
+            self.record_action('init', self.save_state())
+    
+    def record_action(self, action, *args):
+        if self.recorder is not None:
+            self.recorder(self, action, args)
+    
+    def replay_action(self, action, args):
+        """Re-apply a journaled action exactly as it first happened, without journaling it again"""
+        recorder, self.recorder = self.recorder, None
+        try:
+            if action == 'init':
+                self.load_state(args[0])
+            elif action == 'mine':
+                # The yield comes from the saved random stream, so re-mining reproduces it exactly
+                resource_type_name, mined_amount = args
+                replayed = self.world.mine(self.player.current_location, ResourceType(resource_type_name),
+                                           self.player.current_ship.mining_efficiency, self.rng)
+                if replayed != mined_amount:
+                    raise ValueError(f'Journal replay diverged: mined {replayed}, journal says {mined_amount}')
+                self._load_mined(ResourceType(resource_type_name), mined_amount)
+            elif action == 'travel':
+                self.travel_to(*args)
+            elif action == 'trade':
+                self.trade_at_outpost(*args)
+            elif action == 'buy':
+                self.buy_from_shop(*args)
+            elif action == 'refuel':
+                self.refuel(*args)
+            elif action == 'tick':
+                self.advance_world(*args)
+            elif action == 'end_turn':
+                self.end_turn()
+            elif action == 'ledger':
+                self._apply_ledger(*args)
+            else:
+                raise ValueError(f'Unknown journal action: {action}')
+        finally:
+            self.recorder = recorder
+    
+    def save_state(self):
+        """The whole game encoded in the binary save format (see persistence.py)"""
+        return dump_game(self)
+    
+    def load_state(self, data):
+        load_game(self, data)
+        # Every saved game was generated from the starting system
+        self.map_id = STARTING_MAP if self.is_initialized() else None
+        if self.columnar:
+            self.world_store()
+        self.mark_changed()
     
     def is_initialized(self):
         return self.player is not None
     
+    def mark_changed(self):
+        """Record that game state changed, invalidating every cached view and notifying listeners"""
+        self.state_version += 1
+        self._view_cache.clear()
+        if self.events.has_subscribers:
+            self.events.publish(self.get_tracked_state())
+    
+    def get_tracked_state(self):
+        """The fields pushed to event stream subscribers whenever they change"""
+        if not self.is_initialized():
+            return {}
+        
+        ship = self.player.current_ship
+        location = self.player.current_location
+        self.world.settle(location)
+        return {
+            'credits': self.player.credits,
+            'cargo': {rt.value: amount for rt, amount in ship.cargo.items()},
+            'cargo_used': ship.cargo_used,
+            'cargo_capacity': ship.cargo_capacity,
+            'current_fuel': ship.current_fuel,
+            'fuel_capacity': ship.fuel_capacity,
+            'ship_name': ship.name,
+            'location': location.name,
+            'resources': {rt.value: amount for rt, amount in location.resources.items() if amount > 0}
+        }
+    
+    def subscribe_events(self):
+        return self.events.subscribe(self.get_tracked_state())
+    
+    def get_etag(self):
+        return f'"{self.state_epoch}-{self.state_version}"'
+    
+    @instrument
+    def get_cached_view(self, view_name):
+        """Return (etag, JSON bytes) for a read-only view, serialized at most once per state version"""
+        cached = self._view_cache.get(view_name)
+        if cached is None:
+            data = getattr(self, self.CACHED_VIEWS[view_name])()
+            cached = (self.get_etag(), json.dumps(data).encode('utf-8'))
+            self._view_cache[view_name] = cached
+        return cached
+    
+    @instrument
     def get_status(self):
         if not self.is_initialized():
             return {'error': 'Game not initialized'}
@@ -58,6 +222,7 @@ class GameWebEngine:
         ship = self.player.current_ship
         return {
             'player_name': self.player.name,
+            'turn': self.current_turn,
             'credits': self.player.credits,
             'location': self.player.current_location.name,
             'ship_name': ship.name,
@@ -68,11 +233,13 @@ class GameWebEngine:
             'cargo': {rt.value: amount for rt, amount in ship.cargo.items()}
         }
     
+    @instrument
     def get_location_info(self):
         if not self.is_initialized():
             return {'error': 'Game not initialized'}
             
         location = self.player.current_location
+        self.world.settle(location)
         return {
             'name': location.name,
             'distance': location.distance_from_start,
@@ -85,6 +252,7 @@ class GameWebEngine:
             'resources': {rt.value: amount for rt, amount in location.resources.items() if amount > 0}
         }
     
+    @instrument
     def get_outposts(self):
         # Only return the outpost at current location (if any)
         current_location = self.player.current_location
@@ -98,7 +266,8 @@ class GameWebEngine:
         
         for resource_type, amount in self.player.current_ship.cargo.items():
             price = outpost.get_sell_price(resource_type)
-            value = amount * price
+            # Selling the lot moves the market as it goes, so it fetches less than amount * price
+            value = quote(outpost, resource_type, amount)
             total_value += value
             cargo_prices.append({
                 'resource': resource_type.value,
@@ -115,6 +284,7 @@ class GameWebEngine:
             'total_value': total_value
         }
     
+    @instrument
     def get_shop_data(self):
         upgrades = []
         for i, upgrade in enumerate(self.shop.upgrades):
@@ -144,6 +314,7 @@ class GameWebEngine:
             'current_ship': self.player.current_ship.name
         }
     
+    @instrument
     def get_destinations(self):
         current_location = self.player.current_location
         ship = self.player.current_ship
@@ -151,22 +322,253 @@ class GameWebEngine:
         destinations = []
         for i, body in enumerate(self.celestial_bodies):
             if body != current_location:
-                fuel_cost = int(abs(body.distance_from_start - current_location.distance_from_start) * 10)
-                destinations.append({
-                    'index': i,
-                    'name': body.name,
-                    'distance': body.distance_from_start,
-                    'body_type': body.body_type,
-                    'has_outpost': body.has_outpost,
-                    'outpost_name': body.outpost.name if body.outpost else None,
-                    'has_ship_shop': body.has_ship_shop,
-                    'fuel_cost': fuel_cost,
-                    'can_travel': ship.current_fuel >= fuel_cost,
-                    'has_resources': len(body.resources) > 0
-                })
+                destinations.append(self._destination(i, body, current_location, ship))
         
         return destinations
     
+    def _destination(self, index, body, current_location, ship):
+        fuel_cost = travel_fuel_cost(current_location, body)
+        return {
+            'index': index,
+            'name': body.name,
+            'distance': body.distance_from_start,
+            'body_type': body.body_type,
+            'has_outpost': body.has_outpost,
+            'outpost_name': body.outpost.name if body.outpost else None,
+            'has_ship_shop': body.has_ship_shop,
+            'fuel_cost': fuel_cost,
+            'can_travel': ship.current_fuel >= fuel_cost,
+            'has_resources': len(body.resources) > 0
+        }
+    
+    def spatial_index(self):
+        """Spatial index over celestial_bodies; bodies appended are added to it, anything else rebuilds it"""
+        if self._spatial is None or not self._spatial.update(self.celestial_bodies):
+            self._spatial = BodyIndex(self.celestial_bodies)
+        return self._spatial
+    
+    def world_store(self):
+        """Columnar store holding every body's resources and every outpost's prices.
+        
+        Created on first use (or when the map is replaced); bodies added to
+        the map since are moved in on the next call. Regrowth is brought up
+        to date first, so the columns hold what the bodies would report.
+        """
+        self.world.settle_all()
+        if self._store is None or self._store_for is not self.celestial_bodies:
+            self._store = WorldStore.from_bodies(self.celestial_bodies)
+            self._store_for = self.celestial_bodies
+        elif len(self._store.bodies) < len(self.celestial_bodies):
+            self._store.add_bodies(self.celestial_bodies[len(self._store.bodies):])
+        return self._store
+    
+    def route_planner(self):
+        """Route planner for the current map; a changed or grown map starts with an empty cache"""
+        index = self.spatial_index()
+        if self._planner is None or self._planner.index is not index or self._planner.size != index.size:
+            self._planner = RoutePlanner(index)
+        return self._planner
+    
+    def price_index(self):
+        """Sell prices at every outpost on the map, keyed by body index.
+        
+        Rebuilt with the spatial index, and outposts appended to the map are
+        added to it; prices moved by world ticks are updated in place on the
+        next call. Call ``update(body_index)`` on it after changing an
+        outpost's prices any other way.
+        """
+        index = self.spatial_index()
+        if self._prices is None or self._prices_for is not index:
+            self._prices = PriceIndex((i, self.celestial_bodies[i].outpost) for i in index.outposts.positions)
+            self._prices_for = index
+        else:
+            if self._prices_moved:
+                self._prices.update_all()
+            for i in range(self._prices_size, index.size):
+                if i in index.outposts.positions:
+                    self._prices.add(i, self.celestial_bodies[i].outpost)
+        self._prices_size = index.size
+        self._prices_moved = False
+        return self._prices
+    
+    def _repriced(self, outpost, resource_types):
+        """Bring the price index up to date after a sale moved these markets, if it has been built"""
+        if self._prices is not None:
+            self._prices.update_outpost(outpost, resource_types)
+    
+    @instrument
+    def rank_trade_routes(self, limit=10):
+        """Outposts reachable on the current fuel, ranked by what selling all cargo there nets.
+        
+        Net profit is the cargo's sale value minus the fuel burned getting
+        there, priced at FUEL_PRICE. Candidates are visited nearest first and
+        the search stops once even the best price anywhere for every cargo
+        resource could no longer beat the ranking so far.
+        """
+        if not self.is_initialized():
+            return {'error': 'Game not initialized'}
+        
+        current_location = self.player.current_location
+        ship = self.player.current_ship
+        cargo = dict(ship.cargo)
+        if not cargo:
+            return {'success': False, 'message': 'Cargo hold is empty'}
+        
+        prices = self.price_index()
+        best_anywhere = {rt: prices.best(rt) for rt in cargo}
+        # Selling pushes a market down, so no sale fetches more than its amount at today's best price
+        ceiling = sum(amount * (best_anywhere[rt][0] if best_anywhere[rt] else 0.0) for rt, amount in cargo.items())
+        
+        radius = (ship.current_fuel + 1) / FUEL_PER_DISTANCE
+        ranked = []   # min-heap of (net, -index) holding the top ``limit``
+        examined = 0
+        for distance, i in self.spatial_index().outposts.within(current_location.position, radius):
+            fuel_cost = travel_fuel_cost(current_location, self.celestial_bodies[i])
+            if fuel_cost > ship.current_fuel:
+                continue
+            fuel_spend = fuel_cost * self.FUEL_PRICE
+            # Farther outposts only cost more fuel, so once the ceiling can't beat the ranking, stop
+            if len(ranked) == limit and ceiling - fuel_spend <= ranked[0][0]:
+                break
+            examined += 1
+            net = cargo_value(prices.outposts[i], cargo) - fuel_spend
+            entry = (net, -i)
+            if len(ranked) < limit:
+                heapq.heappush(ranked, entry)
+            elif entry > ranked[0]:
+                heapq.heapreplace(ranked, entry)
+        
+        routes = []
+        for net, negative_index in sorted(ranked, reverse=True):
+            i = -negative_index
+            body = self.celestial_bodies[i]
+            fuel_cost = travel_fuel_cost(current_location, body)
+            routes.append({
+                'index': i,
+                'name': body.name,
+                'outpost_name': body.outpost.name,
+                'revenue': cargo_value(prices.outposts[i], cargo),
+                'fuel_cost': fuel_cost,
+                'net_profit': net,
+                'profit_per_fuel': net / fuel_cost if fuel_cost else None,
+                'here': body is current_location
+            })
+        
+        return {
+            'success': True,
+            'routes': routes,
+            'examined': examined,
+            'best_anywhere': {
+                rt.value: {'price': best[0], 'index': best[1], 'name': self.celestial_bodies[best[1]].name}
+                for rt, best in best_anywhere.items() if best
+            }
+        }
+    
+    @instrument
+    def plan_route(self, destination_index, time_weight=1.0):
+        """Cheapest multi-hop route to a destination, as batch actions (see run_batch)"""
+        if not self.is_initialized():
+            return {'error': 'Game not initialized'}
+        if not 0 <= destination_index < len(self.celestial_bodies):
+            return {'success': False, 'message': 'Invalid destination'}
+        
+        current_location = self.player.current_location
+        ship = self.player.current_ship
+        start = next(i for i, body in enumerate(self.celestial_bodies) if body is current_location)
+        if start == destination_index:
+            return {'success': False, 'message': 'Already at this location'}
+        
+        path = self.route_planner().plan(start, destination_index, ship.current_fuel, ship.fuel_capacity,
+                                         ship.speed, time_weight)
+        destination = self.celestial_bodies[destination_index]
+        if path is None:
+            return {
+                'success': False,
+                'message': f'No route to {destination.name} within a {ship.fuel_capacity} fuel tank'
+            }
+        
+        steps, total_fuel, fuel_spend = itinerary(self.celestial_bodies, path, ship.current_fuel, self.FUEL_PRICE)
+        return {
+            'success': True,
+            'message': f'Route to {destination.name}: {len(path) - 1} jumps, {total_fuel} fuel',
+            'steps': steps,
+            'jumps': len(path) - 1,
+            'total_fuel': total_fuel,
+            'fuel_spend': fuel_spend,
+            'affordable': fuel_spend <= self.player.credits
+        }
+    
+    @instrument
+    def find_destinations(self, kind='reachable', resource_type_name=None, offset=0, limit=20):
+        """One page of destinations, nearest first, found through the spatial index.
+        
+        ``kind`` is 'reachable' (every body within the current fuel),
+        'outposts' (nearest outposts) or 'resource' (nearest bodies still
+        holding ``resource_type_name``).
+        """
+        if not self.is_initialized():
+            return {'error': 'Game not initialized'}
+        
+        current_location = self.player.current_location
+        ship = self.player.current_ship
+        position = current_location.position
+        index = self.spatial_index()
+        # One extra match tells whether there is a next page; another covers the current location
+        wanted = offset + limit + 2
+        total = None
+        
+        if kind == 'reachable':
+            # Fuel costs round down, so the cut-off is one fuel unit past the tank
+            radius = (ship.current_fuel + 1) / FUEL_PER_DISTANCE
+            matches = [(distance, i) for distance, i in index.within(position, radius)
+                       if travel_fuel_cost(current_location, self.celestial_bodies[i]) <= ship.current_fuel]
+        elif kind == 'outposts':
+            matches = index.nearest_outposts(position, wanted)
+        elif kind == 'resource':
+            try:
+                resource_type = ResourceType(resource_type_name)
+            except ValueError:
+                return {'success': False, 'message': 'Invalid resource type'}
+            # Deposits mined out earlier may have grown back since
+            self.world.settle_all()
+            matches = index.nearest_with_resource(position, resource_type, wanted)
+        else:
+            return {'success': False, 'message': f'Unknown destination query: {kind}'}
+        
+        matches = [(distance, i) for distance, i in matches if self.celestial_bodies[i] is not current_location]
+        if kind == 'reachable':
+            total = len(matches)
+        page = matches[offset:offset + limit]
+        destinations = []
+        for distance, i in page:
+            entry = self._destination(i, self.celestial_bodies[i], current_location, ship)
+            entry['distance_away'] = round(distance, 3)
+            destinations.append(entry)
+        
+        return {
+            'kind': kind,
+            'destinations': destinations,
+            'offset': offset,
+            'limit': limit,
+            'total': total,
+            'next_offset': offset + limit if len(matches) > offset + limit else None
+        }
+    
+    @instrument
+    def get_snapshot(self):
+        """Every view the client refreshes after an action, built in one pass"""
+        if not self.is_initialized():
+            return {'error': 'Game not initialized'}
+        
+        return {
+            'status': self.get_status(),
+            'location': self.get_location_info(),
+            'outposts': self.get_outposts(),
+            'destinations': self.get_destinations(),
+            'shop': self.get_shop_data() if self.player.current_location.has_ship_shop else None
+        }
+    
+    @instrument
     def mine_resource(self, resource_type_name):
         try:
             resource_type = ResourceType(resource_type_name)
@@ -176,15 +578,27 @@ class GameWebEngine:
         location = self.player.current_location
         ship = self.player.current_ship
         
+        self.world.settle(location)
         if resource_type not in location.resources or location.resources[resource_type] <= 0:
             return {'success': False, 'message': 'Resource not available'}
         
-        mined_amount = location.mine_resource(resource_type, ship.mining_efficiency)
+        mined_amount = self.world.mine(location, resource_type, ship.mining_efficiency, self.rng)
+        # Journaled even when nothing was mined: the draw still advanced the random stream
+        self.record_action('mine', resource_type.value, mined_amount)
+        return self._load_mined(resource_type, mined_amount)
+    
+    def _load_mined(self, resource_type, mined_amount):
+        """Move freshly mined ore into the hold, returning what doesn't fit to the deposit"""
+        location = self.player.current_location
+        ship = self.player.current_ship
         
         if mined_amount > 0:
             added_amount = ship.add_cargo(resource_type, mined_amount)
             if added_amount < mined_amount:
                 location.resources[resource_type] += (mined_amount - added_amount)
+            self.mark_changed()
+            
+            if added_amount < mined_amount:
                 return {
                     'success': True, 
                     'message': f'Cargo full! Only loaded {added_amount} units of {resource_type.value}',
@@ -198,8 +612,79 @@ class GameWebEngine:
         else:
             return {'success': False, 'message': 'Mining failed - resource depleted or equipment malfunction!'}
     
+    @instrument
+    def refuel(self, amount=None):
+        """Buy fuel at an outpost: ``amount`` units, or as much as the tank takes"""
+        location = self.player.current_location
+        ship = self.player.current_ship
+        
+        if not location.has_outpost:
+            return {'success': False, 'message': 'No fuel depot at this location'}
+        
+        space = ship.fuel_capacity - ship.current_fuel
+        if amount is None:
+            amount = space
+        if amount <= 0 or amount > space:
+            return {'success': False, 'message': f'Can take between 1 and {space} fuel'}
+        
+        cost = amount * self.FUEL_PRICE
+        if cost > self.player.credits:
+            return {'success': False, 'message': f'Insufficient credits! Need {cost:.0f}'}
+        
+        ship.current_fuel += amount
+        self.player.credits -= cost
+        self.mark_changed()
+        self.record_action('refuel', amount)
+        
+        return {
+            'success': True,
+            'message': f'Refueled {amount} units for {cost:.0f} credits',
+            'remaining_fuel': ship.current_fuel
+        }
+    
+    @instrument
+    def end_turn(self):
+        """End the player's turn: the world moves on one tick"""
+        if not self.is_initialized():
+            return {'success': False, 'message': 'Game not initialized'}
+        
+        self.current_turn += 1
+        summary = self._advance_world(1)
+        self.record_action('end_turn')
+        # The turn counter moved even if the world didn't
+        self.mark_changed()
+        
+        return {
+            'success': True,
+            'message': f'Turn {self.current_turn} begins!',
+            'turn': self.current_turn,
+            'upcoming': self.world.upcoming(),
+            **summary
+        }
+    
+    @instrument
+    def advance_world(self, ticks=1):
+        """Run ``ticks`` world ticks between turns; the tick scheduler calls this for every live game"""
+        if not self.is_initialized() or ticks < 1:
+            return {'success': False, 'message': 'Nothing to advance'}
+        
+        summary = self._advance_world(ticks)
+        self.record_action('tick', ticks)
+        return {'success': True, **summary}
+    
+    def _advance_world(self, ticks):
+        summary = self.world.advance(self.celestial_bodies, self.rng, ticks,
+                                     store=self.world_store() if self.columnar else None)
+        if summary['markets_changed']:
+            # The best-price index picks up the moved prices on its next use
+            self._prices_moved = True
+        if summary['markets_changed'] or summary['deposits_changed']:
+            self.mark_changed()
+        return summary
+    
+    @instrument
     def travel_to(self, destination_index):
-        if destination_index >= len(self.celestial_bodies):
+        if not 0 <= destination_index < len(self.celestial_bodies):
             return {'success': False, 'message': 'Invalid destination'}
         
         current_location = self.player.current_location
@@ -209,7 +694,7 @@ class GameWebEngine:
             return {'success': False, 'message': 'Already at this location'}
         
         ship = self.player.current_ship
-        fuel_cost = int(abs(destination.distance_from_start - current_location.distance_from_start) * 10)
+        fuel_cost = travel_fuel_cost(current_location, destination)
         
         if ship.current_fuel < fuel_cost:
             return {
@@ -219,6 +704,8 @@ class GameWebEngine:
         
         ship.current_fuel -= fuel_cost
         self.player.current_location = destination
+        self.mark_changed()
+        self.record_action('travel', destination_index)
         
         return {
             'success': True,
@@ -226,6 +713,7 @@ class GameWebEngine:
             'remaining_fuel': ship.current_fuel
         }
     
+    @instrument
     def trade_at_outpost(self, resource_type_name=None, sell_all=False):
         current_location = self.player.current_location
         
@@ -241,14 +729,18 @@ class GameWebEngine:
             total_earnings = 0
             sold_items = []
             
-            for resource_type in list(self.player.current_ship.cargo.keys()):
+            sold_types = list(self.player.current_ship.cargo.keys())
+            for resource_type in sold_types:
                 amount = self.player.current_ship.remove_cargo(resource_type, 
                                                              self.player.current_ship.cargo[resource_type])
-                earnings = amount * outpost.get_sell_price(resource_type)
+                earnings = sell(outpost, resource_type, amount)
                 total_earnings += earnings
                 sold_items.append(f"{amount} {resource_type.value}")
             
+            self._repriced(outpost, sold_types)
             self.player.credits += total_earnings
+            self.mark_changed()
+            self.record_action('trade', None, True)
             
             return {
                 'success': True,
@@ -268,8 +760,11 @@ class GameWebEngine:
                 return {'success': False, 'message': 'No cargo of this type'}
             
             removed_amount = self.player.current_ship.remove_cargo(resource_type, amount)
-            earnings = removed_amount * outpost.get_sell_price(resource_type)
+            earnings = sell(outpost, resource_type, removed_amount)
+            self._repriced(outpost, [resource_type])
             self.player.credits += earnings
+            self.mark_changed()
+            self.record_action('trade', resource_type.value, False)
             
             return {
                 'success': True,
@@ -279,9 +774,10 @@ class GameWebEngine:
         
         return {'success': False, 'message': 'No action specified'}
     
+    @instrument
     def buy_from_shop(self, item_type, item_index):
         if item_type == 'upgrade':
-            if item_index >= len(self.shop.upgrades):
+            if not 0 <= item_index < len(self.shop.upgrades):
                 return {'success': False, 'message': 'Invalid upgrade'}
             
             upgrade = self.shop.upgrades[item_index]
@@ -294,6 +790,8 @@ class GameWebEngine:
             
             self.player.credits -= upgrade.cost
             self.shop.apply_upgrade(self.player.current_ship, upgrade)
+            self.mark_changed()
+            self.record_action('buy', item_type, item_index)
             
             return {
                 'success': True,
@@ -301,7 +799,7 @@ class GameWebEngine:
             }
         
         elif item_type == 'ship':
-            if item_index >= len(self.shop.ships):
+            if not 0 <= item_index < len(self.shop.ships):
                 return {'success': False, 'message': 'Invalid ship'}
             
             ship_blueprint = self.shop.ships[item_index]
@@ -315,6 +813,8 @@ class GameWebEngine:
             self.player.credits -= ship_blueprint.cost
             new_ship = self.shop.create_ship(ship_blueprint)
             self.player.ships.append(new_ship)
+            self.mark_changed()
+            self.record_action('buy', item_type, item_index)
             
             return {
                 'success': True,
@@ -324,3 +824,281 @@ class GameWebEngine:
         
         return {'success': False, 'message': 'Invalid item type'}
     
+    @instrument
+    def place_orders(self, orders):
+        """Post limit orders on the order books of the outpost the player is at.
+        
+        Each order is a dict such as {'side': 'sell', 'resource_type': 'Iron', 'quantity': 20, 'price': 12.5}.
+        Orders are paid for up front: a sell sets its cargo aside and a buy its credits (price times
+        quantity). Invalid orders are rejected one by one without stopping the rest.
+        """
+        if self.exchange is None:
+            return {'success': False, 'message': 'Player trading is not available'}
+        if not self.is_initialized():
+            return {'success': False, 'message': 'Game not initialized'}
+        
+        location = self.player.current_location
+        if not location.has_outpost or not location.outpost:
+            return {'success': False, 'message': 'No trading outpost at this location'}
+        
+        if not isinstance(orders, list):
+            return {'success': False, 'message': 'Orders must be a list'}
+        if len(orders) > self.MAX_BATCH_STEPS:
+            return {'success': False, 'message': f'Too many orders: {len(orders)}, limit is {self.MAX_BATCH_STEPS}'}
+        
+        ship = self.player.current_ship
+        accepted = []
+        rejected = []
+        credits = 0.0
+        cargo = {}
+        for index, order in enumerate(orders):
+            request, message = self._parse_order(order)
+            if request is not None:
+                side, resource_type, price, quantity = request
+                if side == SELL:
+                    if ship.cargo.get(resource_type, 0) < quantity:
+                        message = f'Not enough {resource_type.value} in the hold'
+                    else:
+                        ship.remove_cargo(resource_type, quantity)
+                        cargo[resource_type.value] = cargo.get(resource_type.value, 0) - quantity
+                elif price * quantity > self.player.credits:
+                    message = f'Insufficient credits! Need {price * quantity:.0f}'
+                else:
+                    self.player.credits -= price * quantity
+                    credits -= price * quantity
+            if message is None:
+                accepted.append(request)
+            else:
+                rejected.append({'index': index, 'message': message})
+        
+        if not accepted:
+            return {'success': False, 'message': 'No orders placed', 'orders': [], 'rejected': rejected}
+        
+        self.record_action('ledger', credits, tuple(cargo.items()))
+        placed, fills = self.exchange.submit_many(self.trader, self._market(), accepted)
+        collected = self._collect_proceeds()
+        self.mark_changed()
+        
+        return {
+            'success': True,
+            'message': f'Placed {len(placed)} orders at {location.outpost.name}, {len(fills)} trades',
+            'orders': [self._order_view(order) for order in placed],
+            'rejected': rejected,
+            'trades': len(fills),
+            'collected': collected
+        }
+    
+    def _parse_order(self, order):
+        if not isinstance(order, dict):
+            return None, 'Each order must be an object'
+        side = order.get('side')
+        if side not in SIDES:
+            return None, f"side must be one of {', '.join(SIDES)}"
+        try:
+            resource_type = ResourceType(order.get('resource_type'))
+        except ValueError:
+            return None, 'Invalid resource type'
+        quantity, price = order.get('quantity'), order.get('price')
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+            return None, 'quantity must be a positive integer'
+        if not isinstance(price, (int, float)) or isinstance(price, bool) or not 0 < price < float('inf'):
+            return None, 'price must be a positive number'
+        return (side, resource_type, float(price), quantity), None
+    
+    @instrument
+    def cancel_orders(self, order_ids=None):
+        """Withdraw the player's open orders (all of them when ``order_ids`` is None), refunding what was set aside"""
+        if self.exchange is None:
+            return {'success': False, 'message': 'Player trading is not available'}
+        if not self.is_initialized():
+            return {'success': False, 'message': 'Game not initialized'}
+        if order_ids is not None and (not isinstance(order_ids, list) or
+                                      not all(isinstance(order_id, int) for order_id in order_ids)):
+            return {'success': False, 'message': 'order_ids must be a list of order ids'}
+        
+        cancelled = self.exchange.cancel_many(self.trader, order_ids)
+        collected = self._collect_proceeds()
+        if cancelled or collected['credits'] or collected['goods']:
+            self.mark_changed()
+        
+        return {
+            'success': bool(cancelled),
+            'message': f'Cancelled {len(cancelled)} orders' if cancelled else 'No matching open orders',
+            'cancelled': [{'id': order.id, 'remaining': remaining} for order, remaining in cancelled],
+            'collected': collected
+        }
+    
+    @instrument
+    def collect_orders(self):
+        """Take in what filled and cancelled orders paid out; goods that don't fit the hold keep waiting"""
+        if self.exchange is None:
+            return {'success': False, 'message': 'Player trading is not available'}
+        if not self.is_initialized():
+            return {'success': False, 'message': 'Game not initialized'}
+        
+        collected = self._collect_proceeds()
+        if not collected['credits'] and not collected['goods']:
+            return {'success': False, 'message': 'Nothing to collect', 'collected': collected}
+        
+        self.mark_changed()
+        return {
+            'success': True,
+            'message': f"Collected {collected['credits']:.0f} credits and {sum(collected['goods'].values())} units of cargo",
+            'collected': collected
+        }
+    
+    def get_orders(self):
+        """The player's open orders, the books at the current outpost and what is waiting to be collected"""
+        if self.exchange is None:
+            return {'success': False, 'message': 'Player trading is not available'}
+        if not self.is_initialized():
+            return {'success': False, 'message': 'Game not initialized'}
+        
+        outpost = self.player.current_location.outpost
+        credits, goods = self.exchange.waiting(self.trader)
+        return {
+            'success': True,
+            'orders': [self._order_view(order) for order in self.exchange.open_orders(self.trader)],
+            'outpost': outpost.name if outpost else None,
+            'market': self._market() if outpost else None,
+            'books': {resource_type.value: book for resource_type, book
+                      in self.exchange.quotes(self._market()).items()} if outpost else {},
+            'waiting': {'credits': credits,
+                        'goods': {resource_type.value: amount for resource_type, amount in goods.items()}}
+        }
+    
+    def _order_view(self, order):
+        return {
+            'id': order.id,
+            'market': order.market,
+            'side': order.side,
+            'resource_type': order.resource_type.value,
+            'price': order.price,
+            'quantity': order.quantity,
+            'filled': order.filled
+        }
+    
+    def withdraw_orders(self, leaving=False):
+        """Cancel every open order and take in everything owed, in one step.
+        
+        The session registry calls this before it lets go of a game, so nothing the exchange
+        holds for the player is lost; when the player is ``leaving`` for good, goods that
+        don't fit the hold are given up along with their place on the exchange.
+        """
+        if self.exchange is None or not self.is_initialized():
+            return {'success': False, 'message': 'Nothing to withdraw'}
+        
+        cancelled, credits, goods = self.exchange.withdraw(self.trader, self.player.current_ship.cargo_free, leaving)
+        collected = self._pay_out(credits, goods)
+        if cancelled or credits or goods:
+            self.mark_changed()
+        return {
+            'success': True,
+            'message': f'Withdrew {len(cancelled)} orders',
+            'cancelled': [{'id': order.id, 'remaining': remaining} for order, remaining in cancelled],
+            'collected': collected
+        }
+    
+    def _market(self):
+        """Market id of the player's current location"""
+        location = self.player.current_location
+        index = next(index for index, body in enumerate(self.celestial_bodies) if body is location)
+        return market_id(self.map_id, index)
+    
+    def _collect_proceeds(self):
+        """Pay this player's proceeds from the exchange into the game, journaled as a ledger entry"""
+        return self._pay_out(*self.exchange.collect(self.trader, self.player.current_ship.cargo_free))
+    
+    def _pay_out(self, credits, goods):
+        cargo = tuple((resource_type.value, amount) for resource_type, amount in goods.items())
+        if credits or cargo:
+            self._apply_ledger(credits, cargo)
+            self.record_action('ledger', credits, cargo)
+        return {'credits': credits, 'goods': dict(cargo)}
+    
+    def _apply_ledger(self, credits, cargo):
+        """Move credits and cargo in or out of the game, as order escrow and exchange payouts do"""
+        ship = self.player.current_ship
+        self.player.credits += credits
+        for resource_type_name, amount in cargo:
+            if amount > 0:
+                ship.add_cargo(ResourceType(resource_type_name), amount)
+            else:
+                ship.remove_cargo(ResourceType(resource_type_name), -amount)
+    
+    @instrument
+    def run_batch(self, actions):
+        """Run an ordered list of actions, stopping at the first one that fails.
+        
+        Each action is a dict such as {'action': 'mine', 'resource_type': 'Iron', 'repeat': 20},
+        {'action': 'travel', 'destination_index': 1}, {'action': 'trade', 'sell_all': True},
+        {'action': 'buy', 'item_type': 'upgrade', 'item_index': 0} or {'action': 'refuel', 'amount': 20}.
+        The steps of a planned route (see plan_route) can be passed as they are.
+        """
+        if not self.is_initialized():
+            return {'success': False, 'message': 'Game not initialized', 'completed': 0, 'results': []}
+        
+        if not isinstance(actions, list):
+            return {'success': False, 'message': 'Actions must be a list', 'completed': 0, 'results': []}
+        
+        repeats = [action.get('repeat', 1) if isinstance(action, dict) else 1 for action in actions]
+        if any(not isinstance(repeat, int) or repeat < 1 for repeat in repeats):
+            return {'success': False, 'message': 'repeat must be a positive integer', 'completed': 0, 'results': []}
+        
+        total_steps = sum(repeats)
+        if total_steps > self.MAX_BATCH_STEPS:
+            return {
+                'success': False,
+                'message': f'Batch too large: {total_steps} steps, limit is {self.MAX_BATCH_STEPS}',
+                'completed': 0,
+                'results': []
+            }
+        
+        results = []
+        for index, (action, repeat) in enumerate(zip(actions, repeats)):
+            for _ in range(repeat):
+                result = self._run_batch_action(action)
+                result['index'] = index
+                results.append(result)
+                if not result['success']:
+                    return {
+                        'success': False,
+                        'message': f"Stopped at action {index}: {result['message']}",
+                        'completed': len(results) - 1,
+                        'stopped_at': index,
+                        'results': results
+                    }
+        
+        return {
+            'success': True,
+            'message': f'Completed {len(results)} actions',
+            'completed': len(results),
+            'results': results
+        }
+    
+    def _run_batch_action(self, action):
+        if not isinstance(action, dict):
+            return {'success': False, 'message': 'Each action must be an object'}
+        
+        name = action.get('action')
+        try:
+            if name == 'mine':
+                result = self.mine_resource(action['resource_type'])
+            elif name == 'travel':
+                result = self.travel_to(int(action['destination_index']))
+            elif name == 'trade':
+                result = self.trade_at_outpost(action.get('resource_type'), action.get('sell_all', False))
+            elif name == 'buy':
+                result = self.buy_from_shop(action['item_type'], int(action['item_index']))
+            elif name == 'refuel':
+                amount = action.get('amount')
+                result = self.refuel(None if amount is None else int(amount))
+            else:
+                return {'action': name, 'success': False, 'message': f'Unknown action: {name}'}
+        except KeyError as e:
+            return {'action': name, 'success': False, 'message': f'Missing field: {e.args[0]}'}
+        except (TypeError, ValueError):
+            return {'action': name, 'success': False, 'message': 'Invalid action parameters'}
+        
+        result['action'] = name
+        return result
@@ -0,0 +1,503 @@
+"""
+HTTP request handler and API routes shared by every web entry point
+"""
+
+import functools
+import http.cookies
+import http.server
+import os
+import urllib.parse
+
+from .columnar import HAVE_NUMPY
+from .events import HEARTBEAT, HEARTBEAT_INTERVAL, format_event
+from .journal import Journal
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, metrics_middleware, registry
+from .routing import (ApiError, Field, Request, Response, Router, etag_matches, gzip_middleware,
+                      timing_middleware, token_auth_middleware)
+from .sessions import SESSION_COOKIE, SESSION_HEADER, SessionManager
+from .simulation import TickScheduler
+from .static_assets import StaticAssetCache, accepts_gzip
+from .web_engine import GameWebEngine
+
+
+# Bodies larger than this are refused before they are read
+MAX_BODY_BYTES = 1024 * 1024
+# Most destinations one page of /api/nearby returns
+MAX_PAGE_SIZE = 100
+
+api = Router()
+# Outermost, so it sees the bytes actually sent and errors from every other layer
+api.use(metrics_middleware())
+api.use(timing_middleware)
+api.use(gzip_middleware())
+# Innermost: auth added by create_app runs first, so refused callers never get a session
+api.session_resolver = lambda request: request.handler.resolve_session()
+
+
+def cached_view(view_name):
+    """Route handler serving a read-only view, 304 when the client already has this state version"""
+    def handler(request):
+        etag, body = request.engine.get_cached_view(view_name)
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            return Response(status=304, headers={'ETag': etag})
+        # Let the browser keep the body but revalidate it on every poll
+        return Response(body, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+    handler.__name__ = view_name
+    return handler
+
+
+for view_name in GameWebEngine.CACHED_VIEWS:
+    api.add('GET', f'/api/{view_name}', cached_view(view_name), requires_game=True)
+
+
+@api.get('/api/init_game')
+def init_game_status(request):
+    if request.engine.is_initialized():
+        return {'success': True, 'message': 'Game already initialized'}
+    return {'success': False, 'message': 'Game not initialized'}
+
+
+@api.get('/api/events', locked=False)
+def events(request):
+    # The stream outlives the request, so it takes the session lock only to subscribe
+    request.handler.send_event_stream()
+
+
+@api.get('/api/metrics', locked=False, uses_session=False)
+def metrics(request):
+    handler = request.handler
+    gauges = {}
+    if handler is not None:
+        gauges.update({f'sme_{name}': value for name, value in handler.sessions.stats().items()})
+        scheduler = handler.sessions.scheduler
+        if scheduler is not None:
+            gauges.update({f'sme_tick_{name}': value for name, value in scheduler.stats().items()
+                           if name in ('backlog_sessions', 'owed_ticks', 'last_tick_seconds')})
+        gauges.update({f'sme_exchange_{name}': value for name, value in handler.sessions.exchange.stats().items()
+                       if name in ('books', 'open_orders')})
+        server = handler.server
+        for name in ('in_flight', 'queue_depth', 'rejected'):
+            if hasattr(server, name):
+                gauges[f'sme_server_{name}'] = getattr(server, name)
+    return Response(registry.render(gauges).encode('utf-8'), content_type=METRICS_CONTENT_TYPE)
+
+
+@api.get('/api/nearby', query={'kind': Field(str, required=False, default='reachable'),
+                               'resource_type': Field(str, required=False),
+                               'offset': Field(int, required=False, default=0),
+                               'limit': Field(int, required=False, default=20)},
+         requires_game=True)
+def nearby(request):
+    params = request.params
+    if params['offset'] < 0 or not 1 <= params['limit'] <= MAX_PAGE_SIZE:
+        raise ApiError(f'offset must be at least 0 and limit between 1 and {MAX_PAGE_SIZE}')
+    return request.engine.find_destinations(params['kind'], params['resource_type'],
+                                            params['offset'], params['limit'])
+
+
+@api.get('/api/route', query={'destination_index': Field(int),
+                              'time_weight': Field(float, required=False, default=1.0)},
+         requires_game=True)
+def route(request):
+    if request.params['time_weight'] < 0:
+        raise ApiError('time_weight must not be negative')
+    return request.engine.plan_route(request.params['destination_index'], request.params['time_weight'])
+
+
+@api.get('/api/trade_routes', query={'limit': Field(int, required=False, default=10)}, requires_game=True)
+def trade_routes(request):
+    if not 1 <= request.params['limit'] <= MAX_PAGE_SIZE:
+        raise ApiError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    return request.engine.rank_trade_routes(request.params['limit'])
+
+
+@api.post('/api/mine', schema={'resource_type': Field(str)},
+          requires_game=True, mutates=True, snapshot=True)
+def mine(request):
+    return request.engine.mine_resource(request.data['resource_type'])
+
+
+@api.post('/api/travel', schema={'destination_index': Field(int)},
+          requires_game=True, mutates=True, snapshot=True)
+def travel(request):
+    return request.engine.travel_to(request.data['destination_index'])
+
+
+@api.post('/api/trade', schema={'resource_type': Field(str, required=False, nullable=True),
+                                'sell_all': Field(bool, required=False, default=False)},
+          requires_game=True, mutates=True, snapshot=True)
+def trade(request):
+    return request.engine.trade_at_outpost(request.data['resource_type'], request.data['sell_all'])
+
+
+@api.post('/api/refuel', schema={'amount': Field(int, required=False, nullable=True)},
+          requires_game=True, mutates=True, snapshot=True)
+def refuel(request):
+    return request.engine.refuel(request.data['amount'])
+
+
+@api.post('/api/end_turn', requires_game=True, mutates=True, snapshot=True)
+def end_turn(request):
+    return request.engine.end_turn()
+
+
+@api.get('/api/orders', requires_game=True)
+def orders(request):
+    return request.engine.get_orders()
+
+
+@api.post('/api/orders', schema={'orders': Field(list)},
+          requires_game=True, mutates=True, snapshot=True)
+def place_orders(request):
+    return request.engine.place_orders(request.data['orders'])
+
+
+@api.post('/api/orders/cancel', schema={'order_ids': Field(list, required=False, nullable=True)},
+          requires_game=True, mutates=True, snapshot=True)
+def cancel_orders(request):
+    return request.engine.cancel_orders(request.data['order_ids'])
+
+
+@api.post('/api/orders/collect', requires_game=True, mutates=True, snapshot=True)
+def collect_orders(request):
+    return request.engine.collect_orders()
+
+
+@api.post('/api/shop/buy', schema={'item_type': Field(str), 'item_index': Field(int)},
+          requires_game=True, mutates=True, snapshot=True)
+def shop_buy(request):
+    return request.engine.buy_from_shop(request.data['item_type'], request.data['item_index'])
+
+
+@api.post('/api/batch', schema={'actions': Field(list)},
+          requires_game=True, mutates=True, snapshot=True)
+def batch(request):
+    # The whole batch runs under one acquisition of the session lock
+    return request.engine.run_batch(request.data['actions'])
+
+
+@api.post('/api/init_game', schema={'starting_credits': Field(float, required=False, default=1000),
+                                    'seed': Field(int, required=False, nullable=True)},
+          mutates=True)
+def init_game(request):
+    starting_credits = request.data['starting_credits']
+    try:
+        request.engine.initialize_game(starting_credits, seed=request.data['seed'])
+    except Exception as e:
+        print(f"Error in init_game: {e}")
+        return {'success': False, 'message': f'Failed to initialize game: {str(e)}'}
+    return {'success': True, 'message': f'Game initialized with {starting_credits} starting credits',
+            'seed': request.engine.rng.seed}
+
+
+class GameHTTPHandler(http.server.SimpleHTTPRequestHandler):
+    # Persistent connections: polling clients reuse one socket instead of reconnecting per call
+    protocol_version = 'HTTP/1.1'
+    # Drop connections that stall mid-request instead of tying up a worker
+    timeout = 30
+    # How long an idle persistent connection may wait for its next request
+    keep_alive_timeout = 5
+    # Requests served on one connection before the server asks the client to reconnect
+    max_keep_alive_requests = 100
+    # Headers and body go out as separate writes; with Nagle on, a kept-alive
+    # connection waits out the client's delayed ACK (~40 ms) on every response
+    disable_nagle_algorithm = True
+
+    def __init__(self, *args, sessions=None, static_assets=None, router=api, **kwargs):
+        self.sessions = sessions
+        self.static_assets = static_assets
+        self.router = router
+        self.session = None
+        self.game_engine = None
+        self.new_session = False
+        self.connection_header_sent = False
+        self.requests_handled = 0
+        super().__init__(*args, **kwargs)
+
+    def handle(self):
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection:
+            # Wait for the next request with the shorter idle timeout, then
+            # give the request itself the full per-request timeout
+            self.connection.settimeout(self.keep_alive_timeout)
+            try:
+                if not self.rfile.peek(1):
+                    break
+            except OSError:
+                break
+            self.connection.settimeout(self.timeout)
+            self.handle_one_request()
+
+    def parse_request(self):
+        # Reset first: a malformed request is answered from inside parse_request
+        self.connection_header_sent = False
+        if not super().parse_request():
+            return False
+
+        self.requests_handled += 1
+        # Per-request state must not leak between requests on the same connection
+        self.session = None
+        self.game_engine = None
+        self.new_session = False
+        return True
+
+    def send_header(self, keyword, value):
+        if keyword.lower() == 'connection':
+            self.connection_header_sent = True
+        super().send_header(keyword, value)
+
+    def end_headers(self):
+        if not self.close_connection:
+            remaining = self.max_keep_alive_requests - self.requests_handled
+            # Shed idle connections while requests are queueing for a worker
+            busy = getattr(self.server, 'queue_depth', 0) > 0
+            if remaining <= 0 or busy:
+                self.send_header('Connection', 'close')
+            else:
+                self.send_header('Keep-Alive', f'timeout={self.keep_alive_timeout}, max={remaining}')
+        elif not self.connection_header_sent and self.request_version == 'HTTP/1.1':
+            # Echo the client's "Connection: close", or it may try to reuse the socket we're closing
+            self.send_header('Connection', 'close')
+        super().end_headers()
+
+    def resolve_session(self):
+        """Attach the caller's session, from the token header or the session cookie"""
+        token = self.headers.get(SESSION_HEADER)
+        if not token:
+            try:
+                cookie = http.cookies.SimpleCookie(self.headers.get('Cookie', ''))
+            except http.cookies.CookieError:
+                cookie = {}
+            if SESSION_COOKIE in cookie:
+                token = cookie[SESSION_COOKIE].value
+
+        self.session, self.new_session = self.sessions.get_or_create(token)
+        self.game_engine = self.session.engine
+        return self.session
+
+    def do_GET(self):
+        path, query = self.split_path()
+        if path.startswith('/api/'):
+            self.handle_api('GET', path, query)
+            return
+
+        if path == '/':
+            self.path = path = '/game.html'
+
+        asset = self.static_assets.get(path) if self.static_assets else None
+        if asset:
+            self.send_static_asset(asset)
+            return
+
+        # Only the UI's own files are served: the directory they sit in may also hold
+        # the state file and journal, which carry every player's session token
+        self.send_error(404)
+
+    def send_head(self):
+        # SimpleHTTPRequestHandler's file serving (reached by HEAD) is closed for the same reason
+        self.send_error(404)
+        return None
+
+    def do_OPTIONS(self):
+        self.send_response(200)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', f'Content-Type, Authorization, {SESSION_HEADER}')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self):
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            content_length = -1
+        if not 0 <= content_length <= MAX_BODY_BYTES:
+            self.close_connection = True
+            self.send_error(413 if content_length > 0 else 400)
+            return
+
+        # Read the whole body before taking any lock, so a slow client can't stall other requests
+        body = self.rfile.read(content_length)
+        path, query = self.split_path()
+        self.handle_api('POST', path, query, body)
+
+    def split_path(self):
+        parts = urllib.parse.urlsplit(self.path)
+        return parts.path, dict(urllib.parse.parse_qsl(parts.query))
+
+    def handle_api(self, method, path, query, body=b''):
+        route = self.router.resolve(method, path)
+        if route is None:
+            # One shared series, so probing random paths can't grow the metrics without bound
+            registry.route(method, 'unmatched').record(0.0, error=True)
+            allowed = self.router.allowed_methods(path)
+            if allowed:
+                self.send_response(405)
+                self.send_header('Allow', ', '.join(allowed + ['OPTIONS']))
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+            else:
+                self.send_error(404)
+            return
+
+        # The router attaches the session once the request is through its middleware
+        request = Request(method, path, query, self.headers, body, handler=self)
+        response = self.router.dispatch(route, request)
+        if response is not None:
+            self.send_api(response)
+
+        if route.mutates and self.session is not None:
+            # Cheap bookkeeping; the engine is only walked again once its estimate is due
+            self.sessions.note_mutation(self.session)
+
+    def send_event_stream(self):
+        """Push state deltas to the client until it disconnects.
+
+        On a PooledHTTPServer the stream runs on a thread of its own once
+        the headers are out, so open browser tabs don't hold pool workers;
+        past the server's stream limit the client gets a 503 instead.
+        """
+        pooled = hasattr(self.server, 'hand_off')
+        if pooled and not self.server.open_stream():
+            self.send_api(Response.json({'success': False, 'message': 'Too many event streams open, try again later'},
+                                        status=503, headers={'Retry-After': '30'}))
+            return
+
+        engine = self.game_engine
+        with self.session.lock:
+            subscription = engine.subscribe_events()
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('X-Accel-Buffering', 'no')
+            # The stream has no length; it ends when the connection does
+            self.send_header('Connection', 'close')
+            self.send_common_headers()
+            self.end_headers()
+            self.wfile.flush()
+        except OSError:
+            engine.events.unsubscribe(subscription)
+            if pooled:
+                self.server.close_stream()
+            return
+
+        connection = self.connection
+
+        def pump():
+            try:
+                # The first message carries the full tracked state, later ones only what changed
+                event = 'state'
+                while True:
+                    delta = subscription.wait(HEARTBEAT_INTERVAL)
+                    if subscription.closed:
+                        break
+                    # Straight to the socket: the handler's own files are closed once it hands off
+                    connection.sendall(HEARTBEAT if delta is None else format_event(event, delta))
+                    if delta is not None:
+                        event = 'delta'
+            except OSError:
+                # Client went away (or stalled past the socket timeout)
+                pass
+            finally:
+                engine.events.unsubscribe(subscription)
+
+        if pooled:
+            self.server.hand_off(self.request, self.client_address, pump)
+        else:
+            pump()
+
+    def send_static_asset(self, asset):
+        """Serve a cached file, gzip-compressed when the client accepts it"""
+        use_gzip = asset.gzipped is not None and accepts_gzip(self.headers.get('Accept-Encoding'))
+        etag = asset.gzip_etag if use_gzip else asset.etag
+
+        if etag_matches(self.headers.get('If-None-Match'), asset.etag):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Vary', 'Accept-Encoding')
+            self.end_headers()
+            return
+
+        body = asset.gzipped if use_gzip else asset.raw
+        self.send_response(200)
+        self.send_header('Content-Type', asset.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+        if use_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_api(self, response):
+        self.send_response(response.status)
+        # A 304 has no body, and its headers must not describe one
+        if response.status != 304:
+            self.send_header('Content-Type', response.content_type)
+            self.send_header('Content-Length', str(len(response.body)))
+        for name, value in response.headers.items():
+            self.send_header(name, value)
+        self.send_common_headers()
+        self.end_headers()
+        if response.status != 304:
+            self.wfile.write(response.body)
+
+    def send_api_response(self, data, status=200):
+        self.send_api(Response.json(data, status))
+
+    def send_common_headers(self):
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', f'Content-Type, Authorization, {SESSION_HEADER}')
+        self.send_header('Access-Control-Expose-Headers', f'{SESSION_HEADER}, Server-Timing')
+        if self.new_session:
+            self.send_header('Set-Cookie', f'{SESSION_COOKIE}={self.session.token}; Path=/; HttpOnly; SameSite=Lax')
+            self.send_header(SESSION_HEADER, self.session.token)
+
+
+def create_handler(sessions, static_assets=None, router=api, handler_class=None):
+    handler_class = handler_class or GameHTTPHandler
+    def handler(*args, **kwargs):
+        return handler_class(*args, sessions=sessions, static_assets=static_assets, router=router, **kwargs)
+    return handler
+
+
+def create_app(args=None, root=None, handler_class=None):
+    """Build the sessions and request handler an entry point serves.
+
+    ``args`` is the argparse namespace from ``add_server_arguments``; ``root``
+    is the directory holding game.html (the current directory by default).
+    """
+    root = root or os.getcwd()
+    # Every client gets its own engine - games are not initialized until the player starts one
+    engine_factory = GameWebEngine
+    if getattr(args, 'columnar', False):
+        if not HAVE_NUMPY:
+            # Fail at startup rather than on every player's first new game
+            raise RuntimeError('--columnar needs NumPy (pip install numpy)')
+        engine_factory = functools.partial(GameWebEngine, columnar=True)
+    sessions = SessionManager(engine_factory=engine_factory, state_file=getattr(args, 'state_file', None))
+    if sessions.state_file and os.path.exists(sessions.state_file):
+        count = sessions.load_all()
+        print(f"Restored {count} sessions from {sessions.state_file}")
+    journal_dir = getattr(args, 'journal_dir', None)
+    if journal_dir:
+        journal = Journal(journal_dir)
+        replayed = journal.recover(sessions)
+        journal.attach(sessions)
+        print(f"Journal: {len(sessions)} sessions recovered ({replayed} actions replayed) from {journal_dir}")
+    sessions.start_sweeper()
+    tick_interval = getattr(args, 'tick_interval', 0)
+    if tick_interval > 0:
+        TickScheduler(sessions, tick_interval, budget=getattr(args, 'tick_budget', None)).start()
+    static_assets = StaticAssetCache(root, watch=getattr(args, 'dev_reload', False))
+
+    router = api
+    api_key = getattr(args, 'api_key', None)
+    if api_key:
+        router = api.with_middleware(token_auth_middleware(api_key))
+    return sessions, create_handler(sessions, static_assets, router, handler_class)
@@ -0,0 +1,176 @@
+"""
+Concurrent HTTP serving for the Space Mining Empire web entry points
+"""
+
+import argparse
+import socket
+import socketserver
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .simulation import DEFAULT_TICK_INTERVAL
+
+
+DEFAULT_WORKERS = 16
+DEFAULT_MAX_QUEUE = 256
+DEFAULT_MAX_STREAMS = 256
+
+_OVERLOADED_BODY = b'{"success": false, "message": "Server is busy, try again shortly"}'
+OVERLOADED_RESPONSE = (
+    b'HTTP/1.1 503 Service Unavailable\r\n'
+    b'Content-Type: application/json\r\n'
+    b'Retry-After: 1\r\n'
+    b'Connection: close\r\n'
+    b'Content-Length: ' + str(len(_OVERLOADED_BODY)).encode('ascii') + b'\r\n'
+    b'\r\n' + _OVERLOADED_BODY
+)
+
+
+class PooledHTTPServer(socketserver.TCPServer):
+    """TCPServer that hands each connection to a fixed pool of worker threads.
+
+    At most ``workers`` connections are served at once and at most
+    ``max_queue`` more wait for a free worker; anything beyond that is
+    answered with a 503 straight from the accept loop, so a burst of slow
+    clients can never pile up unbounded work.
+
+    Long-lived responses (event streams) don't hold a worker: once a handler
+    has been admitted by ``open_stream`` and sent its headers, ``hand_off``
+    moves the connection to a thread of its own. At most ``max_streams`` are
+    open at once.
+    """
+
+    allow_reuse_address = True
+
+    def __init__(self, server_address, handler_class, workers=DEFAULT_WORKERS,
+                 max_queue=DEFAULT_MAX_QUEUE, max_streams=DEFAULT_MAX_STREAMS, bind_and_activate=True):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_streams = max_streams
+        self.request_queue_size = max(socketserver.TCPServer.request_queue_size, max_queue)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='http-worker')
+        self.in_flight = 0
+        self.rejected = 0
+        self.streams = 0
+        # Connections handed off to a stream thread, which closes them itself
+        self._handed_off = set()
+        self._admission_lock = threading.Lock()
+        super().__init__(server_address, handler_class, bind_and_activate)
+
+    def process_request(self, request, client_address):
+        with self._admission_lock:
+            admitted = self.in_flight < self.workers + self.max_queue
+            if admitted:
+                self.in_flight += 1
+            else:
+                self.rejected += 1
+
+        if not admitted:
+            self.reject_request(request)
+            return
+
+        self.executor.submit(self.process_request_worker, request, client_address)
+
+    def process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            with self._admission_lock:
+                self.in_flight -= 1
+                handed_off = request in self._handed_off
+                self._handed_off.discard(request)
+            if not handed_off:
+                self.shutdown_request(request)
+
+    def open_stream(self) -> bool:
+        """Claim one of the ``max_streams`` stream slots; False when all are taken"""
+        with self._admission_lock:
+            if self.streams >= self.max_streams:
+                return False
+            self.streams += 1
+            return True
+
+    def close_stream(self):
+        """Give back a slot claimed by ``open_stream`` that was never handed off"""
+        with self._admission_lock:
+            self.streams -= 1
+
+    def hand_off(self, request, client_address, serve):
+        """Run ``serve()`` for an open stream on its own thread, then close the connection and free its slot"""
+        with self._admission_lock:
+            self._handed_off.add(request)
+
+        def run():
+            try:
+                serve()
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+                self.close_stream()
+
+        threading.Thread(target=run, name='event-stream', daemon=True).start()
+
+    def reject_request(self, request):
+        try:
+            request.sendall(OVERLOADED_RESPONSE)
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self.in_flight - self.workers)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+
+def add_server_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'worker threads serving requests (default {DEFAULT_WORKERS})')
+    parser.add_argument('--max-queue', type=int, default=DEFAULT_MAX_QUEUE,
+                        help=f'connections allowed to wait for a worker before new ones get a 503 '
+                             f'(default {DEFAULT_MAX_QUEUE})')
+    parser.add_argument('--max-streams', type=int, default=DEFAULT_MAX_STREAMS,
+                        help=f'event streams open at once, each on its own thread rather than a worker; '
+                             f'more get a 503 (default {DEFAULT_MAX_STREAMS})')
+    parser.add_argument('--dev-reload', action='store_true',
+                        help='reload game.html from disk whenever it changes')
+    parser.add_argument('--state-file',
+                        help='restore sessions from this file at startup and save them to it on shutdown')
+    parser.add_argument('--journal-dir',
+                        help='journal every action to this directory and recover sessions from it after a crash')
+    parser.add_argument('--tick-interval', type=float, default=DEFAULT_TICK_INTERVAL,
+                        help=f'seconds between world ticks for every live game, 0 to stop the clock '
+                             f'(default {DEFAULT_TICK_INTERVAL:g})')
+    parser.add_argument('--tick-budget', type=float,
+                        help='seconds one tick may spend advancing games before the rest wait for the next '
+                             '(default half the interval)')
+    parser.add_argument('--columnar', action='store_true',
+                        help='keep body resources and outpost prices in NumPy columns (needs numpy)')
+    parser.add_argument('--api-key',
+                        help='require "Authorization: Bearer <key>" on every API request '
+                             '(for scripted clients; the browser UI does not send it)')
+
+
+def create_server(server_address, handler, args=None) -> PooledHTTPServer:
+    workers = getattr(args, 'workers', DEFAULT_WORKERS)
+    max_queue = getattr(args, 'max_queue', DEFAULT_MAX_QUEUE)
+    max_streams = getattr(args, 'max_streams', DEFAULT_MAX_STREAMS)
+    return PooledHTTPServer(server_address, handler, workers=workers, max_queue=max_queue, max_streams=max_streams)
+
+
+def find_available_port(start_port: int = 8080) -> int:
+    """Find an available port starting from start_port"""
+    for port in range(start_port, start_port + 10):
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+                s.bind(('', port))
+                return port
+        except OSError:
+            continue
+    raise OSError("No available ports found")
@@ -3,10 +3,24 @@ World and content generation for Space Mining Empire
 """
 
 import random
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from .models import CelestialBody, Outpost, ResourceType
 
 
+# Mix of procedurally generated bodies (see generate_sector)
+BODY_TYPE_WEIGHTS = {"asteroid": 40, "planet": 30, "moon": 20, "station": 10}
+BODY_RICHNESS = {"asteroid": 300, "planet": 200, "moon": 120, "station": 0}
+BODY_DIFFICULTY = {"asteroid": 1.0, "planet": 0.9, "moon": 1.6, "station": 0.0}
+BODY_TYPE_SUFFIXES = {"asteroid": "", "planet": " Prime", "moon": " Minor", "station": " Station"}
+OUTPOST_TYPE_WEIGHTS = {"mining_station": 5, "trade_hub": 3, "research_facility": 2}
+OUTPOST_TYPE_NAMES = {"mining_station": "Trading Post", "trade_hub": "Exchange",
+                      "research_facility": "Research Facility"}
+# Every game made by generate_starting_system is on this map: the stream only sizes its
+# deposits, so the bodies, outposts and their order are the same whatever the seed
+STARTING_MAP = 'starting-system'
+NAME_SYLLABLES = ("ka", "ve", "ri", "on", "tau", "xe", "lo", "mar", "zen", "qua", "dra", "sol", "ny", "th", "ul")
+
+
 class WorldGenerator:
     def __init__(self):
         self.resource_base_values = {
@@ -18,7 +32,8 @@ class WorldGenerator:
             ResourceType.QUANTUM_CRYSTALS: 100.0
         }
     
-    def generate_starting_system(self) -> List[CelestialBody]:
+    def generate_starting_system(self, rng=random) -> List[CelestialBody]:
+        """Generate the starting bodies, drawing from ``rng`` (a GameRandom, or the random module)"""
         bodies = []
         
         # Starting planet - good for initial mining, no outpost
@@ -26,9 +41,9 @@ class WorldGenerator:
             name="Kepler-442b",
             distance_from_start=0.0,
             resources={
-                ResourceType.IRON: random.randint(50, 100),
-                ResourceType.COPPER: random.randint(30, 60),
-                ResourceType.TITANIUM: random.randint(10, 25)
+                ResourceType.IRON: rng.randint(50, 100),
+                ResourceType.COPPER: rng.randint(30, 60),
+                ResourceType.TITANIUM: rng.randint(10, 25)
             },
             mining_difficulty=0.8,
             body_type="planet",
@@ -73,10 +88,10 @@ class WorldGenerator:
             name="Asteroid Belt Alpha",
             distance_from_start=3.2,
             resources={
-                ResourceType.IRON: random.randint(100, 200),
-                ResourceType.COPPER: random.randint(60, 120),
-                ResourceType.GOLD: random.randint(15, 30),
-                ResourceType.TITANIUM: random.randint(20, 40)
+                ResourceType.IRON: rng.randint(100, 200),
+                ResourceType.COPPER: rng.randint(60, 120),
+                ResourceType.GOLD: rng.randint(15, 30),
+                ResourceType.TITANIUM: rng.randint(20, 40)
             },
             mining_difficulty=1.1,
             body_type="asteroid",
@@ -89,8 +104,8 @@ class WorldGenerator:
             name="Titan-VII Research Base",
             distance_from_start=6.8,
             resources={
-                ResourceType.RARE_EARTH: random.randint(5, 15),  # Small mining opportunity
-                ResourceType.QUANTUM_CRYSTALS: random.randint(1, 3)
+                ResourceType.RARE_EARTH: rng.randint(5, 15),  # Small mining opportunity
+                ResourceType.QUANTUM_CRYSTALS: rng.randint(1, 3)
             },
             mining_difficulty=2.0,
             body_type="moon",
@@ -124,9 +139,9 @@ class WorldGenerator:
             name="Xerion Prime",
             distance_from_start=8.5,
             resources={
-                ResourceType.RARE_EARTH: random.randint(30, 60),
-                ResourceType.QUANTUM_CRYSTALS: random.randint(8, 15),
-                ResourceType.GOLD: random.randint(25, 50)
+                ResourceType.RARE_EARTH: rng.randint(30, 60),
+                ResourceType.QUANTUM_CRYSTALS: rng.randint(8, 15),
+                ResourceType.GOLD: rng.randint(25, 50)
             },
             mining_difficulty=2.5,
             body_type="planet",
@@ -138,4 +153,69 @@ class WorldGenerator:
     
     def get_outposts_from_bodies(self, bodies: List[CelestialBody]) -> List[CelestialBody]:
         """Returns list of celestial bodies that have outposts"""
-        return [body for body in bodies if body.has_outpost]
\ No newline at end of file
+        return [body for body in bodies if body.has_outpost]
+
+    def generate_sector(self, rng, origin: Tuple[float, float, float], size: float, count: int,
+                        flat: bool = False) -> List[CelestialBody]:
+        """Generate ``count`` bodies scattered through the cube of side ``size`` at ``origin``.
+
+        Everything is drawn from ``rng``, so a sector is fully determined by
+        its stream. Resources are scarcer the more they are worth, and outpost
+        prices are set around ``resource_base_values``.
+        """
+        bodies = []
+        for _ in range(count):
+            body_type = self._pick(rng, BODY_TYPE_WEIGHTS)
+            x = origin[0] + rng.uniform(0.0, size)
+            y = origin[1] + rng.uniform(0.0, size)
+            z = 0.0 if flat else origin[2] + rng.uniform(0.0, size)
+            richness = BODY_RICHNESS[body_type]
+            resources = {}
+            if richness:
+                for resource_type, base_value in self.resource_base_values.items():
+                    # Presence and amount both fall off with value: iron is everywhere, quantum crystals rare
+                    if rng.random() < min(0.9, 2.5 / base_value ** 0.5):
+                        resources[resource_type] = int(rng.uniform(0.5, 1.5) * richness / base_value ** 0.5) + 1
+            
+            has_outpost = body_type == "station" or (body_type != "asteroid" and rng.random() < 0.15)
+            bodies.append(CelestialBody(
+                name=self._name(rng, body_type),
+                distance_from_start=(x * x + y * y + z * z) ** 0.5,
+                resources=resources,
+                mining_difficulty=round(BODY_DIFFICULTY[body_type] * rng.uniform(0.8, 1.6), 2) if richness else 0.0,
+                body_type=body_type,
+                has_outpost=has_outpost,
+                outpost=self._outpost(rng) if has_outpost else None,
+                has_ship_shop=body_type == "station" and rng.random() < 0.3,
+                position=(x, y, z)
+            ))
+        return bodies
+    
+    def _outpost(self, rng) -> Outpost:
+        outpost_type = self._pick(rng, OUTPOST_TYPE_WEIGHTS)
+        prices = {resource_type: round(base_value * rng.uniform(1.0, 1.6), 2)
+                  for resource_type, base_value in self.resource_base_values.items()}
+        # Each outpost is hungry for a couple of resources
+        resource_types = list(self.resource_base_values)
+        demand = {}
+        for _ in range(rng.randint(1, 3)):
+            demand[resource_types[rng.randint(0, len(resource_types) - 1)]] = round(rng.uniform(1.1, 2.0), 2)
+        name = f"{self._syllables(rng)} {OUTPOST_TYPE_NAMES[outpost_type]}"
+        return Outpost(name=name, outpost_type=outpost_type, resource_prices=prices, demand_multipliers=demand)
+    
+    def _name(self, rng, body_type: str) -> str:
+        return f"{self._syllables(rng)}-{rng.randint(1, 999)}{BODY_TYPE_SUFFIXES[body_type]}"
+    
+    @staticmethod
+    def _syllables(rng) -> str:
+        return ''.join(NAME_SYLLABLES[rng.randint(0, len(NAME_SYLLABLES) - 1)]
+                       for _ in range(rng.randint(2, 3))).capitalize()
+    
+    @staticmethod
+    def _pick(rng, weights):
+        roll = rng.random() * sum(weights.values())
+        for choice, weight in weights.items():
+            roll -= weight
+            if roll < 0:
+                return choice
+        return choice
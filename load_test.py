@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Space Mining Empire - Web API load generator
+
+Simulates concurrent commanders, each playing a mine -> travel -> trade -> shop
+loop against the web API, and prints throughput, latency percentiles and
+error rates as JSON.
+
+    python3 load_test.py --commanders 50 --duration 30
+    python3 load_test.py --url http://localhost:8080 --output before.json
+"""
+
+import argparse
+import http.client
+import json
+import math
+import random
+import sys
+import threading
+import time
+import urllib.parse
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    # The epsilon keeps float noise (0.99 * 100 = 99.00000000000001) from skipping a rank
+    rank = math.ceil(q * len(sorted_values) - 1e-9)
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+class Recorder:
+    """Latency samples and outcome counts, per route"""
+
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self.failed_actions = {}
+        self._lock = threading.Lock()
+
+    def record(self, route, seconds, error=False, failed=False):
+        with self._lock:
+            self.samples.setdefault(route, []).append(seconds)
+            if error:
+                self.errors[route] = self.errors.get(route, 0) + 1
+            if failed:
+                self.failed_actions[route] = self.failed_actions.get(route, 0) + 1
+
+    def report(self, elapsed):
+        def describe(samples, errors, failed):
+            samples = sorted(samples)
+            return {
+                'requests': len(samples),
+                'errors': errors,
+                'error_rate': errors / len(samples) if samples else 0.0,
+                'failed_actions': failed,
+                'p50_ms': percentile(samples, 0.50) * 1000,
+                'p90_ms': percentile(samples, 0.90) * 1000,
+                'p99_ms': percentile(samples, 0.99) * 1000,
+                'max_ms': (samples[-1] if samples else 0.0) * 1000,
+            }
+
+        with self._lock:
+            routes = {route: describe(samples, self.errors.get(route, 0), self.failed_actions.get(route, 0))
+                      for route, samples in sorted(self.samples.items())}
+            all_samples = [s for samples in self.samples.values() for s in samples]
+            overall = describe(all_samples, sum(self.errors.values()), sum(self.failed_actions.values()))
+        overall['throughput_rps'] = overall['requests'] / elapsed if elapsed else 0.0
+        return {'overall': overall, 'routes': routes}
+
+
+class Commander:
+    """One simulated player with its own session and (kept-alive) connection"""
+
+    def __init__(self, url, recorder, keep_alive=True, think_time=0.0, seed=None):
+        parts = urllib.parse.urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.recorder = recorder
+        self.keep_alive = keep_alive
+        self.think_time = think_time
+        self.random = random.Random(seed)
+        self.token = None
+        self.connection = None
+
+    def request(self, method, path, body=None):
+        """Send one request; returns the decoded JSON body, or None on a transport/HTTP error"""
+        headers = {}
+        if self.token:
+            headers['X-Session-Token'] = self.token
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        if not self.keep_alive:
+            headers['Connection'] = 'close'
+
+        route = f'{method} {path}'
+        started = time.perf_counter()
+        try:
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            self.connection.request(method, path, body=payload, headers=headers)
+            response = self.connection.getresponse()
+            data = response.read()
+            if not self.keep_alive or response.getheader('Connection', '').lower() == 'close':
+                self.close()
+        except (OSError, http.client.HTTPException):
+            self.recorder.record(route, time.perf_counter() - started, error=True)
+            self.close()
+            return None
+        elapsed = time.perf_counter() - started
+
+        self.token = response.getheader('X-Session-Token') or self.token
+        if response.status >= 400:
+            self.recorder.record(route, elapsed, error=True)
+            return None
+        result = json.loads(data) if data else {}
+        self.recorder.record(route, elapsed, failed=isinstance(result, dict) and result.get('success') is False)
+        return result
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def think(self):
+        if self.think_time:
+            time.sleep(self.random.uniform(0, 2 * self.think_time))
+
+    def play(self, stop):
+        self.request('POST', '/api/init_game', {'starting_credits': 1000})
+        while not stop.is_set():
+            if not self.play_round():
+                # Stranded without fuel: start over like a player would
+                self.request('POST', '/api/init_game', {'starting_credits': 1000})
+        self.close()
+
+    def play_round(self):
+        """One mine -> travel -> trade -> shop loop; False when the commander is stranded"""
+        location = self.request('GET', '/api/location') or {}
+        status = self.request('GET', '/api/status') or {}
+        resources = list(location.get('resources', {}))
+        for _ in range(self.random.randint(3, 8)):
+            if not resources or status.get('cargo_used', 0) >= status.get('cargo_capacity', 0):
+                break
+            result = self.request('POST', '/api/mine', {'resource_type': self.random.choice(resources)})
+            self.think()
+            if not result or not result.get('success'):
+                break
+
+        destinations = self.request('GET', '/api/destinations') or []
+        reachable = [d for d in destinations if d['can_travel']]
+        if not reachable:
+            return False
+        markets = [d for d in reachable if d['has_outpost']] or reachable
+        self.request('POST', '/api/travel', {'destination_index': self.random.choice(markets)['index']})
+        self.think()
+
+        location = self.request('GET', '/api/location') or {}
+        if location.get('has_outpost'):
+            self.request('GET', '/api/outposts')
+            self.request('POST', '/api/trade', {'sell_all': True})
+            self.think()
+        if location.get('has_ship_shop'):
+            shop = self.request('GET', '/api/shop') or {}
+            affordable = [u for u in shop.get('upgrades', []) if u['affordable']]
+            if affordable:
+                upgrade = self.random.choice(affordable)
+                self.request('POST', '/api/shop/buy', {'item_type': 'upgrade', 'item_index': upgrade['index']})
+
+        destinations = self.request('GET', '/api/destinations') or []
+        fields = [d for d in destinations if d['can_travel'] and d['has_resources']]
+        if not fields:
+            return False
+        self.request('POST', '/api/travel', {'destination_index': self.random.choice(fields)['index']})
+        self.think()
+        return True
+
+
+def start_local_server(args):
+    """Serve the game in this process on a free port; returns (url, shutdown)"""
+    from game.web_handler import GameHTTPHandler, create_app
+    from game.web_server import create_server
+
+    class QuietHandler(GameHTTPHandler):
+        # Request logging to stderr would dominate the measurement
+        def log_message(self, format, *args):
+            pass
+
+    sessions, handler = create_app(args, handler_class=QuietHandler)
+    server = create_server(('127.0.0.1', 0), handler, args)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def shutdown():
+        server.shutdown()
+        sessions.close_streams()
+        server.server_close()
+
+    return f'http://127.0.0.1:{server.server_address[1]}', shutdown
+
+
+def run(url, commanders, duration, keep_alive=True, think_time=0.0, seed=None):
+    recorder = Recorder()
+    stop = threading.Event()
+    players = [Commander(url, recorder, keep_alive, think_time, seed=None if seed is None else seed + i)
+               for i in range(commanders)]
+    threads = [threading.Thread(target=player.play, args=(stop,), daemon=True) for player in players]
+
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    stop.wait(duration)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=35)
+    elapsed = time.perf_counter() - started
+
+    report = recorder.report(elapsed)
+    report['config'] = {'url': url, 'commanders': commanders, 'duration_s': round(elapsed, 3),
+                        'keep_alive': keep_alive, 'think_time_s': think_time}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test the Space Mining Empire web API')
+    parser.add_argument('--url', help='server to test (default: start one in this process)')
+    parser.add_argument('--commanders', type=int, default=20, help='concurrent simulated players (default 20)')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds to run (default 10)')
+    parser.add_argument('--think-time', type=float, default=0.0,
+                        help='average pause between a commander\'s actions, in seconds (default 0)')
+    parser.add_argument('--no-keep-alive', action='store_true', help='open a new connection per request')
+    parser.add_argument('--seed', type=int, help='seed commanders\' choices for repeatable runs')
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    from game.web_server import add_server_arguments
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    shutdown = None
+    url = args.url
+    if not url:
+        url, shutdown = start_local_server(args)
+    try:
+        report = run(url, args.commanders, args.duration, not args.no_keep_alive, args.think_time, args.seed)
+    finally:
+        if shutdown:
+            shutdown()
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    overall = report['overall']
+    print(f"{overall['requests']} requests, {overall['throughput_rps']:.0f} req/s, "
+          f"p99 {overall['p99_ms']:.1f} ms, error rate {overall['error_rate']:.2%}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
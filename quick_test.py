@@ -15,7 +15,7 @@ def test_server():
     print("Press Ctrl+C to stop the server")
     
     try:
-        main()
+        main([])
     except KeyboardInterrupt:
         print("\nServer stopped.")
 
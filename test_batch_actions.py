@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Test the batch action runner used by /api/batch
+"""
+
+from game.web_engine import GameWebEngine
+
+def test_batch_actions():
+    print("=== Testing Batch Actions ===")
+
+    engine = GameWebEngine()
+    engine.initialize_game(starting_credits=1000)
+
+    # Test 1: Mine repeatedly, travel to the station and sell everything
+    print("\n1. Testing Mine -> Travel -> Sell Batch:")
+    station_index = next(i for i, body in enumerate(engine.celestial_bodies) if body.name == "Frontier Station")
+    result = engine.run_batch([
+        {'action': 'mine', 'resource_type': 'Iron', 'repeat': 3},
+        {'action': 'travel', 'destination_index': station_index},
+        {'action': 'trade', 'sell_all': True}
+    ])
+    print(f"   {result['message']}")
+    for step in result['results']:
+        print(f"   [{step['index']}] {step['action']}: {step['message']}")
+    assert result['success']
+    assert result['completed'] == 5
+    assert engine.player.current_location.name == "Frontier Station"
+    assert not engine.player.current_ship.cargo
+    assert engine.player.credits > 1000
+
+    # Test 2: Stops at the first failure
+    print("\n2. Testing Stop-On-Failure:")
+    fuel_before = engine.player.current_ship.current_fuel
+    result = engine.run_batch([
+        {'action': 'mine', 'resource_type': 'Iron'},
+        {'action': 'travel', 'destination_index': 0}
+    ])
+    print(f"   {result['message']}")
+    assert not result['success']
+    assert result['stopped_at'] == 0
+    assert engine.player.current_ship.current_fuel == fuel_before
+
+    # Test 3: Malformed batches are rejected up front
+    print("\n3. Testing Validation:")
+    unknown = engine.run_batch([{'action': 'warp'}])
+    missing = engine.run_batch([{'action': 'mine'}])
+    too_big = engine.run_batch([{'action': 'mine', 'resource_type': 'Iron', 'repeat': engine.MAX_BATCH_STEPS + 1}])
+    print(f"   Unknown action: {unknown['message']}")
+    print(f"   Missing field: {missing['message']}")
+    print(f"   Too large: {too_big['message']}")
+    assert not unknown['success'] and not missing['success'] and not too_big['success']
+
+    print("\n=== Batch Action Tests Complete! ===")
+
+if __name__ == "__main__":
+    test_batch_actions()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Test the engine benchmark runner and regression check
+"""
+
+from benchmark_engine import BENCHMARKS, compare, run_benchmarks
+
+def test_benchmark_engine():
+    print("=== Testing Engine Benchmarks ===")
+
+    # Test 1: Every benchmark sets up and runs at its smallest scale
+    print("\n1. Testing Benchmark Setup:")
+    for bench in BENCHMARKS:
+        operation = bench['setup'](bench['scales'][0])
+        operation()
+    print(f"   {len(BENCHMARKS)} benchmarks ran")
+
+    # Test 2: A filtered run reports one result per scale
+    print("\n2. Testing Filtered Run:")
+    results = run_benchmarks('cargo_used', repeat=1, min_time=0.001)
+    print(f"   {sorted(results)}")
+    assert len(results) == 3
+    assert all(ns > 0 for ns in results.values())
+
+    # Test 3: Regressions beyond the threshold are flagged
+    print("\n3. Testing Regression Check:")
+    baseline = {'a': 100.0, 'b': 100.0, 'c': 100.0}
+    current = {'a': 130.0, 'b': 110.0, 'c': 50.0, 'new': 1.0}
+    regressions, improvements = compare(current, baseline, threshold=0.25)
+    print(f"   regressions: {regressions}, improvements: {improvements}")
+    assert [name for name, _, _ in regressions] == ['a']
+    assert [name for name, _, _ in improvements] == ['c']
+
+    print("\n=== Engine Benchmark Tests Complete! ===")
+
+if __name__ == "__main__":
+    test_benchmark_engine()
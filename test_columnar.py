@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Test the optional NumPy columnar world store
+"""
+
+from game.columnar import HAVE_NUMPY
+from game.galaxy import Galaxy
+from game.models import ResourceType
+from game.web_engine import GameWebEngine
+
+def play(engine):
+    for resource in list(engine.get_location_info()['resources']):
+        engine.mine_resource(resource)
+    engine.travel_to(1)
+    engine.trade_at_outpost(sell_all=True)
+    engine.refuel()
+    return engine.get_status(), engine.get_location_info(), engine.get_outposts(), engine.get_destinations()
+
+def test_columnar():
+    print("=== Testing Columnar World Store ===")
+    if not HAVE_NUMPY:
+        print("\nNumPy is not installed; skipping (pip install numpy)")
+        return
+
+    # Test 1: A columnar game plays exactly like a dict-backed one
+    print("\n1. Testing Same Game, Both Backends:")
+    plain, columnar = GameWebEngine(), GameWebEngine(columnar=True)
+    plain.initialize_game(seed=8)
+    columnar.initialize_game(seed=8)
+    assert play(columnar) == play(plain)
+    body = columnar.celestial_bodies[0]
+    assert type(body.resources).__name__ == 'ColumnView'
+    assert body == plain.celestial_bodies[0]
+    print(f"   Same results; Kepler-442b now holds {dict(body.resources)}")
+
+    # Test 2: Views keep dict semantics, including a key mapped to 0
+    print("\n2. Testing Dict Semantics:")
+    resources = body.resources
+    resources[ResourceType.GOLD] = 0
+    assert ResourceType.GOLD in resources and resources[ResourceType.GOLD] == 0
+    del resources[ResourceType.GOLD]
+    assert ResourceType.GOLD not in resources and resources.get(ResourceType.GOLD, 7) == 7
+    outpost = columnar.celestial_bodies[1].outpost
+    # play() sold iron here, which pushed that market down; gold was never sold
+    assert outpost.get_sell_price(ResourceType.IRON) == 2.5 * 1.2 * outpost.market_factors[ResourceType.IRON] < 2.5 * 1.2
+    assert outpost.get_sell_price(ResourceType.GOLD) == 16.0
+
+    # Test 3: Saves and journals see ordinary mappings
+    print("\n3. Testing Save/Load:")
+    restored = GameWebEngine(columnar=True)
+    restored.load_state(columnar.save_state())
+    assert restored.get_location_info() == columnar.get_location_info()
+    assert restored.world_store() is not columnar.world_store()
+
+    # Test 4: Galaxy-wide questions are single vectorized expressions
+    print("\n4. Testing Vectorized Queries:")
+    engine = GameWebEngine(columnar=True)
+    engine.initialize_game(seed=8)
+    engine.celestial_bodies.extend(Galaxy(seed=8).bodies_within((0.0, 0.0, 0.0), 120.0))
+    store = engine.world_store()
+    assert len(store.bodies) == len(engine.celestial_bodies)
+    totals = store.resource_totals()
+    assert totals[ResourceType.IRON] == sum(b.resources.get(ResourceType.IRON, 0) for b in engine.celestial_bodies)
+    best = store.best_sell_prices()
+    price, market = best[ResourceType.QUANTUM_CRYSTALS]
+    assert price == max(o.get_sell_price(ResourceType.QUANTUM_CRYSTALS) for o in store.outposts)
+    cargo = {ResourceType.IRON: 10, ResourceType.GOLD: 2}
+    values = store.cargo_values(cargo)
+    assert abs(values[3] - sum(n * store.outposts[3].get_sell_price(rt) for rt, n in cargo.items())) < 1e-9
+    for resource_type in list(engine.celestial_bodies[2].resources):
+        engine.celestial_bodies[2].resources[resource_type] = 0
+    assert engine.celestial_bodies[2] in store.depleted_bodies()
+    print(f"   {len(store.bodies)} bodies, {len(store.outposts)} outposts in {store.memory_bytes() / 1024:.0f} KiB; "
+          f"best crystal price {price:.1f} at {market.name}")
+
+    print("\n=== Columnar World Store Tests Complete! ===")
+
+if __name__ == "__main__":
+    test_columnar()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test the compact slotted models and their array-backed resource counts
+"""
+
+import tracemalloc
+
+from game.models import CelestialBody, Outpost, ResourceCounts, ResourceType, Ship
+from game.persistence import dump_game, load_game
+from game.sessions import estimate_size
+from game.web_engine import GameWebEngine
+
+def make_ship(cargo=None):
+    return Ship(name="Test Hauler", cargo_capacity=100, mining_efficiency=1.0, speed=1.0,
+                fuel_capacity=100, current_fuel=100, cargo=cargo or {})
+
+def allocated(factory, count=2000):
+    tracemalloc.start()
+    items = [factory() for _ in range(count)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size / len(items)
+
+def test_compact_models():
+    print("=== Testing Compact Models ===")
+
+    # Test 1: ResourceCounts behaves like the dict it replaces
+    print("\n1. Testing Dict Behaviour:")
+    counts = ResourceCounts({ResourceType.GOLD: 3, ResourceType.IRON: 0})
+    assert counts == {ResourceType.IRON: 0, ResourceType.GOLD: 3}
+    assert ResourceType.IRON in counts and ResourceType.COPPER not in counts and "Iron" not in counts
+    assert counts.get(ResourceType.COPPER, 7) == 7 and counts.get("Iron") is None
+    assert list(counts) == [ResourceType.IRON, ResourceType.GOLD]   # ResourceType order
+    assert dict(counts.items()) == {ResourceType.IRON: 0, ResourceType.GOLD: 3}
+    assert len(counts) == 2 and counts.total == 3
+    del counts[ResourceType.IRON]
+    assert len(counts) == 1 and counts != {}
+    try:
+        counts[ResourceType.IRON]
+        assert False, "missing resource should raise KeyError"
+    except KeyError:
+        pass
+    print(f"   {counts!r}")
+
+    # Test 2: cargo_used is a running total, whichever way the hold changes
+    print("\n2. Testing Running Cargo Total:")
+    ship = make_ship({ResourceType.IRON: 10})
+    assert isinstance(ship.cargo, ResourceCounts) and ship.cargo_used == 10
+    assert ship.add_cargo(ResourceType.GOLD, 200) == 90 and ship.cargo_used == 100 and ship.cargo_free == 0
+    assert ship.remove_cargo(ResourceType.IRON, 4) == 4 and ship.cargo_used == 96
+    assert ship.remove_cargo(ResourceType.GOLD, 500) == 90 and ResourceType.GOLD not in ship.cargo
+    ship.cargo[ResourceType.COPPER] = 5
+    ship.cargo.update({ResourceType.IRON: 1})
+    assert ship.cargo_used == 6 == sum(ship.cargo.values())
+    # A plain dict assigned later still works, it just sums
+    ship.cargo = {ResourceType.GOLD: 12}
+    assert ship.cargo_used == 12 and ship.add_cargo(ResourceType.GOLD, 3) == 3 and ship.cargo_used == 15
+    print(f"   {ship.cargo_used} units aboard")
+
+    # Test 3: Slotted models, with body resources compacted and columnar views left alone
+    print("\n3. Testing Slots:")
+    body = CelestialBody(name="Rock", distance_from_start=1.0, resources={ResourceType.IRON: 50})
+    outpost = Outpost(name="Post", outpost_type="trade_hub", resource_prices={ResourceType.IRON: 2.0})
+    for model in (ship, body, outpost):
+        assert not hasattr(model, '__dict__'), type(model).__name__
+    assert isinstance(body.resources, ResourceCounts)
+    mined = body.mine_resource(ResourceType.IRON, 20.0)
+    assert body.resources[ResourceType.IRON] == 50 - mined and body.resources.total == 50 - mined
+    view_body = CelestialBody(name="Viewed", distance_from_start=1.0, resources=body.resources)
+    assert view_body.resources is body.resources
+
+    # Test 4: Less memory than the dict-based layout
+    print("\n4. Testing Memory:")
+    cargo = {ResourceType.IRON: 300, ResourceType.GOLD: 400, ResourceType.TITANIUM: 500}
+    compact = allocated(lambda: ResourceCounts(cargo))
+    plain = allocated(lambda: dict(cargo))
+    print(f"   Three resources: {compact:.0f} bytes as ResourceCounts, {plain:.0f} as a dict")
+    assert compact < plain
+
+    # Test 5: Saves, replays and memory estimates see through the slots
+    print("\n5. Testing Persistence and Session Size:")
+    engine = GameWebEngine()
+    engine.initialize_game(seed=5)
+    engine.player.current_ship.add_cargo(ResourceType.TITANIUM, 7)
+    copy = load_game(GameWebEngine(), dump_game(engine))
+    copied = copy.player.current_ship
+    assert isinstance(copied.cargo, ResourceCounts) and copied.cargo == {ResourceType.TITANIUM: 7}
+    assert copied.cargo_used == 7
+    assert all(isinstance(b.resources, ResourceCounts) for b in copy.celestial_bodies)
+    assert estimate_size(make_ship()) > estimate_size(ResourceCounts()) > 0
+    print(f"   Engine estimate: {estimate_size(engine)} bytes")
+
+    print("\n=== Compact Model Tests Complete! ===")
+
+if __name__ == "__main__":
+    test_compact_models()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Test the procedural galaxy generator
+"""
+
+import time
+from game.galaxy import Galaxy
+from game.models import ResourceType, travel_fuel_cost
+from game.web_engine import GameWebEngine
+
+def describe(bodies):
+    return [(b.name, b.body_type, b.position, b.resources, b.outpost) for b in bodies]
+
+def test_galaxy():
+    print("=== Testing Galaxy Generator ===")
+
+    # Test 1: Sectors depend only on the seed, not on the order they are visited
+    print("\n1. Testing Determinism:")
+    forward, backward = Galaxy(seed=2024), Galaxy(seed=2024)
+    keys = [(x, y, 0) for x in range(4) for y in range(4)]
+    for key in keys:
+        forward.sector(key)
+    for key in reversed(keys):
+        backward.sector(key)
+    assert all(describe(forward.sector(key)) == describe(backward.sector(key)) for key in keys)
+    assert describe(Galaxy(seed=2025).sector((0, 0, 0))) != describe(forward.sector((0, 0, 0)))
+    print(f"   {sum(len(forward.sector(key)) for key in keys)} bodies identical across visit orders")
+
+    # Test 2: A million-body galaxy only pays for what is touched
+    print("\n2. Testing On-Demand Generation:")
+    galaxy = Galaxy(seed=7)
+    assert galaxy.expected_body_count >= 10 ** 6
+    started = time.perf_counter()
+    nearby = galaxy.bodies_within((1580.0, 1580.0, 0.0), 25.0)
+    elapsed = time.perf_counter() - started
+    stats = galaxy.stats()
+    print(f"   {len(nearby)} bodies within 25 units, {stats['loaded_sectors']} of {stats['sectors']} "
+          f"sectors generated in {elapsed * 1000:.1f} ms")
+    assert nearby and stats['loaded_sectors'] <= 36
+    assert all(body.distance_to(nearby[0]) <= 50.0 for body in nearby)
+    assert galaxy.bodies_within((-500.0, -500.0, 0.0), 10.0) == []
+
+    # Test 3: Bodies look like the rest of the game
+    print("\n3. Testing Generated Content:")
+    bodies = [body for x in range(10) for y in range(10) for body in galaxy.sector((x, y, 0))]
+    types = {body.body_type for body in bodies}
+    iron = sum(ResourceType.IRON in body.resources for body in bodies)
+    crystals = sum(ResourceType.QUANTUM_CRYSTALS in body.resources for body in bodies)
+    outposts = [body.outpost for body in bodies if body.has_outpost]
+    print(f"   {len(bodies)} bodies: types {sorted(types)}, iron on {iron}, crystals on {crystals}, "
+          f"{len(outposts)} outposts")
+    assert types == {"asteroid", "planet", "moon", "station"}
+    assert iron > crystals > 0
+    assert all(body.position[2] == 0.0 for body in bodies)
+    assert all(body.resources == {} for body in bodies if body.body_type == "station")
+    assert all(len(outpost.resource_prices) == len(ResourceType) for outpost in outposts)
+    assert all(outpost.get_sell_price(ResourceType.QUANTUM_CRYSTALS) > outpost.get_sell_price(ResourceType.IRON)
+               for outpost in outposts)
+
+    # Test 4: Galaxies can be 3D
+    print("\n4. Testing 3D Galaxies:")
+    deep = Galaxy(seed=1, sectors=(10, 10, 10))
+    assert not deep.flat
+    assert any(body.position[2] > 0 for body in deep.sector((0, 0, 3)))
+    assert len(deep.bodies_within((50.0, 50.0, 50.0), 12.0)) > 0
+    print(f"   {deep.stats()}")
+
+    # Test 5: Fuel costs use positions, and the starting system is unchanged
+    print("\n5. Testing Travel Costs:")
+    engine = GameWebEngine()
+    engine.initialize_game(seed=3)
+    costs = [d['fuel_cost'] for d in engine.get_destinations()]
+    assert costs == [15, 32, 68, 85], costs
+    a, b = nearby[0], nearby[1]
+    assert travel_fuel_cost(a, b) == int(a.distance_to(b) * 10)
+    restored = GameWebEngine()
+    engine.celestial_bodies.append(b)
+    restored.load_state(engine.save_state())
+    assert restored.celestial_bodies[-1].position == b.position
+    print(f"   Starting system costs {costs}; galaxy jump {a.name} -> {b.name} costs {travel_fuel_cost(a, b)}")
+
+    print("\n=== Galaxy Generator Tests Complete! ===")
+
+if __name__ == "__main__":
+    test_galaxy()
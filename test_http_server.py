@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Test what the web server exposes over HTTP
+"""
+
+import argparse
+import http.client
+import os
+import shutil
+import tempfile
+import threading
+import time
+from game.web_handler import GameHTTPHandler, create_app
+from game.web_server import add_server_arguments, create_server
+
+class QuietHandler(GameHTTPHandler):
+    def log_message(self, format, *args):
+        pass
+
+def serve(root, *argv):
+    parser = argparse.ArgumentParser()
+    add_server_arguments(parser)
+    args = parser.parse_args(list(argv))
+    sessions, handler = create_app(args, root, handler_class=QuietHandler)
+    server = create_server(('127.0.0.1', 0), handler, args)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def shutdown():
+        server.shutdown()
+        sessions.close()
+        server.server_close()
+
+    return server.server_address[1], sessions, shutdown
+
+def request(port, method, path, headers=None, timeout=5.0):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    connection.request(method, path, headers=dict(headers or {}, Connection='close'))
+    response = connection.getresponse()
+    body = response.read()
+    connection.close()
+    return response.status, body
+
+def test_http_server():
+    print("=== Testing HTTP Server ===")
+
+    with tempfile.TemporaryDirectory() as root:
+        shutil.copy('game.html', root)
+        journal_dir = os.path.join(root, 'journal')
+        state_file = os.path.join(root, 'sessions.bin')
+        port, sessions, shutdown = serve(root, '--journal-dir', journal_dir, '--state-file', state_file)
+        try:
+            # Test 1: The UI is served
+            print("\n1. Testing Static Assets:")
+            status, body = request(port, 'GET', '/')
+            assert status == 200 and b'<html' in body.lower()
+            status, body = request(port, 'GET', '/api/init_game')
+            assert status == 200
+
+            # Test 2: Journals and saves next to it are not
+            print("\n2. Testing Private Files:")
+            sessions.save_all()
+            sessions.journal.flush()
+            token = sessions.live()[0].token
+            with open(state_file, 'rb') as f:
+                assert token.encode() in f.read()
+            paths = ['/journal/', '/sessions.bin', '/game.html/..', '/test_http_server.py'] + \
+                    [f'/journal/{name}' for name in os.listdir(journal_dir)]
+            for path in paths:
+                for method in ('GET', 'HEAD'):
+                    status, body = request(port, method, path)
+                    assert status == 404 and token.encode() not in body, (method, path, status)
+            print(f"   {len(paths)} paths under the served directory refused")
+        finally:
+            shutdown()
+
+        # Test 3: Open event streams don't hold the workers other requests need
+        print("\n3. Testing Event Streams:")
+        port, sessions, shutdown = serve(root, '--workers', '2', '--max-streams', '3', '--tick-interval', '0')
+        streams = []
+        try:
+            for _ in range(3):
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5.0)
+                connection.request('GET', '/api/events')
+                response = connection.getresponse()
+                assert response.status == 200
+                streams.append(connection)
+            started = time.perf_counter()
+            for _ in range(4):
+                status, _ = request(port, 'GET', '/api/init_game')
+                assert status == 200
+            print(f"   3 streams open on 2 workers; 4 requests answered in "
+                  f"{(time.perf_counter() - started) * 1000:.0f} ms")
+            status, body = request(port, 'GET', '/api/events')
+            assert status == 503 and b'Too many event streams' in body
+            print("   A 4th stream over --max-streams gets a 503")
+        finally:
+            for connection in streams:
+                connection.close()
+            shutdown()
+
+    print("\n=== HTTP Server Tests Complete! ===")
+
+if __name__ == "__main__":
+    test_http_server()
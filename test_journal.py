@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Test the action journal, crash recovery and compaction
+"""
+
+import os
+import tempfile
+import threading
+import time
+from game.journal import Journal, encode_record, read_records
+from game.sessions import SessionManager
+
+def play(engine, rounds=3):
+    for _ in range(rounds):
+        for resource in list(engine.get_location_info()['resources'].keys()):
+            engine.mine_resource(resource)
+        outpost = next(d for d in engine.get_destinations() if d['has_outpost'] and d['can_travel'])
+        engine.travel_to(outpost['index'])
+        engine.trade_at_outpost(sell_all=True)
+        engine.buy_from_shop('upgrade', 2)
+        engine.travel_to(0)
+
+def views(engine):
+    return (engine.get_status(), engine.get_location_info(), engine.get_destinations(), engine.get_shop_data())
+
+def recovered(directory):
+    sessions = SessionManager()
+    journal = Journal(directory)
+    replayed = journal.recover(sessions)
+    return sessions, journal, replayed
+
+def test_journal():
+    print("=== Testing Journal ===")
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Test 1: Actions survive a crash once flushed
+        print("\n1. Testing Crash Recovery:")
+        sessions = SessionManager()
+        journal = Journal(directory, sync_interval=60)
+        journal.attach(sessions)
+        players = [sessions.create() for _ in range(3)]
+        for session in players:
+            session.engine.initialize_game(starting_credits=5000)
+            play(session.engine)
+        journal.flush()
+        # Simulate a crash mid-write: a torn record at the end of the log
+        log_path = journal._path('journal', journal.generation)
+        intact_size = os.path.getsize(log_path)
+        with open(log_path, 'ab') as f:
+            f.write(encode_record(players[0].token, 999, 'travel', (1,))[:-2])
+
+        restored, _, replayed = recovered(directory)
+        print(f"   Replayed {replayed} actions into {len(restored)} sessions")
+        assert len(restored) == 3
+        for session in players:
+            assert views(restored.get(session.token).engine) == views(session.engine)
+        # The live journal keeps appending to this log, so put it back the way it was
+        os.truncate(log_path, intact_size)
+
+        # Test 2: Unflushed actions are the only thing a crash can lose
+        print("\n2. Testing Batched Sync:")
+        before = views(players[1].engine)
+        players[1].engine.travel_to(2)
+        restored, _, _ = recovered(directory)
+        assert views(restored.get(players[1].token).engine) == before
+        journal.flush()
+        restored, _, _ = recovered(directory)
+        assert views(restored.get(players[1].token).engine) == views(players[1].engine)
+        print("   Unflushed action lost, flushed action recovered")
+
+        # Test 3: Compaction bounds what recovery replays
+        print("\n3. Testing Compaction:")
+        journal.compact()
+        play(players[2].engine, rounds=1)
+        journal.flush()
+        records = sum(1 for _ in read_records(journal._path('journal', journal.generation)))
+        files = sorted(os.listdir(directory))
+        print(f"   Files after compaction: {files}")
+        assert len(files) == 2
+        restored, _, replayed = recovered(directory)
+        print(f"   Replayed {replayed} of {records} records")
+        assert replayed == records
+        for session in players:
+            assert views(restored.get(session.token).engine) == views(session.engine)
+
+        # Test 4: Removed sessions stay removed
+        print("\n4. Testing Dropped Sessions:")
+        sessions.remove(players[0].token)
+        journal.flush()
+        restored, _, _ = recovered(directory)
+        assert restored.get(players[0].token) is None
+        assert len(restored) == 2
+        journal.close()
+
+        # Test 5: Recovery then attach starts a clean generation and keeps journaling
+        print("\n5. Testing Restart:")
+        restored, restored_journal, _ = recovered(directory)
+        restored_journal.attach(restored)
+        session = restored.get(players[1].token)
+        session.engine.travel_to(3)
+        restored_journal.close()
+        again, _, _ = recovered(directory)
+        assert views(again.get(players[1].token).engine) == views(session.engine)
+        print(f"   Generation {restored_journal.generation}, files: {sorted(os.listdir(directory))}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Test 6: The flusher compacts on its own once the log is big enough
+        print("\n6. Testing Background Compaction:")
+        sessions = SessionManager()
+        journal = Journal(directory, sync_interval=0.01, compact_bytes=512)
+        journal.attach(sessions)
+        session = sessions.create()
+        session.engine.initialize_game(starting_credits=5000)
+        deadline = time.monotonic() + 5
+        while journal.compactions < 2 and time.monotonic() < deadline:
+            with session.lock:
+                play(session.engine, rounds=1)
+            time.sleep(0.02)
+        journal.close()
+        print(f"   {journal.stats()}")
+        assert journal.compactions >= 2
+        restored, _, _ = recovered(directory)
+        assert views(restored.get(session.token).engine) == views(session.engine)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Test 7: Appending never waits for a flush's fsync
+        print("\n7. Testing Append During Fsync:")
+        sessions = SessionManager()
+        journal = Journal(directory, sync_interval=60)
+        journal.attach(sessions)
+        session = sessions.create()
+        session.engine.initialize_game(starting_credits=5000)
+        stalled = []
+        real_fsync = os.fsync
+
+        def slow_fsync(fd):
+            appender = threading.Thread(target=session.engine.travel_to, args=(1,))
+            appender.start()
+            appender.join(1.0)
+            stalled.append(appender.is_alive())
+            real_fsync(fd)
+
+        os.fsync = slow_fsync
+        try:
+            journal.flush()
+        finally:
+            os.fsync = real_fsync
+        journal.close()
+        print(f"   Action journaled mid-fsync without waiting: {stalled == [False]}")
+        assert stalled == [False]
+        restored, _, _ = recovered(directory)
+        assert views(restored.get(session.token).engine) == views(session.engine)
+
+    print("\n=== Journal Tests Complete! ===")
+
+if __name__ == "__main__":
+    test_journal()
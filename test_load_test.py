@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Smoke-test the load generator against an in-process server
+"""
+
+import http.client
+import urllib.parse
+from load_test import percentile, run, start_local_server
+
+def test_load_test():
+    print("=== Testing Load Generator ===")
+
+    # Test 1: Percentiles
+    print("\n1. Testing Percentiles:")
+    values = list(range(1, 101))
+    print(f"   p50={percentile(values, 0.5)} p99={percentile(values, 0.99)}")
+    assert percentile(values, 0.5) == 50
+    assert percentile(values, 0.99) == 99
+    assert percentile([], 0.5) == 0.0
+
+    url, shutdown = start_local_server(None)
+    try:
+        # Test 2: A short run plays the whole loop without errors
+        print("\n2. Testing Short Run:")
+        report = run(url, commanders=3, duration=1.0, seed=7)
+        overall = report['overall']
+        print(f"   {overall['requests']} requests, {overall['throughput_rps']:.0f} req/s, "
+              f"p99 {overall['p99_ms']:.1f} ms")
+        assert overall['requests'] > 0
+        assert overall['errors'] == 0
+        assert 'POST /api/mine' in report['routes']
+        assert 'POST /api/travel' in report['routes']
+
+        # Test 3: Connection: close is echoed so the client doesn't reuse the socket
+        print("\n3. Testing Connection Close:")
+        report = run(url, commanders=2, duration=0.5, keep_alive=False, seed=7)
+        print(f"   {report['overall']['requests']} requests, {report['overall']['errors']} errors")
+        assert report['overall']['errors'] == 0
+
+        parts = urllib.parse.urlsplit(url)
+        connection = http.client.HTTPConnection(parts.hostname, parts.port)
+        connection.request('GET', '/api/metrics', headers={'Connection': 'close'})
+        response = connection.getresponse()
+        response.read()
+        assert response.getheader('Connection') == 'close'
+        connection.close()
+    finally:
+        shutdown()
+
+    print("\n=== Load Generator Tests Complete! ===")
+
+if __name__ == "__main__":
+    test_load_test()
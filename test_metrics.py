@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Test latency histograms and the Prometheus metrics export
+"""
+
+from game.metrics import Histogram, MetricsRegistry, metrics_middleware, registry
+from game.routing import Request, Response, Router
+from game.web_engine import GameWebEngine
+
+def test_metrics():
+    print("=== Testing Metrics ===")
+
+    # Test 1: Quantiles are estimated from the buckets
+    print("\n1. Testing Histogram Quantiles:")
+    histogram = Histogram(buckets=(0.001, 0.01, 0.1, 1.0))
+    for _ in range(90):
+        histogram.observe(0.005)
+    for _ in range(10):
+        histogram.observe(0.5)
+    p50, p90, p99 = (histogram.quantile(q) for q in (0.5, 0.9, 0.99))
+    print(f"   p50={p50:.4f} p90={p90:.4f} p99={p99:.4f}")
+    assert 0.001 < p50 <= 0.01
+    assert p90 <= 0.01 + 1e-9
+    assert 0.1 < p99 <= 1.0
+    histogram.observe(60.0)
+    assert histogram.counts[-1] == 1
+
+    # Test 2: Engine methods are instrumented
+    print("\n2. Testing Engine Instrumentation:")
+    engine = GameWebEngine()
+    engine.initialize_game(starting_credits=1000)
+    before = registry.engine_method('mine_resource').requests
+    resource = list(engine.get_location_info()['resources'].keys())[0]
+    engine.mine_resource(resource)
+    print(f"   mine_resource calls: {before} -> {registry.engine_method('mine_resource').requests}")
+    assert registry.engine_method('mine_resource').requests == before + 1
+
+    # Test 3: Route middleware counts requests, errors and bytes
+    print("\n3. Testing Route Metrics:")
+    metrics = MetricsRegistry()
+    router = Router()
+    router.use(metrics_middleware(metrics))
+    router.get('/api/ok')(lambda request: {'success': True})
+    router.get('/api/bad')(lambda request: Response.json({'success': False}, status=400))
+    for path in ('/api/ok', '/api/ok', '/api/bad'):
+        router.dispatch(router.resolve('GET', path), Request('GET', path, {}, {}))
+    summary = metrics.summary()['routes']
+    print(f"   {summary['GET /api/ok']}")
+    assert summary['GET /api/ok']['requests'] == 2 and summary['GET /api/ok']['errors'] == 0
+    assert summary['GET /api/ok']['bytes_out'] == 2 * len(b'{"success": true}')
+    assert summary['GET /api/bad']['errors'] == 1
+
+    # Test 4: Prometheus text export
+    print("\n4. Testing Prometheus Export:")
+    text = metrics.render({'sme_sessions': 3})
+    for line in text.splitlines()[:4]:
+        print(f"   {line}")
+    assert 'sme_http_requests_total{method="GET",route="/api/ok"} 2' in text
+    assert 'sme_http_request_duration_seconds_bucket{method="GET",route="/api/ok",le="+Inf"} 2' in text
+    assert 'sme_http_request_duration_seconds_quantile{method="GET",route="/api/bad",quantile="0.99"}' in text
+    assert 'sme_sessions 3' in text
+
+    print("\n=== Metrics Tests Complete! ===")
+
+if __name__ == "__main__":
+    test_metrics()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Test multi-hop route planning and refuelling
+"""
+
+import heapq
+import math
+from game.galaxy import Galaxy
+from game.journal import decode_record, encode_record
+from game.models import FUEL_PER_DISTANCE, travel_fuel_cost
+from game.routing import Request
+from game.sessions import SessionManager
+from game.web_engine import GameWebEngine
+from game.web_handler import api
+
+def new_game(credits=1000):
+    engine = GameWebEngine()
+    engine.initialize_game(starting_credits=credits, seed=11)
+    return engine
+
+def route_cost(engine, path, time_weight=1.0):
+    unit_cost = FUEL_PER_DISTANCE + time_weight / engine.player.current_ship.speed
+    return sum(engine.celestial_bodies[a].distance_to(engine.celestial_bodies[b]) * unit_cost
+               for a, b in zip(path, path[1:]))
+
+def dijkstra_cost(engine, goal):
+    """Plain Dijkstra over every refuel point, for checking the planner"""
+    bodies = engine.celestial_bodies
+    ship = engine.player.current_ship
+    refuel = [i for i, body in enumerate(bodies) if body.has_outpost]
+    unit_cost = FUEL_PER_DISTANCE + 1.0 / ship.speed
+    best, frontier = {0: 0.0}, [(0.0, 0)]
+    while frontier:
+        cost, node = heapq.heappop(frontier)
+        if node == goal:
+            return cost
+        if cost > best[node]:
+            continue
+        limit = ship.current_fuel if node == 0 and not bodies[0].has_outpost else ship.fuel_capacity
+        for neighbor in refuel + [goal]:
+            jump = travel_fuel_cost(bodies[node], bodies[neighbor])
+            if neighbor != node and jump <= limit:
+                new_cost = cost + bodies[node].distance_to(bodies[neighbor]) * unit_cost
+                if new_cost < best.get(neighbor, math.inf):
+                    best[neighbor] = new_cost
+                    heapq.heappush(frontier, (new_cost, neighbor))
+    return None
+
+def test_navigation():
+    print("=== Testing Route Planner ===")
+
+    # Test 1: A direct jump when the tank allows it, a refuelling stop when it doesn't
+    print("\n1. Testing Starting System Routes:")
+    engine = new_game()
+    route = engine.plan_route(4)
+    assert route['jumps'] == 1 and route['total_fuel'] == 85
+    engine.player.current_ship.current_fuel = 20
+    route = engine.plan_route(4)
+    print(f"   {route['message']}: {[step['action'] for step in route['steps']]}")
+    assert [step['action'] for step in route['steps']] == ['travel', 'refuel', 'travel']
+    assert route['steps'][0]['name'] == 'Frontier Station'
+    assert route['fuel_spend'] == route['steps'][1]['amount'] * engine.FUEL_PRICE
+    result = engine.run_batch(route['steps'])
+    assert result['success'] and engine.player.current_location.name == 'Xerion Prime'
+
+    # Test 2: No route when no chain of refuel points bridges the gap
+    print("\n2. Testing Unreachable Destinations:")
+    engine = new_game()
+    engine.player.current_ship.fuel_capacity = 50
+    route = engine.plan_route(3)
+    assert not route['success'] and 'No route' in route['message']
+    assert not engine.plan_route(0)['success']
+    assert not engine.plan_route(99)['success']
+    print(f"   {route['message']}")
+
+    # Test 3: Long galaxy routes are optimal and can be flown as a batch
+    print("\n3. Testing Galaxy Routes:")
+    engine = new_game(credits=10 ** 6)
+    engine.celestial_bodies.extend(Galaxy(seed=11).bodies_within((0.0, 0.0, 0.0), 150.0))
+    engine.player.current_ship.fuel_capacity = 200
+    targets = sorted(range(len(engine.celestial_bodies)),
+                     key=lambda i: engine.celestial_bodies[i].distance_from_start)[-3:]
+    for target in targets:
+        route = engine.plan_route(target)
+        path = [0] + [step['destination_index'] for step in route['steps'] if step['action'] == 'travel']
+        assert math.isclose(route_cost(engine, path), dijkstra_cost(engine, target))
+        print(f"   {route['message']}")
+    assert all(step['fuel_cost'] <= 200 for step in route['steps'] if step['action'] == 'travel')
+    result = engine.run_batch(route['steps'])
+    assert result['success'] and engine.player.current_location is engine.celestial_bodies[targets[-1]]
+
+    # Test 4: Routes are cached until the map changes
+    print("\n4. Testing Route Cache:")
+    planner = engine.route_planner()
+    engine.plan_route(0)
+    engine.plan_route(0)
+    assert planner.stats()['hits'] == 1
+    engine.celestial_bodies.extend(Galaxy(seed=11).sector((20, 20, 0)))
+    assert engine.route_planner() is not planner
+    assert engine.route_planner().stats()['cached_routes'] == 0
+    print(f"   {planner.stats()} before the map grew")
+
+    # Test 5: Refuelling
+    print("\n5. Testing Refuel:")
+    engine = new_game()
+    ship = engine.player.current_ship
+    assert not engine.refuel()['success']  # Kepler-442b has no depot
+    engine.travel_to(1)
+    assert not engine.refuel(1000)['success']
+    result = engine.refuel(10)
+    assert result['success'] and ship.current_fuel == 95 and engine.player.credits == 980
+    assert engine.refuel()['success'] and ship.current_fuel == ship.fuel_capacity
+    assert not engine.refuel()['success']
+    record = encode_record('token', 7, 'refuel', (10,))
+    assert decode_record(record[8:]) == ('token', 7, 'refuel', (10,))
+    print(f"   Refuelled to {ship.current_fuel}, {engine.player.credits:.0f} credits left")
+
+    # Test 6: API routes
+    print("\n6. Testing /api/route and /api/refuel:")
+    session = SessionManager().create(engine=new_game())
+    session.engine.player.current_ship.current_fuel = 20
+    response = api.dispatch(api.resolve('GET', '/api/route'),
+                            Request('GET', '/api/route', {'destination_index': '4'}, {}, session=session))
+    assert response.status == 200 and b'"jumps": 2' in response.body
+    response = api.dispatch(api.resolve('POST', '/api/refuel'),
+                            Request('POST', '/api/refuel', {}, {}, b'{"amount": 5}', session=session))
+    assert b'"success": false' in response.body  # not at an outpost
+    print("   Route planned and refuel validated over the API")
+
+    print("\n=== Route Planner Tests Complete! ===")
+
+if __name__ == "__main__":
+    test_navigation()
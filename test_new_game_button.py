@@ -10,7 +10,8 @@ import threading
 import http.server
 import socketserver
 from game.web_engine import GameWebEngine
-from web_main import GameHTTPHandler, create_handler
+from game.sessions import SessionManager
+from game.web_handler import GameHTTPHandler, create_handler
 
 def test_new_game_api():
     print("=== Testing New Game Button API ===")
@@ -50,8 +51,7 @@ def start_test_server():
     print("http://localhost:8081")
     print("Check browser console for any JavaScript errors")
     
-    game_engine = GameWebEngine()
-    handler = create_handler(game_engine)
+    handler = create_handler(SessionManager())
     
     PORT = 8081
     with socketserver.TCPServer(("", PORT), handler) as httpd:
@@ -5,7 +5,7 @@ Test that demonstrates the New Game button fix
 
 import json
 from game.web_engine import GameWebEngine
-from web_main import GameHTTPHandler
+from game.web_handler import GameHTTPHandler
 
 def simulate_new_game_api_call():
     """Simulate the exact API call that the New Game button makes"""
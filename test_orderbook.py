@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Test the outpost order books: matching, bulk orders, player trading and its journal
+"""
+
+import json
+import tempfile
+
+from benchmark_orderbook import run
+from game.journal import Journal
+from game.models import ResourceType
+from game.orderbook import BUY, SELL, Exchange, Order, OrderBook
+from game.routing import Request
+from game.sessions import SessionManager
+from game.web_handler import api
+from game.world_generator import STARTING_MAP
+
+IRON = ResourceType.IRON
+GOLD = ResourceType.GOLD
+
+def order(order_id, side, price, quantity, owner='a'):
+    return Order(order_id, owner, 'Depot', IRON, side, price, quantity)
+
+def at_outpost(engine):
+    engine.player.current_location = next(body for body in engine.celestial_bodies if body.has_outpost)
+    return engine.player.current_location.outpost
+
+def traders(sessions, count=2):
+    players = []
+    for _ in range(count):
+        session = sessions.create()
+        session.engine.initialize_game(starting_credits=1000, seed=3)
+        at_outpost(session.engine)
+        players.append(session)
+    return players
+
+def call(session, method, path, body=None):
+    route = api.resolve(method, path)
+    data = json.dumps(body).encode('utf-8') if body is not None else b''
+    response = api.dispatch(route, Request(method, path, {}, {}, data, session=session))
+    return response, json.loads(response.body)
+
+def test_orderbook():
+    print("=== Testing Order Books ===")
+
+    # Test 1: Best price first, then oldest first, at the resting order's price
+    print("\n1. Testing Price-Time Priority:")
+    book = OrderBook()
+    fills = []
+    for resting in (order(1, SELL, 11.0, 5), order(2, SELL, 10.0, 5), order(3, SELL, 10.0, 5)):
+        book.submit(resting, fills)
+    assert not fills and book.best(SELL) == 10.0
+    book.submit(order(4, BUY, 10.5, 8, owner='b'), fills)
+    assert [(fill.sell_id, fill.price, fill.quantity) for fill in fills] == [(2, 10.0, 5), (3, 10.0, 3)]
+    assert book.depth(SELL) == [(10.0, 2), (11.0, 5)] and book.best(BUY) is None
+    print(f"   Bid for 8 filled {len(fills)} asks at 10.0, oldest first")
+
+    # Test 2: Partial fills leave the rest resting on the book
+    print("\n2. Testing Partial Fills:")
+    fills = []
+    bid = order(5, BUY, 10.8, 10, owner='b')
+    book.submit(bid, fills)
+    assert sum(fill.quantity for fill in fills) == 2 and bid.quantity == 8 and bid.filled == 2
+    assert book.best(BUY) == 10.8 and book.best(SELL) == 11.0 and book.live == 2
+    print(f"   Took the last 2 at 10.0, 8 left bidding at {book.best(BUY)}")
+
+    # Test 3: Cancels are lazy, and the heaps get compacted
+    print("\n3. Testing Cancellation:")
+    book = OrderBook()
+    resting = [order(index, BUY, 5.0 + index % 7, 1) for index in range(500)]
+    for bid in resting:
+        book.submit(bid, [])
+    for bid in resting[:450]:
+        assert book.cancel(bid) == 1
+    assert book.cancel(resting[0]) == 0 and book.live == 50
+    assert len(book.bids) <= 2 * book.live + 64
+    compacted = len(book.bids)
+    fills = []
+    book.submit(order(999, SELL, 0.1, 100), fills)
+    assert [fill.buy_id for fill in fills] == sorted((bid.id for bid in resting[450:]), key=lambda i: (-(5.0 + i % 7), i))
+    print(f"   450 cancelled, heap compacted to {compacted} entries, the 50 left filled in priority order")
+
+    # Test 4: The exchange settles into proceeds, refunding buyers who bid above the trade price
+    print("\n4. Testing Exchange Settlement:")
+    exchange = Exchange()
+    placed, fills = exchange.submit_many('seller', 'Depot', [(SELL, IRON, 10.0, 30), (SELL, IRON, 12.0, 10)])
+    assert not fills and len(exchange.open_orders('seller')) == 2
+    placed, fills = exchange.submit_many('buyer', 'Depot', [(BUY, IRON, 15.0, 35)])
+    assert exchange.waiting('seller') == (30 * 10.0 + 5 * 12.0, {})
+    # Paid 15 a unit up front, traded at 10 and 12
+    assert exchange.waiting('buyer') == (30 * 5.0 + 5 * 3.0, {IRON: 35})
+    assert exchange.collect('buyer', room=20) == (165.0, {IRON: 20})
+    assert exchange.waiting('buyer') == (0.0, {IRON: 15})
+    cancelled = exchange.cancel_many('seller')
+    assert [(o.id, remaining) for o, remaining in cancelled] == [(2, 5)]
+    assert exchange.waiting('seller') == (360.0, {IRON: 5}) and exchange.stats()['open_orders'] == 0
+    print(f"   {exchange.stats()['trades']} trades settled; goods beyond the hold keep waiting")
+
+    # Test 5: Players trade across sessions, with orders paid for up front
+    print("\n5. Testing Player Trading:")
+    sessions = SessionManager()
+    seller, buyer = traders(sessions)
+    seller.engine.player.current_ship.add_cargo(IRON, 20)
+    result = seller.engine.place_orders([
+        {'side': 'sell', 'resource_type': 'Iron', 'quantity': 20, 'price': 8},
+        {'side': 'sell', 'resource_type': 'Iron', 'quantity': 5, 'price': 8},
+        {'side': 'buy', 'resource_type': 'Unobtainium', 'quantity': 1, 'price': 1},
+        {'side': 'buy', 'resource_type': 'Gold', 'quantity': 1, 'price': 10 ** 6}])
+    assert result['success'] and len(result['orders']) == 1
+    assert [rejection['index'] for rejection in result['rejected']] == [1, 2, 3]
+    assert IRON not in seller.engine.player.current_ship.cargo
+    result = buyer.engine.place_orders([{'side': 'buy', 'resource_type': 'Iron', 'quantity': 12, 'price': 9}])
+    assert result['trades'] == 1 and result['collected'] == {'credits': 12.0, 'goods': {'Iron': 12}}
+    assert buyer.engine.player.credits == 1000 - 12 * 8
+    assert seller.engine.get_orders()['waiting']['credits'] == 12 * 8.0
+    assert seller.engine.collect_orders()['success'] and seller.engine.player.credits == 1000 + 12 * 8
+    result = seller.engine.cancel_orders()
+    assert result['cancelled'][0]['remaining'] == 8 and seller.engine.player.current_ship.cargo[IRON] == 8
+    print("   12 Iron changed hands at 8; the seller got 8 back on cancelling")
+
+    # Test 6: The books are journaled with the games, so recovery rebuilds open orders and their escrow
+    print("\n6. Testing Journal Recovery:")
+    with tempfile.TemporaryDirectory() as directory:
+        sessions = SessionManager()
+        journal = Journal(directory)
+        journal.attach(sessions)
+        seller, buyer = sessions.create(), sessions.create()
+        for session in (seller, buyer):
+            # Only journaled moves, so the recovered games end up in the same place
+            session.engine.initialize_game(starting_credits=1000, seed=3)
+            outpost = next(index for index, body in enumerate(session.engine.celestial_bodies) if body.has_outpost)
+        ore = next(iter(seller.engine.player.current_location.resources))
+        for _ in range(5):
+            seller.engine.mine_resource(ore.value)
+        amount = seller.engine.player.current_ship.cargo[ore]
+        for session in (seller, buyer):
+            session.engine.travel_to(outpost)
+        seller.engine.place_orders([{'side': 'sell', 'resource_type': ore.value, 'quantity': amount, 'price': 4}])
+        # Half the changes land in the snapshot, the rest are replayed from the log
+        journal.compact()
+        buyer.engine.place_orders([{'side': 'buy', 'resource_type': ore.value, 'quantity': amount + 3, 'price': 6}])
+        seller.engine.collect_orders()
+        journal.flush()
+        restored = SessionManager()
+        Journal(directory).recover(restored)
+        for session in (seller, buyer):
+            engine = restored.get(session.token).engine
+            assert engine.player.credits == session.engine.player.credits
+            assert dict(engine.player.current_ship.cargo) == dict(session.engine.player.current_ship.cargo)
+        assert [(o.id, o.quantity, o.filled) for o in restored.exchange.open_orders(buyer.token)] == \
+            [(o.id, o.quantity, o.filled) for o in sessions.exchange.open_orders(buyer.token)]
+        # The bid still resting at the crash is refunded in full after it
+        result = restored.get(buyer.token).engine.cancel_orders()
+        assert result['cancelled'][0]['remaining'] == 3 and result['collected']['credits'] == 3 * 6
+        journal.close()
+    assert buyer.engine.player.current_ship.cargo[ore] == amount and seller.engine.player.credits == 1000 + 4 * amount
+    print("   Both games, and the bid for 3 left resting, came back after the crash")
+
+    # Test 7: Restarts keep the books; players are settled before they go
+    print("\n7. Testing Restart and Eviction:")
+    with tempfile.TemporaryDirectory() as directory:
+        path = f"{directory}/sessions.bin"
+        sessions = SessionManager(state_file=path)
+        seller, buyer = traders(sessions)
+        buyer.engine.place_orders([{'side': 'buy', 'resource_type': 'Gold', 'quantity': 4, 'price': 50}])
+        assert buyer.engine.player.credits == 800
+        sessions.close()
+        restarted = SessionManager()
+        assert restarted.load_all(path) == 2
+        assert [(o.resource_type, o.quantity) for o in restarted.exchange.open_orders(buyer.token)] == [(GOLD, 4)]
+        assert restarted.get(buyer.token).engine.player.credits == 800
+    sessions = SessionManager(capacity=2)
+    seller, buyer = traders(sessions)
+    seller.engine.player.current_ship.add_cargo(GOLD, 4)
+    seller.engine.place_orders([{'side': 'sell', 'resource_type': 'Gold', 'quantity': 4, 'price': 40}])
+    buyer.engine.place_orders([{'side': 'buy', 'resource_type': 'Gold', 'quantity': 1, 'price': 40}])
+    # Evicting the seller settles the sale and the unsold goods into its game first
+    sessions.get(buyer.token)
+    sessions.create()
+    assert sessions.get(seller.token) is None
+    assert seller.engine.player.credits == 1040 and seller.engine.player.current_ship.cargo[GOLD] == 3
+    assert sessions.exchange.waiting(seller.token) == (0.0, {}) and not sessions.exchange.open_orders(seller.token)
+    buyer.engine.player.current_ship.cargo_capacity = buyer.engine.player.current_ship.cargo_used
+    buyer.engine.place_orders([{'side': 'buy', 'resource_type': 'Gold', 'quantity': 2, 'price': 5}])
+    sessions.remove(buyer.token)
+    assert buyer.engine.player.credits == 1000 - 40 and buyer.token not in sessions.exchange.owned
+    print("   Open orders survive a restart; evicted and dropped players are paid out first")
+
+    # Test 8: Games share books only when they are on the same map
+    print("\n8. Testing Shared Markets:")
+    sessions = SessionManager()
+    first, second = sessions.create(), sessions.create()
+    first.engine.initialize_game(seed=1)
+    second.engine.initialize_game(seed=99)
+    layout = [[(index, body.name, body.distance_from_start, body.outpost.name, dict(body.outpost.resource_prices))
+               for index, body in enumerate(session.engine.celestial_bodies) if body.outpost]
+              for session in (first, second)]
+    # The starting system only draws deposit sizes, so every seed lays out the same outposts
+    assert layout[0] == layout[1] and first.engine.map_id == second.engine.map_id == STARTING_MAP
+    for session in (first, second):
+        at_outpost(session.engine)
+    first.engine.place_orders([{'side': 'buy', 'resource_type': 'Iron', 'quantity': 1, 'price': 2}])
+    assert second.engine.get_orders()['books']['Iron']['bids'] == [(2.0, 1)]
+    second.engine.map_id = 'elsewhere'
+    assert second.engine.get_orders()['books'] == {}
+    print(f"   Seeds 1 and 99 trade at {first.engine.get_orders()['market']}; another map has its own books")
+
+    # Test 9: API routes
+    print("\n9. Testing /api/orders:")
+    session, = traders(SessionManager(), 1)
+    response, body = call(session, 'POST', '/api/orders',
+                          {'orders': [{'side': 'buy', 'resource_type': 'Iron', 'quantity': 2, 'price': 3}]})
+    assert response.status == 200 and body['success']
+    response, body = call(session, 'GET', '/api/orders')
+    assert response.status == 200 and body['books']['Iron']['bids'] == [[3.0, 2]] and len(body['orders']) == 1
+    response, body = call(session, 'POST', '/api/orders/cancel', {})
+    assert response.status == 200 and body['cancelled'][0]['remaining'] == 2
+    response, body = call(session, 'POST', '/api/orders', {'orders': 'nope'})
+    assert response.status == 400
+    print("   Place, list and cancel all served")
+
+    # Test 10: Throughput benchmark
+    print("\n10. Testing Throughput Benchmark:")
+    report = run(operations=20000, batch=50, seed=2)
+    assert report['operations'] == 20000 and report['trades'] > 0
+    assert report['operations_per_second'] > 10000
+    print(f"   {report['operations_per_second']:.0f} order operations/s, {report['trades']} trades")
+
+    print("\n=== Order Book Tests Complete! ===")
+
+if __name__ == "__main__":
+    test_orderbook()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Test the binary save format and session persistence
+"""
+
+import os
+import tempfile
+import time
+from game.models import CelestialBody, Outpost, ResourceType
+from game.persistence import SaveFormatError, dump_game, load_game
+from game.sessions import SessionManager
+from game.web_engine import GameWebEngine
+
+def played_engine():
+    engine = GameWebEngine()
+    engine.initialize_game(starting_credits=25000)
+    resource = list(engine.get_location_info()['resources'].keys())[0]
+    engine.mine_resource(resource)
+    engine.buy_from_shop('ship', 0)
+    # Mine something out completely: a resource left at 0 must survive the round trip
+    engine.celestial_bodies[1].resources[ResourceType.GOLD] = 0
+    return engine
+
+def test_persistence():
+    print("=== Testing Persistence ===")
+
+    # Test 1: Round trip preserves every view
+    print("\n1. Testing Round Trip:")
+    engine = played_engine()
+    data = engine.save_state()
+    restored = GameWebEngine()
+    restored.load_state(data)
+    print(f"   Save size: {len(data)} bytes")
+    assert restored.get_status() == engine.get_status()
+    assert restored.get_location_info() == engine.get_location_info()
+    assert restored.get_destinations() == engine.get_destinations()
+    assert restored.get_shop_data() == engine.get_shop_data()
+    assert restored.celestial_bodies[1].resources == engine.celestial_bodies[1].resources
+    assert len(restored.player.ships) == 2
+    assert restored.player.current_location is restored.celestial_bodies[0]
+    assert restored.player.current_ship is restored.player.ships[0]
+
+    # Test 2: Outpost references point into the restored world
+    print("\n2. Testing Outpost References:")
+    for original, body in zip(engine.celestial_bodies, restored.celestial_bodies):
+        assert (body.outpost is None) == (original.outpost is None)
+        if body.outpost:
+            assert body.outpost == original.outpost and body.outpost is not original.outpost
+    shared = GameWebEngine()
+    shared.initialize_game()
+    outpost_bodies = [b for b in shared.celestial_bodies if b.outpost]
+    outpost_bodies[1].outpost = outpost_bodies[0].outpost
+    shared.outposts = [outpost_bodies[0].outpost, outpost_bodies[1]]
+    copy = load_game(GameWebEngine(), dump_game(shared))
+    copy_bodies = [b for b in copy.celestial_bodies if b.outpost]
+    assert copy_bodies[1].outpost is copy_bodies[0].outpost
+    assert copy.outposts[0] is copy_bodies[0].outpost and copy.outposts[1] is copy_bodies[1]
+    print(f"   Shared outpost kept shared: {copy_bodies[0].outpost.name}")
+
+    # Test 3: Restored games keep playing
+    print("\n3. Testing Play After Load:")
+    result = restored.travel_to(1)
+    print(f"   {result['message']}")
+    assert result['success']
+
+    # Test 4: Corrupt data is rejected
+    print("\n4. Testing Invalid Data:")
+    for bad in (b'nope', data[:-3], b'XXXX' + data[4:], data + b'\0'):
+        try:
+            GameWebEngine().load_state(bad)
+            assert False, "corrupt save accepted"
+        except SaveFormatError as e:
+            print(f"   Rejected: {e}")
+
+    # Test 5: Thousands of sessions save and restore quickly
+    print("\n5. Testing Session Manager Save/Load:")
+    sessions = SessionManager(capacity=3000)
+    for _ in range(2000):
+        sessions.create().engine.initialize_game()
+    fresh_token = sessions.create().token
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'sessions.bin')
+        started = time.perf_counter()
+        count = sessions.save_all(path)
+        elapsed = time.perf_counter() - started
+        print(f"   Saved {count} sessions ({os.path.getsize(path)} bytes) in {elapsed * 1000:.0f} ms")
+        assert count == 2001
+
+        reloaded = SessionManager(capacity=3000)
+        assert reloaded.load_all(path) == 2001
+        token = next(iter(sessions.sessions))
+        assert reloaded.get(token).engine.get_status() == sessions.get(token).engine.get_status()
+        # Saved in LRU order, so the restored registry evicts in the same order
+        assert list(reloaded.sessions)[:-1] == list(sessions.sessions)[:-1]
+        assert not reloaded.get(fresh_token).engine.is_initialized()
+
+    # Test 6: Maps past the old 16-bit counts and references round trip
+    print("\n6. Testing Large Maps:")
+    big = GameWebEngine()
+    big.initialize_game()
+    for index in range(0x10001):
+        big.celestial_bodies.append(CelestialBody(
+            name=f'Rock {index}', distance_from_start=float(index), resources={ResourceType.IRON: index},
+            has_outpost=True, outpost=Outpost(f'Post {index}', 'mining_station', {ResourceType.IRON: 1.0})))
+    far = big.celestial_bodies[-1]
+    big.player.current_location = far
+    # A body reference at an index that used to collide with the body flag
+    big.outposts.append(big.celestial_bodies[0x8001])
+    started = time.perf_counter()
+    data = big.save_state()
+    elapsed = time.perf_counter() - started
+    copy = load_game(GameWebEngine(), data)
+    print(f"   {len(copy.celestial_bodies)} bodies saved in {elapsed * 1000:.0f} ms ({len(data)} bytes)")
+    assert len(copy.celestial_bodies) == len(big.celestial_bodies)
+    assert copy.player.current_location is copy.celestial_bodies[-1]
+    assert copy.player.current_location.outpost.name == far.outpost.name
+    assert copy.outposts[-1] is copy.celestial_bodies[0x8001]
+    assert copy.celestial_bodies[-1].resources == far.resources
+
+    print("\n=== Persistence Tests Complete! ===")
+
+if __name__ == "__main__":
+    test_persistence()
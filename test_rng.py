@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Test per-game seeded random streams
+"""
+
+import threading
+from game.persistence import FORMAT_VERSION, HEADER, RNG, SaveFormatError, load_game
+from game.rng import GameRandom
+from game.web_engine import GameWebEngine
+
+def play(engine, steps=40):
+    """Mine every resource in turn, recording every outcome"""
+    outcomes = []
+    for step in range(steps):
+        resources = list(engine.get_location_info()['resources'])
+        if not resources:
+            break
+        outcomes.append(engine.mine_resource(resources[step % len(resources)])['message'])
+        if engine.get_status()['cargo_used'] >= 45:
+            engine.player.current_ship.cargo.clear()
+    return outcomes, engine.save_state()
+
+def new_game(seed):
+    engine = GameWebEngine()
+    engine.initialize_game(starting_credits=1000, seed=seed)
+    return engine
+
+def test_rng():
+    print("=== Testing Seeded Random Streams ===")
+
+    # Test 1: The stream is a pure function of (seed, counter)
+    print("\n1. Testing GameRandom:")
+    a, b = GameRandom(42), GameRandom(42)
+    draws = [a.randint(1, 6) for _ in range(1000)]
+    assert draws == [b.randint(1, 6) for _ in range(1000)]
+    assert set(draws) == {1, 2, 3, 4, 5, 6}
+    resumed = GameRandom(42, counter=500)
+    assert [resumed.randint(1, 6) for _ in range(500)] == draws[500:]
+    floats = [a.uniform(5.0, 15.0) for _ in range(1000)]
+    assert all(5.0 <= x < 15.0 for x in floats)
+    assert GameRandom(42).random() != GameRandom(43).random()
+    assert GameRandom(42).spawn(1).random() != GameRandom(42).spawn(2).random()
+    print(f"   {a}, mean roll {sum(draws) / len(draws):.2f}")
+
+    # Test 2: Same seed and actions give bit-identical games
+    print("\n2. Testing Reproducible Games:")
+    first, second = play(new_game(1234)), play(new_game(1234))
+    assert first == second
+    different = play(new_game(4321))
+    assert different[1] != first[1]
+    print(f"   {len(first[0])} mining results and a {len(first[1])} byte save match")
+
+    # Test 3: Concurrent games don't disturb each other's streams
+    print("\n3. Testing Independent Sessions:")
+    results = {}
+
+    def run(seed):
+        results[seed] = play(new_game(seed), steps=200)
+
+    threads = [threading.Thread(target=run, args=(seed,)) for seed in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for seed in range(8):
+        assert results[seed] == play(new_game(seed), steps=200)
+    print("   8 games played in parallel match the same games played alone")
+
+    # Test 4: A restored game continues with the draws it would have had
+    print("\n4. Testing Save/Restore Mid-Stream:")
+    original = new_game(99)
+    play(original, steps=10)
+    restored = GameWebEngine()
+    restored.load_state(original.save_state())
+    assert (restored.rng.seed, restored.rng.counter) == (original.rng.seed, original.rng.counter)
+    resumed_at = restored.rng.counter
+    assert play(restored)[0] == play(original)[0]
+    assert restored.get_status() == original.get_status()
+    assert restored.get_location_info() == original.get_location_info()
+    print(f"   Resumed at draw {resumed_at}, both games now at draw {restored.rng.counter}")
+
+    # Test 5: Saves without a random stream keep the engine's own; other format versions are refused
+    print("\n5. Testing Saves Without a Stream:")
+    engine = GameWebEngine()
+    stream = engine.rng
+    magic, _, flags, turn, credits, version = HEADER.unpack_from(engine.save_state())
+    load_game(engine, HEADER.pack(magic, FORMAT_VERSION, 0, turn, credits, version) + RNG.pack(0, 0))
+    assert engine.rng is stream and not engine.is_initialized()
+    try:
+        load_game(engine, HEADER.pack(magic, FORMAT_VERSION + 1, 0, turn, credits, version) + RNG.pack(0, 0))
+        assert False, "unknown format version accepted"
+    except SaveFormatError as e:
+        print(f"   Save without a stream loaded, keeping the engine's own; {e}")
+
+    print("\n=== Seeded Random Stream Tests Complete! ===")
+
+if __name__ == "__main__":
+    test_rng()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Test the route table, request validation and middleware
+"""
+
+import gzip
+import json
+from game.routing import Router, Request, Response, Field, etag_matches, gzip_middleware, token_auth_middleware
+from game.sessions import SessionManager
+from game.web_handler import api
+
+def make_request(session, method, path, body=None, headers=None):
+    data = json.dumps(body).encode('utf-8') if body is not None else b''
+    return Request(method, path, {}, headers or {}, data, session=session)
+
+def call(router, session, method, path, body=None, headers=None):
+    route = router.resolve(method, path)
+    response = router.dispatch(route, make_request(session, method, path, body, headers))
+    payload = response.body
+    if response.headers.get('Content-Encoding') == 'gzip':
+        payload = gzip.decompress(payload)
+    return response, json.loads(payload) if payload else None
+
+def test_routing():
+    print("=== Testing Routing ===")
+
+    session = SessionManager().create()
+
+    # Test 1: Routes resolve by method and path
+    print("\n1. Testing Route Table:")
+    print(f"   Routes: {len(api.routes)}")
+    assert api.resolve('POST', '/api/mine').name == 'mine'
+    assert api.resolve('GET', '/api/mine') is None
+    assert api.allowed_methods('/api/mine') == ['POST']
+    assert api.resolve('GET', '/api/snapshot').requires_game
+
+    # Test 2: Game routes refuse to run before a game exists
+    print("\n2. Testing Uninitialized Game:")
+    response, data = call(api, session, 'GET', '/api/status')
+    print(f"   {data}")
+    assert data['error'] == 'Game not initialized'
+
+    # Test 3: Bodies are validated against the route schema
+    print("\n3. Testing Validation:")
+    response, data = call(api, session, 'POST', '/api/init_game', {})
+    print(f"   Init: {data['message']}")
+    assert data['success']
+    for body, expected in (({}, 'Missing field: destination_index'),
+                           ({'destination_index': 'far'}, 'destination_index must be an integer'),
+                           ({'destination_index': True}, 'destination_index must be an integer')):
+        response, data = call(api, session, 'POST', '/api/travel', body)
+        print(f"   {body} -> {response.status} {data['message']}")
+        assert response.status == 400 and data['message'] == expected
+    route = api.resolve('POST', '/api/travel')
+    response = api.dispatch(route, Request('POST', '/api/travel', {}, {}, b'{not json', session=session))
+    assert response.status == 400
+
+    # Test 4: Snapshot is attached on request
+    print("\n4. Testing Inline Snapshot:")
+    resource = list(session.engine.get_location_info()['resources'].keys())[0]
+    response, data = call(api, session, 'POST', '/api/mine', {'resource_type': resource, 'snapshot': True})
+    print(f"   {data['message']}, snapshot views: {list(data['snapshot'].keys())}")
+    assert data['success'] and data['snapshot']['status'] == session.engine.get_status()
+
+    # Test 5: Cached views answer 304 for a current ETag
+    print("\n5. Testing Conditional GET:")
+    response, _ = call(api, session, 'GET', '/api/status')
+    etag = response.headers['ETag']
+    response, _ = call(api, session, 'GET', '/api/status', headers={'If-None-Match': etag})
+    print(f"   ETag {etag} -> {response.status}")
+    assert response.status == 304
+    assert etag_matches(etag[:-1] + '-gz"', etag)
+
+    # Test 6: Middleware
+    print("\n6. Testing Middleware:")
+    response, data = call(api, session, 'GET', '/api/snapshot', headers={'Accept-Encoding': 'gzip'})
+    print(f"   Snapshot: {response.headers.get('Content-Encoding')}, {response.headers['Server-Timing']}")
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['ETag'].endswith('-gz"')
+    assert 'status' in data
+
+    secured = api.with_middleware(token_auth_middleware('secret'))
+    response, _ = call(secured, session, 'GET', '/api/status')
+    assert response.status == 401
+    response, _ = call(secured, session, 'GET', '/api/status', headers={'Authorization': 'Bearer secret'})
+    assert response.status == 200
+
+    router = Router()
+    router.use(gzip_middleware(min_size=10))
+    router.get('/api/echo', query={'count': Field(int)})(lambda request: {'count': request.params['count']})
+    route = router.resolve('GET', '/api/echo')
+    response = router.dispatch(route, Request('GET', '/api/echo', {'count': '3'}, {}))
+    assert isinstance(response, Response) and json.loads(response.body) == {'count': 3}
+
+    # Test 7: Metrics see every request, auth runs next, and only then is a session made
+    print("\n7. Testing Middleware Order:")
+    order = []
+    def recorder(name, refuse=False):
+        def middleware(request, call_next):
+            order.append(name)
+            return Response.json({}, status=401) if refuse else call_next(request)
+        return middleware
+    def resolve(request):
+        order.append('session')
+        return session
+    base = Router()
+    base.use(recorder('metrics'))
+    base.session_resolver = resolve
+    base.get('/api/ping')(lambda request: order.append('handler') or {'success': True})
+    route = base.resolve('GET', '/api/ping')
+    base.with_middleware(recorder('auth')).dispatch(route, Request('GET', '/api/ping', {}, {}))
+    print(f"   Chain: {' -> '.join(order)}")
+    assert order == ['metrics', 'auth', 'session', 'handler']
+    order.clear()
+    response = base.with_middleware(recorder('auth', refuse=True)).dispatch(route, Request('GET', '/api/ping', {}, {}))
+    assert response.status == 401 and order == ['metrics', 'auth']
+    class Caller:
+        resolved = 0
+        def resolve_session(self):
+            self.resolved += 1
+            return session
+    caller = Caller()
+    secured = api.with_middleware(token_auth_middleware('secret'))
+    status = secured.resolve('GET', '/api/status')
+    assert secured.dispatch(status, Request('GET', '/api/status', {}, {}, handler=caller)).status == 401
+    assert caller.resolved == 0
+    headers = {'Authorization': 'Bearer secret'}
+    assert secured.dispatch(status, Request('GET', '/api/status', {}, headers, handler=caller)).status == 200
+    assert caller.resolved == 1
+
+    # Test 8: gzip is only used when the client gives it a quality above 0
+    print("\n8. Testing Accept-Encoding Quality:")
+    body_route = router.resolve('GET', '/api/echo')
+    for header, compressed in (('gzip', True), ('gzip;q=0', False), ('gzip; q=0.5', True),
+                               ('identity, *;q=0', False), ('*', True), ('*;q=0, gzip', True),
+                               ('gzip;q=0, *', False), ('br', False), ('', False)):
+        response = router.dispatch(body_route, Request('GET', '/api/echo', {'count': '1234567890'},
+                                                       {'Accept-Encoding': header}))
+        assert (response.headers.get('Content-Encoding') == 'gzip') == compressed, header
+    print("   q=0 and '*;q=0' refuse gzip; an explicit gzip entry wins over '*'")
+
+    print("\n=== Routing Tests Complete! ===")
+
+if __name__ == "__main__":
+    test_routing()
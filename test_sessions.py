@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Test the per-player session registry
+"""
+
+from game.sessions import SessionManager
+
+def test_session_registry():
+    print("=== Testing Session Registry ===")
+
+    # Test 1: Each token gets its own engine
+    print("\n1. Testing Session Isolation:")
+    sessions = SessionManager(capacity=3)
+    alice, created = sessions.get_or_create(None)
+    bob, _ = sessions.get_or_create(None)
+    print(f"   New session created: {created}")
+    alice.engine.initialize_game(starting_credits=500)
+    bob.engine.initialize_game(starting_credits=9000)
+    print(f"   Alice credits: {alice.engine.player.credits}, Bob credits: {bob.engine.player.credits}")
+    assert created
+    assert alice.engine is not bob.engine
+    assert alice.engine.player.credits == 500
+
+    # Test 2: Known tokens resolve to the same session
+    print("\n2. Testing Token Lookup:")
+    again, created = sessions.get_or_create(alice.token)
+    print(f"   Same session returned: {again is alice}, created: {created}")
+    assert again is alice and not created
+
+    # Test 3: Unknown tokens get a fresh session with a new token
+    print("\n3. Testing Unknown Token:")
+    stranger, created = sessions.get_or_create('not-a-real-token')
+    print(f"   Fresh token issued: {stranger.token != 'not-a-real-token'}")
+    assert created and stranger.token != 'not-a-real-token'
+
+    # Test 4: LRU eviction once over capacity (Bob is least recently used)
+    print("\n4. Testing LRU Eviction:")
+    sessions.get(alice.token)
+    sessions.create()
+    print(f"   Sessions: {len(sessions)}, Bob evicted: {sessions.get(bob.token) is None}")
+    assert len(sessions) == 3
+    assert sessions.get(bob.token) is None
+    assert sessions.get(alice.token) is alice
+
+    # Test 5: Memory accounting
+    print("\n5. Testing Memory Accounting:")
+    before = alice.memory_bytes
+    sessions.update_memory(alice)
+    stats = sessions.stats()
+    print(f"   Alice: {alice.memory_bytes} bytes, total: {stats['total_memory_bytes']} bytes")
+    assert alice.memory_bytes > 0
+    assert stats['total_memory_bytes'] == sum(s.memory_bytes for s in sessions.sessions.values())
+
+    # Mutations only re-measure once the estimate is due, or from the sweep
+    sessions.remeasure_every = 3
+    alice.engine.travel_to(1)
+    sessions.note_mutation(alice)
+    assert alice.unmeasured == 1
+    sessions.note_mutation(alice)
+    sessions.note_mutation(alice)
+    assert alice.unmeasured == 0
+    sessions.note_mutation(alice)
+    assert sessions.remeasure_stale() == 1 and alice.unmeasured == 0
+    alice.engine.celestial_bodies.append(alice.engine.celestial_bodies[-1])
+    sessions.note_mutation(alice)
+    assert alice.unmeasured == 0 and alice.measured_bodies == len(alice.engine.celestial_bodies)
+    print("   Re-measured every 3 mutations, on map growth and on the sweep")
+
+    # Test 6: Idle sessions are swept
+    print("\n6. Testing Idle Eviction:")
+    sessions.idle_timeout = 0
+    evicted = sessions.evict_idle()
+    print(f"   Evicted {evicted} idle sessions")
+    assert len(sessions) == 0
+
+    print("\n=== Session Registry Tests Complete! ===")
+
+if __name__ == "__main__":
+    test_session_registry()
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Test the world simulation: tick processes, end_turn and the tick scheduler
+"""
+
+import tempfile
+import time
+
+from game.journal import Journal
+from game.metrics import MetricsRegistry
+from game.columnar import HAVE_NUMPY
+from game.galaxy import Galaxy
+from game.models import CelestialBody, Outpost, ResourceType
+from game.persistence import HEADER
+from game.routing import Request
+from game.sessions import SessionManager
+from game.rng import GameRandom
+from game.simulation import MARKET_RANGE, REGROWTH_RATE, SALE_IMPACT, SURGE_LEAD_TICKS, TickScheduler, World, quote, sell
+from game.trade import PriceIndex
+from game.web_engine import GameWebEngine
+from game.web_handler import api
+
+def new_engine(seed=8):
+    engine = GameWebEngine()
+    engine.initialize_game(seed=seed)
+    return engine
+
+def world_state(engine):
+    # Everything but the header, whose state version counts loads as changes
+    return engine.save_state()[HEADER.size:]
+
+def outposts(engine):
+    return [body.outpost for body in engine.celestial_bodies if body.outpost is not None]
+
+def test_simulation():
+    print("=== Testing World Simulation ===")
+
+    # Test 1: Mined deposits regrow, worked out only when the body is read
+    print("\n1. Testing Regrowth:")
+    engine = new_engine()
+    body = engine.player.current_location
+    resource_type = next(iter(body.resources))
+    size = body.resources[resource_type]
+    while body.resources[resource_type] == size:
+        engine.mine_resource(resource_type.value)
+    assert body.capacity[resource_type] == size and list(engine.world.regrowing.values()) == [body]
+    left = body.resources[resource_type]
+    result = engine.advance_world(3)
+    assert result['success'] and result['world_tick'] == 3 and result['regrowing'] == 1
+    # Ticks never touch the body; reading it brings it up to date
+    assert body.resources[resource_type] == left
+    step = max(1, int(size * REGROWTH_RATE))
+    assert engine.get_location_info()['resources'][resource_type.value] == min(size, left + 3 * step)
+    assert body.regrown_at == 3
+    
+    # One settle after many ticks matches settling after every tick
+    stepped = new_engine()
+    stepped_body = stepped.player.current_location
+    while stepped_body.resources[resource_type] == size:
+        stepped.mine_resource(resource_type.value)
+    for _ in range(40):
+        stepped.advance_world(1)
+        stepped.get_location_info()
+    engine.advance_world(37)
+    assert engine.get_location_info()['resources'] == stepped.get_location_info()['resources']
+    
+    engine.advance_world(200)
+    assert engine.get_tracked_state()['resources'][resource_type.value] == size
+    assert body.capacity is None and not engine.world.regrowing
+    print(f"   {resource_type.value} regrew from {left} to {size}")
+
+    # Test 2: Markets drift within range, and announced surges land on their tick
+    print("\n2. Testing Markets and Surges:")
+    engine = new_engine()
+    before = {id(o): o.get_sell_price(ResourceType.IRON) for o in outposts(engine)}
+    low, high = MARKET_RANGE
+    surges = 0
+    for _ in range(50):
+        upcoming = engine.world.upcoming()
+        result = engine.end_turn()
+        surges += result['events']
+        for event in upcoming:
+            assert event['tick'] >= engine.world.tick - SURGE_LEAD_TICKS
+    assert all(low <= factor <= high for o in outposts(engine) for factor in o.market_factors.values())
+    assert any(o.get_sell_price(ResourceType.IRON) != before[id(o)] for o in outposts(engine))
+    assert engine.current_turn == 51 and engine.get_status()['turn'] == 51
+    print(f"   {surges} surges in 50 turns, turn now {engine.current_turn}")
+
+    # Test 3: Same seed, same ticks, same world; and a save carries the clock
+    print("\n3. Testing Determinism and Saves:")
+    first, second = new_engine(seed=3), new_engine(seed=3)
+    for engine in (first, second):
+        engine.mine_resource(next(iter(engine.player.current_location.resources)).value)
+        while not engine.world.events:
+            engine.advance_world(1)
+    assert world_state(first) == world_state(second)
+    copy = GameWebEngine()
+    copy.load_state(first.save_state())
+    assert copy.world.tick == first.world.tick and copy.world.upcoming() == first.world.upcoming() != []
+    first.advance_world(10)
+    copy.advance_world(10)
+    assert world_state(copy) == world_state(first)
+    print(f"   Saved on tick {copy.world.tick - 10} with a surge pending, saves identical 10 ticks on")
+
+    # Test 4: Ticks and turns replay from the journal
+    print("\n4. Testing Journal Replay:")
+    with tempfile.TemporaryDirectory() as directory:
+        sessions = SessionManager()
+        journal = Journal(directory, sync_interval=60)
+        journal.attach(sessions)
+        session = sessions.create()
+        session.engine.initialize_game(seed=4)
+        session.engine.mine_resource(next(iter(session.engine.player.current_location.resources)).value)
+        session.engine.end_turn()
+        session.engine.advance_world(7)
+        session.engine.mine_resource(next(iter(session.engine.player.current_location.resources)).value)
+        journal.flush()
+        restored = SessionManager()
+        Journal(directory).recover(restored)
+        assert world_state(restored.get(session.token).engine) == world_state(session.engine)
+        journal.close()
+    print("   Recovered game matches the live one")
+
+    # Test 5: The scheduler serves what the budget allows and carries the rest over
+    print("\n5. Testing Tick Scheduler:")
+    sessions = SessionManager()
+    for _ in range(5):
+        sessions.create().engine.initialize_game()
+    sessions.create()   # never started: owes nothing
+    metrics = MetricsRegistry()
+    scheduler = TickScheduler(sessions, interval=1.0, budget=0.0, batch_size=2, metrics=metrics)
+    assert scheduler.tick() == 2
+    stats = scheduler.stats()
+    assert stats['backlog_sessions'] == 3 and stats['owed_ticks'] == 3
+    assert scheduler.tick() == 2
+    # Leftovers were first in line; one still owes both ticks, the latest two owe one each
+    assert scheduler.stats()['owed_ticks'] == 2 + 1 + 1
+    scheduler.budget = 10.0
+    assert scheduler.tick() == 5 and scheduler.stats()['backlog_sessions'] == 0
+    assert sorted(s.engine.world.tick for s in sessions.live() if s.engine.is_initialized()) == [3] * 5
+    assert metrics.ticks.requests == 3 and metrics.ticks.errors == 2
+    assert 'sme_tick_overruns_total{scheduler="world"} 2' in metrics.render()
+    print(f"   {scheduler.stats()}")
+
+    scheduler = TickScheduler(sessions, interval=0.01, metrics=metrics)
+    scheduler.start()
+    time.sleep(0.2)
+    sessions.close()
+    assert scheduler.ticks > 0 and sessions.scheduler is scheduler
+    print(f"   Background clock ran {scheduler.ticks} ticks before stopping")
+
+    # Test 6: API route
+    print("\n6. Testing /api/end_turn:")
+    session = SessionManager().create()
+    session.engine.initialize_game()
+    route = api.resolve('POST', '/api/end_turn')
+    response = api.dispatch(route, Request('POST', '/api/end_turn', {}, {}, b'{}', session=session))
+    assert response.status == 200 and b'"turn": 2' in response.body
+
+    # Test 7: Sales push a market down, unit by unit, and ticks bring it back
+    print("\n7. Testing Supply and Demand:")
+    def market():
+        return Outpost(name="Depot", outpost_type="trade_hub", resource_prices={ResourceType.IRON: 10.0},
+                       demand_multipliers={ResourceType.IRON: 1.2})
+    outpost = market()
+    unit_by_unit = sum(sell(outpost, ResourceType.IRON, 1) for _ in range(500))
+    bulk = market()
+    credits = sell(bulk, ResourceType.IRON, 500)
+    assert abs(credits - unit_by_unit) < 1e-6 and 500 * 12.0 * low < credits < 500 * 12.0
+    assert abs(bulk.market_factors[ResourceType.IRON] - (1 - SALE_IMPACT) ** 500) < 1e-9
+    flooded = market()
+    # A quote prices the same sale without moving the market
+    assert quote(flooded, ResourceType.IRON, 500) == sell(market(), ResourceType.IRON, 500)
+    assert quote(flooded, ResourceType.IRON, 10000) == sell(market(), ResourceType.IRON, 10000)
+    assert ResourceType.IRON not in flooded.market_factors
+    credits = sell(flooded, ResourceType.IRON, 10000)
+    assert flooded.market_factors[ResourceType.IRON] == low
+    assert abs(credits - sum(12.0 * max(low, (1 - SALE_IMPACT) ** i) for i in range(10000))) < 1e-6
+    assert sell(flooded, ResourceType.GOLD, 50) == 0.0 and ResourceType.GOLD not in flooded.market_factors
+    World().advance([CelestialBody("Dock", 1.0, {}, has_outpost=True, outpost=flooded)], GameRandom(1), ticks=30)
+    assert flooded.market_factors[ResourceType.IRON] > 0.9
+    print(f"   10000 Iron fetch {credits:.0f} rather than {10000 * 12.0:.0f}, market back to "
+          f"{flooded.market_factors[ResourceType.IRON]:.2f} after 30 ticks")
+
+    # Only the traded markets are repriced in the best-price index
+    engine = new_engine()
+    engine.mine_resource(next(iter(engine.player.current_location.resources)).value)
+    engine.travel_to(1)
+    index = engine.price_index()
+    sold = list(engine.player.current_ship.cargo)
+    updates = index.updates
+    outpost = engine.player.current_location.outpost
+    before = {rt: outpost.get_sell_price(rt) for rt in sold}
+    # The outpost view and the trade route ranking quote what the sale will actually pay
+    quoted = engine.get_outposts()['total_value']
+    assert quoted < sum(amount * before[rt] for rt, amount in engine.player.current_ship.cargo.items())
+    here = engine.celestial_bodies.index(engine.player.current_location)
+    route = next(r for r in engine.rank_trade_routes(limit=50)['routes'] if r['index'] == here)
+    assert abs(route['revenue'] - quoted) < 1e-6
+    credits = engine.player.credits
+    assert engine.trade_at_outpost(sell_all=True)['success']
+    assert abs(engine.player.credits - credits - quoted) < 1e-6
+    assert engine.price_index() is index and index.updates == updates + len(sold)
+    for key, body_outpost in index.outposts.items():
+        if body_outpost is outpost:
+            assert all(index.price(key, rt) == outpost.get_sell_price(rt) < before[rt] for rt in sold)
+    print(f"   Selling {len(sold)} resources made {index.updates - updates} index updates")
+
+    # Test 8: Vectorized ticks over the columnar store match the per-market loop exactly
+    print("\n8. Testing Vectorized Market Ticks:")
+    if HAVE_NUMPY:
+        plain, columnar = GameWebEngine(), GameWebEngine(columnar=True)
+        for engine in (plain, columnar):
+            engine.initialize_game(seed=5)
+            engine.mine_resource(next(iter(engine.player.current_location.resources)).value)
+            engine.travel_to(1)
+            engine.trade_at_outpost(sell_all=True)
+            engine.celestial_bodies.extend(Galaxy(seed=5).bodies_within((0.0, 0.0, 0.0), 100.0))
+            engine.advance_world(30)
+        assert [dict(o.market_factors) for o in outposts(columnar)] == [dict(o.market_factors) for o in outposts(plain)]
+        assert columnar.rng.counter == plain.rng.counter and columnar.world.upcoming() == plain.world.upcoming()
+        print(f"   30 ticks over {len(outposts(plain))} outposts agree to the last bit")
+    else:
+        print("   NumPy is not installed; skipping (pip install numpy)")
+
+    # Test 9: Ticks only invalidate what they changed
+    print("\n9. Testing Tick Invalidation:")
+    engine = new_engine()
+    prices = engine.price_index()
+    version = engine.state_version
+    result = engine.advance_world()
+    assert result['markets_changed'] and not result['deposits_changed']
+    assert engine.state_version > version
+    # Moved prices are updated in the existing best-price index, not rebuilt from scratch
+    assert engine.price_index() is prices
+    fresh = PriceIndex(prices.outposts.items())
+    assert prices.prices == fresh.prices
+    assert all(prices.best_price(rt) == fresh.best_price(rt) for rt in ResourceType)
+    quiet = new_engine()
+    for body in quiet.celestial_bodies:
+        body.outpost = None
+    prices, etag = quiet.price_index(), quiet.get_etag()
+    result = quiet.advance_world(3)
+    assert not result['markets_changed'] and not result['deposits_changed']
+    assert quiet._prices is prices and quiet.get_etag() == etag
+    quiet.end_turn()
+    assert quiet.get_etag() != etag
+    quiet.mine_resource(next(iter(quiet.player.current_location.resources)).value)
+    etag = quiet.get_etag()
+    assert quiet.advance_world()['deposits_changed'] and quiet.get_etag() != etag
+    assert quiet._prices is prices
+    print("   A tick with no markets or regrowth kept the ETag; the turn counter still moves it")
+
+    print("\n=== World Simulation Tests Complete! ===")
+
+if __name__ == "__main__":
+    test_simulation()
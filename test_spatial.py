@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Test the spatial index behind destination queries
+"""
+
+import math
+import random
+from game.galaxy import Galaxy
+from game.models import ResourceType, travel_fuel_cost
+from game.routing import Request
+from game.sessions import SessionManager
+from game.spatial import SpatialGrid
+from game.web_engine import GameWebEngine
+from game.web_handler import api
+
+def galaxy_engine():
+    engine = GameWebEngine()
+    engine.initialize_game(seed=5)
+    galaxy = Galaxy(seed=5)
+    engine.celestial_bodies.extend(galaxy.bodies_within((0.0, 0.0, 0.0), 60.0))
+    return engine
+
+def test_spatial():
+    print("=== Testing Spatial Index ===")
+
+    # Test 1: Grid queries agree with a brute-force scan
+    print("\n1. Testing Grid Against Brute Force:")
+    picker = random.Random(1)
+    points = [(picker.uniform(-100, 100), picker.uniform(-100, 100), picker.uniform(-10, 10)) for _ in range(2000)]
+    grid = SpatialGrid(cell_size=7.5)
+    for index, point in enumerate(points):
+        grid.add(index, point)
+    for _ in range(50):
+        center = (picker.uniform(-120, 120), picker.uniform(-120, 120), picker.uniform(-15, 15))
+        by_distance = sorted((math.dist(center, point), index) for index, point in enumerate(points))
+        assert grid.nearest(center, 7) == by_distance[:7]
+        assert grid.nearest(center, 3, lambda i: i % 5 == 0) == [m for m in by_distance if m[1] % 5 == 0][:3]
+        assert grid.within(center, 12.0) == [m for m in by_distance if m[0] <= 12.0]
+    assert SpatialGrid().nearest((0, 0, 0), 3) == []
+    print(f"   50 random queries over {len(grid)} points match")
+
+    # Test 2: Reachable destinations are exactly the ones the fuel allows
+    print("\n2. Testing Reachable Destinations:")
+    engine = galaxy_engine()
+    ship = engine.player.current_ship
+    here = engine.player.current_location
+    expected = {i for i, body in enumerate(engine.celestial_bodies)
+                if body is not here and travel_fuel_cost(here, body) <= ship.current_fuel}
+    pages, offset = [], 0
+    while offset is not None:
+        page = engine.find_destinations('reachable', offset=offset, limit=7)
+        pages.extend(page['destinations'])
+        offset = page['next_offset']
+    assert {d['index'] for d in pages} == expected
+    assert page['total'] == len(expected)
+    assert all(d['can_travel'] for d in pages)
+    assert [d['distance_away'] for d in pages] == sorted(d['distance_away'] for d in pages)
+    print(f"   {len(expected)} of {len(engine.celestial_bodies)} bodies reachable with {ship.current_fuel} fuel")
+
+    # Test 3: Nearest outposts and resources
+    print("\n3. Testing Nearest Queries:")
+    outposts = engine.find_destinations('outposts', limit=3)['destinations']
+    all_outposts = sorted((here.distance_to(body), i) for i, body in enumerate(engine.celestial_bodies)
+                          if body.has_outpost and body is not here)
+    assert [d['index'] for d in outposts] == [i for _, i in all_outposts[:3]]
+    crystals = engine.find_destinations('resource', 'Quantum Crystals', limit=1)['destinations'][0]
+    print(f"   Nearest outposts: {[d['name'] for d in outposts]}; nearest crystals: {crystals['name']}")
+    engine.celestial_bodies[crystals['index']].resources[ResourceType.QUANTUM_CRYSTALS] = 0
+    again = engine.find_destinations('resource', 'Quantum Crystals', limit=1)['destinations'][0]
+    assert again['index'] != crystals['index']
+    assert again['distance_away'] >= crystals['distance_away']
+
+    # Test 4: The index follows the map when it changes
+    print("\n4. Testing Index Refresh:")
+    first = engine.spatial_index()
+    assert engine.spatial_index() is first
+    planner, prices = engine.route_planner(), engine.price_index()
+    # New bodies go into the existing grids; the route cache, planned without them, starts over
+    before = len(engine.celestial_bodies)
+    engine.celestial_bodies.extend(Galaxy(seed=5).sector((8, 8, 0)))
+    grown = engine.spatial_index()
+    assert grown is first and grown.size == len(engine.celestial_bodies) > before
+    assert sorted(grown.all.positions) == list(range(len(engine.celestial_bodies)))
+    new_outposts = [i for i in range(before, grown.size) if engine.celestial_bodies[i].outpost is not None]
+    assert new_outposts and all(i in grown.outposts.positions for i in new_outposts)
+    assert engine.route_planner() is not planner and engine.price_index() is prices
+    assert all(i in prices.outposts for i in new_outposts)
+    far = engine.celestial_bodies[-1]
+    assert grown.within(far.position, 0.0)[0][1] == len(engine.celestial_bodies) - 1
+    print(f"   {grown.size - before} appended bodies indexed in place")
+    # Dropping or reordering bodies rebuilds it
+    engine.celestial_bodies.pop(before)
+    assert engine.spatial_index() is not first
+    rebuilt = engine.spatial_index()
+    engine.celestial_bodies[-1], engine.celestial_bodies[-2] = engine.celestial_bodies[-2], engine.celestial_bodies[-1]
+    assert engine.spatial_index() is not rebuilt
+    engine.initialize_game(seed=6)
+    assert len(engine.spatial_index().all) == 5
+
+    # Test 5: Paginated API route
+    print("\n5. Testing /api/nearby:")
+    session = SessionManager().create(engine=galaxy_engine())
+    route = api.resolve('GET', '/api/nearby')
+    response = api.dispatch(route, Request('GET', '/api/nearby', {'kind': 'outposts', 'limit': '2', 'offset': '1'},
+                                           {}, session=session))
+    assert response.status == 200
+    assert b'"offset": 1' in response.body and b'"limit": 2' in response.body
+    response = api.dispatch(route, Request('GET', '/api/nearby', {'limit': '1000'}, {}, session=session))
+    assert response.status == 400
+    print("   Pages served, oversized page refused")
+
+    print("\n=== Spatial Index Tests Complete! ===")
+
+if __name__ == "__main__":
+    test_spatial()
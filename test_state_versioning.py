@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Test state versioning, cached views and snapshots
+"""
+
+import json
+from game.web_engine import GameWebEngine
+
+def test_state_versioning():
+    print("=== Testing State Versioning ===")
+
+    engine = GameWebEngine()
+    engine.initialize_game(starting_credits=1000)
+
+    # Test 1: Repeated reads reuse the cached bytes
+    print("\n1. Testing View Cache:")
+    etag, body = engine.get_cached_view('status')
+    etag_again, body_again = engine.get_cached_view('status')
+    print(f"   ETag: {etag}, cached bytes reused: {body is body_again}")
+    assert etag == etag_again and body is body_again
+    assert json.loads(body) == engine.get_status()
+
+    # Test 2: Mutations bump the version and invalidate the cache
+    print("\n2. Testing Mutation Invalidates Views:")
+    version = engine.state_version
+    resource = list(engine.get_location_info()['resources'].keys())[0]
+    result = engine.mine_resource(resource)
+    new_etag, new_body = engine.get_cached_view('status')
+    print(f"   Mining: {result['message']}")
+    print(f"   Version {version} -> {engine.state_version}, new ETag: {new_etag}")
+    assert engine.state_version > version
+    assert new_etag != etag
+    assert json.loads(new_body)['cargo'] == engine.get_status()['cargo']
+
+    # Test 3: Failed actions leave the version alone
+    print("\n3. Testing Failed Actions:")
+    version = engine.state_version
+    result = engine.trade_at_outpost(sell_all=True)
+    print(f"   Trade attempt: {result['message']}")
+    assert not result['success']
+    assert engine.state_version == version
+
+    # Test 4: Engines never share ETags
+    print("\n4. Testing ETag Uniqueness Across Engines:")
+    other = GameWebEngine()
+    other.initialize_game(starting_credits=1000)
+    print(f"   {engine.get_etag()} vs {other.get_etag()}")
+    assert other.get_etag() != engine.get_etag()
+
+    # Test 5: Snapshot bundles every view
+    print("\n5. Testing Snapshot:")
+    snapshot = engine.get_snapshot()
+    print(f"   Snapshot views: {list(snapshot.keys())}")
+    assert snapshot['status'] == engine.get_status()
+    assert snapshot['location'] == engine.get_location_info()
+    assert snapshot['destinations'] == engine.get_destinations()
+
+    print("\n=== State Versioning Tests Complete! ===")
+
+if __name__ == "__main__":
+    test_state_versioning()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test the best-price index and trade route ranking
+"""
+
+from game.galaxy import Galaxy
+from game.models import Outpost, ResourceType, travel_fuel_cost
+from game.routing import Request
+from game.sessions import SessionManager
+from game.trade import PriceIndex
+from game.web_engine import GameWebEngine
+from game.web_handler import api
+
+def galaxy_engine(fuel=2000):
+    engine = GameWebEngine()
+    engine.initialize_game(seed=21)
+    engine.celestial_bodies.extend(Galaxy(seed=21).bodies_within((0.0, 0.0, 0.0), 100.0))
+    ship = engine.player.current_ship
+    ship.fuel_capacity = ship.current_fuel = fuel
+    ship.cargo = {ResourceType.IRON: 30, ResourceType.GOLD: 10, ResourceType.RARE_EARTH: 4}
+    return engine
+
+def brute_force(engine, limit):
+    here = engine.player.current_location
+    ship = engine.player.current_ship
+    ranked = []
+    for i, body in enumerate(engine.celestial_bodies):
+        fuel_cost = travel_fuel_cost(here, body)
+        if body.outpost is None or fuel_cost > ship.current_fuel:
+            continue
+        revenue = sum(amount * body.outpost.get_sell_price(rt) for rt, amount in ship.cargo.items())
+        ranked.append((revenue - fuel_cost * engine.FUEL_PRICE, -i))
+    return [-i for _, i in sorted(ranked, reverse=True)[:limit]]
+
+def test_trade():
+    print("=== Testing Trade Route Optimizer ===")
+
+    # Test 1: The index follows price changes incrementally
+    print("\n1. Testing Price Index:")
+    markets = {name: Outpost(name=name, outpost_type="trade_hub",
+                             resource_prices={ResourceType.IRON: price}) for name, price in
+               (('a', 2.0), ('b', 3.0), ('c', 2.5))}
+    index = PriceIndex(markets.items())
+    assert index.best(ResourceType.IRON) == (3.0, 'b')
+    assert index.best(ResourceType.GOLD) == (0.0, 'a')
+    markets['b'].resource_prices[ResourceType.IRON] = 1.0
+    updates = index.updates
+    index.update('b', [ResourceType.IRON])
+    assert index.updates == updates + 1
+    assert index.best(ResourceType.IRON) == (2.5, 'c')
+    index.update('b')   # nothing else changed
+    assert index.updates == updates + 1
+    for step in range(200):
+        markets['a'].demand_multipliers[ResourceType.IRON] = 1 + step / 100
+        index.update('a', [ResourceType.IRON])
+    assert index.best(ResourceType.IRON) == (2.0 * 2.99, 'a')
+    assert len(index._heaps[ResourceType.IRON]) <= 2 * len(markets) + 16
+    print(f"   {index.updates} incremental updates, heap holds {len(index._heaps[ResourceType.IRON])} entries")
+
+    # Test 2: Ranking matches an exhaustive scan, without scanning everything
+    print("\n2. Testing Ranking:")
+    engine = galaxy_engine()
+    result = engine.rank_trade_routes(limit=5)
+    assert [route['index'] for route in result['routes']] == brute_force(engine, 5)
+    reachable = len(brute_force(engine, 10 ** 6))
+    print(f"   Top 5 of {reachable} reachable outposts, {result['examined']} examined")
+    for route in result['routes'][:3]:
+        print(f"   {route['name']}: revenue {route['revenue']:.0f}, fuel {route['fuel_cost']}, "
+              f"net {route['net_profit']:.0f}")
+    assert result['examined'] < reachable
+    assert result['routes'][0]['net_profit'] >= result['routes'][-1]['net_profit']
+
+    # Test 3: A price change moves the ranking
+    print("\n3. Testing Price Updates:")
+    last = result['routes'][-1]
+    outpost = engine.celestial_bodies[last['index']].outpost
+    outpost.demand_multipliers[ResourceType.RARE_EARTH] = 50.0
+    engine.price_index().update(last['index'], [ResourceType.RARE_EARTH])
+    result = engine.rank_trade_routes(limit=5)
+    assert result['routes'][0]['index'] == last['index']
+    assert result['best_anywhere']['Rare Earth']['index'] == last['index']
+    print(f"   {last['name']} jumps to the top after a demand spike")
+
+    # Test 4: Selling where you stand costs no fuel
+    print("\n4. Testing Local Market and Empty Hold:")
+    engine = galaxy_engine(fuel=0)
+    engine.player.current_location = engine.celestial_bodies[1]
+    routes = engine.rank_trade_routes()['routes']
+    assert len(routes) == 1 and routes[0]['here'] and routes[0]['fuel_cost'] == 0
+    engine.player.current_ship.cargo = {}
+    assert not engine.rank_trade_routes()['success']
+
+    # Test 5: API route
+    print("\n5. Testing /api/trade_routes:")
+    session = SessionManager().create(engine=galaxy_engine())
+    route = api.resolve('GET', '/api/trade_routes')
+    response = api.dispatch(route, Request('GET', '/api/trade_routes', {'limit': '3'}, {}, session=session))
+    assert response.status == 200 and response.body.count(b'"net_profit"') == 3
+    response = api.dispatch(route, Request('GET', '/api/trade_routes', {'limit': '0'}, {}, session=session))
+    assert response.status == 400
+
+    print("\n=== Trade Route Optimizer Tests Complete! ===")
+
+if __name__ == "__main__":
+    test_trade()